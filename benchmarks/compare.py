@@ -0,0 +1,43 @@
+import argparse
+import json
+import sys
+#----------------------------------------------------------------------------------------------------------
+# Compare two benchmark results (python -m benchmarks.run) - median of every benchmark, old vs new:
+#   python -m benchmarks.compare bench_data/results-1a2b3c4.json bench_data/results-5d6e7f8.json
+# exit code 1 if a benchmark got slower than --threshold (default: 10%)
+#----------------------------------------------------------------------------------------------------------
+def compare(old, new, threshold=0.10):
+    rows = []
+    for name in list(old['results']) + [name for name in new['results'] if name not in old['results']]:
+        old_ms = old['results'].get(name, {}).get('median_ms')
+        new_ms = new['results'].get(name, {}).get('median_ms')
+        ratio = new_ms / old_ms if old_ms and new_ms is not None else None
+        rows.append((name, old_ms, new_ms, ratio, ratio is not None and ratio > 1 + threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description='Compare two benchmark result files.')
+    parser.add_argument('old', help='results of the baseline commit')
+    parser.add_argument('new', help='results of the commit to check')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slow-down reported as a regression (default: 0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for key in ('scale', 'seed', 'live_query'):
+        if old.get(key) != new.get(key):
+            print(f'warning: {key} differs ({old.get(key)} vs {new.get(key)})')
+
+    rows = compare(old, new, args.threshold)
+    print(f'{"benchmark":<45}{old["commit"]:>12}{new["commit"]:>12}{"change":>10}')
+    for name, old_ms, new_ms, ratio, regression in rows:
+        old_text = '-' if old_ms is None else f'{old_ms:.1f}'
+        new_text = '-' if new_ms is None else f'{new_ms:.1f}'
+        change = '-' if ratio is None else f'{(ratio - 1) * 100:+.1f}%'
+        print(f'{name:<45}{old_text:>12}{new_text:>12}{change:>10}{"  <- slower" if regression else ""}')
+    return 1 if any(row[4] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
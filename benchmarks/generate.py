@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+#----------------------------------------------------------------------------------------------------------
+# Synthetic source files - same format as cdw_files/, any size:
+#   python -m benchmarks.generate bench_data                    1x  (952 customers, 115 branches, 46,694 transactions)
+#   python -m benchmarks.generate bench_data --scale 215        10M+ transactions
+# 1. Names, streets + city/state/zip come from the shipped files, so the values look like the real ones.
+# 2. Keys are unique at every scale (SSN, CREDIT_CARD_NO, BRANCH_CODE, TRANSACTION_ID) + the same seed
+#    always writes the same files - results of two commits can be compared.
+# 3. Transactions are written in chunks - memory stays flat, whatever the scale.
+#----------------------------------------------------------------------------------------------------------
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CDW_FILES = os.path.join(ROOT, 'cdw_files')
+
+# rows at scale 1 (size of the original data set)
+CUSTOMERS = 952
+BRANCHES = 115
+TRANSACTIONS = 46694
+
+TRANSACTION_TYPES = ['Bills', 'Healthcare', 'Test', 'Education', 'Entertainment', 'Gas', 'Grocery']
+CHUNK = 100000                              # transactions per write
+
+def read_json_lines(file):
+    with open(file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# value pools taken from the shipped customer + branch files
+def read_pools():
+    customers = read_json_lines(os.path.join(CDW_FILES, 'cdw_sapp_custmer.json'))
+    branches = read_json_lines(os.path.join(CDW_FILES, 'cdw_sapp_branch.json'))
+    return {'first_names': sorted({customer['FIRST_NAME'] for customer in customers}),
+            'middle_names': sorted({customer['MIDDLE_NAME'] for customer in customers}),
+            'last_names': sorted({customer['LAST_NAME'] for customer in customers}),
+            'streets': sorted({customer['STREET_NAME'] for customer in customers} | {branch['BRANCH_STREET'] for branch in branches}),
+            'cities': sorted({(customer['CUST_CITY'], customer['CUST_STATE'], customer['CUST_ZIP']) for customer in customers})}
+
+def timestamp(rng):
+    time = datetime(2018, 1, 1) + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000-04:00')
+
+def generate_customers(rng, pools, count):
+    customers = []
+    for i in range(count):
+        first = rng.choice(pools['first_names'])
+        last = rng.choice(pools['last_names'])
+        city, state, zip = rng.choice(pools['cities'])
+        customers.append({'FIRST_NAME': first,
+                          'MIDDLE_NAME': rng.choice(pools['middle_names']),
+                          'LAST_NAME': last,
+                          'SSN': 123450000 + i,
+                          'CREDIT_CARD_NO': str(4210653300000000 + i),
+                          'APT_NO': str(rng.randint(1, 999)),
+                          'STREET_NAME': rng.choice(pools['streets']),
+                          'CUST_CITY': city,
+                          'CUST_STATE': state,
+                          'CUST_COUNTRY': 'United States',
+                          'CUST_ZIP': zip,
+                          'CUST_PHONE': rng.randint(1230000, 1239999),
+                          'CUST_EMAIL': f'{first[0]}{last}@example.com',
+                          'LAST_UPDATED': timestamp(rng)})
+    return customers
+
+def generate_branches(rng, pools, count):
+    branches = []
+    for i in range(count):
+        city, state, zip = rng.choice(pools['cities'])
+        branches.append({'BRANCH_CODE': i + 1,
+                         'BRANCH_NAME': 'Example Bank',
+                         'BRANCH_STREET': rng.choice(pools['streets']),
+                         'BRANCH_CITY': city,
+                         'BRANCH_STATE': state,
+                         'BRANCH_ZIP': None if rng.random() < 0.01 else int(zip),   # a few missing (filled by transform_branch)
+                         'BRANCH_PHONE': f'123{rng.randint(4560000, 4569999)}',
+                         'LAST_UPDATED': timestamp(rng)})
+    return branches
+
+def write_json_lines(file, records):
+    with open(file, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+def write_transactions(file, rng, customers, branch_count, count):
+    cards = [(customer['CREDIT_CARD_NO'], customer['SSN']) for customer in customers]
+    with open(file, 'w') as f:
+        for first_id in range(1, count + 1, CHUNK):
+            size = min(CHUNK, count + 1 - first_id)
+            lines = []
+            for transaction_id, (card, ssn), transaction_type in zip(range(first_id, first_id + size),
+                                                                     rng.choices(cards, k=size),
+                                                                     rng.choices(TRANSACTION_TYPES, k=size)):
+                lines.append(f'{{"CREDIT_CARD_NO":"{card}","DAY":{rng.randint(1, 28)},"MONTH":{rng.randint(1, 12)},"YEAR":2018,'
+                             f'"CUST_SSN":{ssn},"BRANCH_CODE":{rng.randint(1, branch_count)},"TRANSACTION_TYPE":"{transaction_type}",'
+                             f'"TRANSACTION_VALUE":{round(rng.uniform(1, 100), 2)},"TRANSACTION_ID":{transaction_id}}}\n')
+            f.write(''.join(lines))
+
+# write cdw_sapp_custmer.json, cdw_sapp_branch.json + cdw_sapp_credit.json to out_dir - returns the row counts
+def generate(out_dir, scale=1.0, seed=2023):
+    rng = random.Random(seed)
+    pools = read_pools()
+    counts = {'customer': max(1, round(CUSTOMERS * scale)),
+              'branch': max(1, round(BRANCHES * scale)),
+              'credit': max(1, round(TRANSACTIONS * scale))}
+
+    os.makedirs(out_dir, exist_ok=True)
+    customers = generate_customers(rng, pools, counts['customer'])
+    write_json_lines(os.path.join(out_dir, 'cdw_sapp_custmer.json'), customers)
+    write_json_lines(os.path.join(out_dir, 'cdw_sapp_branch.json'), generate_branches(rng, pools, counts['branch']))
+    write_transactions(os.path.join(out_dir, 'cdw_sapp_credit.json'), rng, customers, counts['branch'], counts['credit'])
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.generate', description='Write synthetic customer, branch + credit JSON files.')
+    parser.add_argument('out_dir', help='folder for the generated files')
+    parser.add_argument('--scale', type=float, default=1.0, help=f'multiple of the original data set (1 = {TRANSACTIONS:,} transactions)')
+    parser.add_argument('--seed', type=int, default=2023, help='random seed (same seed = same files)')
+    args = parser.parse_args(argv)
+
+    counts = generate(args.out_dir, args.scale, args.seed)
+    print(', '.join(f'{name}: {count:,}' for name, count in counts.items()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.generate import generate, TRANSACTION_TYPES
+#----------------------------------------------------------------------------------------------------------
+# Benchmark suite - times the ETL transforms + loads and the dashboard callbacks on synthetic data:
+#   python -m benchmarks.run bench_data --scale 10                  generate, ETL, dashboard -> bench_data/results-<commit>.json
+#   python -m benchmarks.run bench_data --only dashboard --live     dashboard only (live query mode), re-using bench_data
+#   python -m benchmarks.compare old.json new.json                  median of every benchmark, old vs new
+# 1. ETL - transform_customer/branch/credit (forced with a no-op write), load_to_db (bulk + jdbc, only with --load-db:
+#    a scratch MariaDB database - its CDW_SAPP_* tables are overwritten).
+# 2. The transformed tables are staged as Parquet (etl/parquet.py) - the dashboard reads its snapshot from them
+#    (Dashboard_Source=parquet) and its SQL goes to an SQLite stand-in (benchmarks/standin.py).
+# 3. Startup (page registration), then the snapshot warm-up - once from Parquet, once from the Arrow cache.
+# 4. Every case runs once to warm up (first_ms), then --repeat times.
+# 5. The callbacks run unmemoized (every run computes - memo.memoize keeps the callback as __wrapped__), then
+#    memoized ([memoized] - the warm-up run stores the results, the timed runs are hits).
+#----------------------------------------------------------------------------------------------------------
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD = os.path.join(ROOT, 'dashboard')
+
+TABLES = {
+    'customer': ('cdw_sapp_custmer.json', 'CDW_SAPP_CUSTOMER'),
+    'branch': ('cdw_sapp_branch.json', 'CDW_SAPP_BRANCH'),
+    'credit': ('cdw_sapp_credit.json', 'CDW_SAPP_CREDIT_CARD')
+}
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = bool(subprocess.check_output(['git', '-C', ROOT, 'status', '--porcelain', '--untracked-files=no'], text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+# warm-up run + `repeat` timed runs (milliseconds)
+def measure(function, repeat):
+    start = time.perf_counter()
+    function()
+    first = (time.perf_counter() - start) * 1000
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return summarize(first, times)
+
+def summarize(first, times):
+    times = sorted(times) or [first]
+    return {'first_ms': round(first, 3),
+            'runs': len(times),
+            'min_ms': round(times[0], 3),
+            'median_ms': round(statistics.median(times), 3),
+            'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+            'max_ms': round(times[-1], 3)}
+#----------------------------------------------------------------------------------------------------------
+# ETL benchmarks (Spark)
+def bench_etl(data_dir, repeat, load_db=None):
+    from etl.config import USER, PASSWORD
+    from etl.extract import extract_json, valid_records
+    from etl.load import load_to_db
+    from etl.parquet import stage_to_parquet
+    from etl.schemas import SCHEMAS
+    from etl.session import create_spark
+    from etl.transform import transform_customer, transform_branch, transform_credit
+
+    transforms = {'customer': transform_customer, 'branch': transform_branch, 'credit': transform_credit}
+    results = {}
+    spark = create_spark('Benchmark')
+    try:
+        for name, (file, table_name) in TABLES.items():
+            source_df = valid_records(extract_json(os.path.join(data_dir, file), SCHEMAS[name]))
+            source_df.count()                                           # read + cache the source once
+            transform = transforms[name]
+            results[f'transform_{name}'] = measure(lambda: transform(source_df).write.format('noop').mode('overwrite').save(), repeat)
+
+            transformed_df = transform(source_df).cache()
+            transformed_df.count()
+            stage_to_parquet(transformed_df, name, incremental=False)   # input of the dashboard benchmarks
+            if load_db:
+                for strategy in ('bulk', 'jdbc'):
+                    results[f'load_to_db[{strategy}]_{name}'] = measure(
+                        lambda: load_to_db(transformed_df, load_db, table_name, USER, PASSWORD, mode='overwrite', strategy=strategy), repeat)
+            transformed_df.unpersist()
+            source_df.unpersist()
+    finally:
+        spark.stop()
+    return results
+#----------------------------------------------------------------------------------------------------------
+# dashboard benchmarks (Parquet snapshot + SQLite stand-in)
+def bench_dashboard(repeat, live_query=False, seed=2023, cases=10):
+    os.environ['Dashboard_Source'] = 'parquet'
+    os.environ['Dashboard_Live_Query'] = '1' if live_query else ''
+    sys.path.insert(0, DASHBOARD)
+    import database
+    import live
+    import staging
+    from benchmarks.standin import sqlite_database, attach
+
+    tables = {'customer': staging.get_customer_data(), 'credit': staging.get_credit_data(), 'branch': staging.get_branch_data()}
+    attach(sqlite_database(tables, database.STATEMENT_COLUMNS), database, live)
+
+    results = {}
+    start = time.perf_counter()
+    import app                                                          # noqa: F401 - imported for its side effect: registers the pages (nothing is loaded at import)
+    import snapshot
+    from pages import customers_transactions, customers_monthly_bill, customers_details
+    results['dashboard_startup'] = summarize((time.perf_counter() - start) * 1000, [])
+    if not live_query:
+        # tables + indexes - from the Parquet files (+ written to the Arrow cache), then again from the Arrow cache
+        shutil.rmtree(snapshot.CACHE_DIR, ignore_errors=True)
+        for case in ('cold', 'cached'):
+            snapshot._snapshot.clear()
+            start = time.perf_counter()
+            snapshot.warm_up().join()
+            results[f'dashboard_warm_up[{case}]'] = summarize((time.perf_counter() - start) * 1000, [])
+
+    rng = random.Random(seed)
+    customers = tables['customer'].sample(min(cases, len(tables['customer'])), random_state=seed)
+    transactions = customers_transactions
+    zipcodes = len(transactions.filter_values('zipcodes'))
+    table_cases = {
+        'all': (None, None, None, 0, 25, None, ''),
+        'last_page': (None, None, None, len(tables['credit']) // 25, 25, None, ''),
+        'zipcode': ({'row': rng.randrange(zipcodes)}, None, None, 0, 25, None, ''),
+        'zipcode_month_year': ({'row': rng.randrange(zipcodes)}, {'row': rng.randrange(12)}, {'row': 0}, 0, 25, None, ''),
+        'sorted': (None, None, None, 0, 25, [{'column_id': 'TRANSACTION_VALUE', 'direction': 'desc'}], ''),
+        'filtered': (None, None, None, 0, 25, None, '{TRANSACTION_VALUE} ge 50 && {TRANSACTION_TYPE} contains Gas')
+    }
+    cards = list(customers['CREDIT_CARD_NO'])
+    months = [rng.randrange(12) for _ in cards]
+    names = list(customers[['FIRST_NAME', 'MIDDLE_NAME', 'LAST_NAME']].itertuples(index=False))
+    states = sorted(tables['customer']['CUST_STATE'].unique())[:cases]
+
+    # every callback computes, then the same inputs are served from the memo
+    for suffix, callback in (('', lambda function: function.__wrapped__), ('[memoized]', lambda function: function)):
+        update_data_table = callback(transactions.update_data_table)
+        for case, args in table_cases.items():
+            results[f'update_data_table[{case}]{suffix}'] = measure(lambda: update_data_table(*args), repeat)
+
+        update_bill = callback(customers_monthly_bill.update_bill)
+        results[f'update_bill{suffix}'] = measure(lambda: [update_bill(card, {'row': month}, {'row': 0})
+                                                           for card, month in zip(cards, months)], repeat)
+        update_details = callback(customers_details.update_details)
+        results[f'update_details{suffix}'] = measure(lambda: [update_details(first, middle, last, None, None)
+                                                              for first, middle, last in names], repeat)
+        update_state = callback(transactions.update_state)
+        results[f'update_state{suffix}'] = measure(lambda: [update_state(state) for state in states], repeat)
+        update_transaction_type = callback(transactions.update_transaction_type)
+        results[f'update_transaction_type{suffix}'] = measure(lambda: [update_transaction_type(transaction_type)
+                                                                       for transaction_type in TRANSACTION_TYPES], repeat)
+    return results
+#----------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Time the ETL + dashboard callbacks on synthetic data.')
+    parser.add_argument('work_dir', help='folder for the generated files, the Parquet staging layer + the results')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiple of the original data set (default: 1)')
+    parser.add_argument('--seed', type=int, default=2023, help='random seed of the data + the callback inputs')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark, after one warm-up run (default: 5)')
+    parser.add_argument('--only', choices=['etl', 'dashboard'], help='run one part (dashboard re-uses the Parquet files of an earlier run)')
+    parser.add_argument('--live', action='store_true', help='dashboard in live query mode (SQL against the SQLite stand-in)')
+    parser.add_argument('--load-db', help='scratch MariaDB database for the load_to_db benchmarks (skipped if not set)')
+    parser.add_argument('--out', help='results file (default: <work_dir>/results-<commit>.json)')
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.join(args.work_dir, 'data')
+    os.environ['Parquet_Dir'] = os.path.join(args.work_dir, 'parquet')
+    os.environ['Dashboard_Cache_Dir'] = os.path.join(args.work_dir, 'dashboard_cache')
+    commit, dirty = git_commit()
+    report = {'commit': commit,
+              'dirty': dirty,
+              'timestamp': datetime.now().isoformat(timespec='seconds'),
+              'scale': args.scale,
+              'seed': args.seed,
+              'repeat': args.repeat,
+              'live_query': args.live,
+              'python': platform.python_version(),
+              'machine': f'{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)',
+              'results': {}}
+
+    if args.only != 'dashboard':
+        report['rows'] = generate(data_dir, args.scale, args.seed)
+        report['results'].update(bench_etl(data_dir, args.repeat, args.load_db))
+    if args.only != 'etl':
+        report['results'].update(bench_dashboard(args.repeat, args.live, args.seed))
+
+    out = args.out or os.path.join(args.work_dir, f'results-{commit}{"-dirty" if dirty else ""}.json')
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=1)
+    for name, result in report['results'].items():
+        print(f'{name:<45}{result["median_ms"]:>12.1f} ms')
+    print(f'results: {out}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
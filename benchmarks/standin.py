@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+
+import pandas as pd
+#----------------------------------------------------------------------------------------------------------
+# Local database stand-in for the dashboard benchmarks - an in-memory SQLite copy of the warehouse tables.
+# database.fetch (+ live.fetch) are pointed at it, so the callbacks run without a MariaDB server:
+# the monthly statement lookups + the live query mode SQL (Dashboard_Live_Query=1) hit SQLite instead.
+# SQLite is not MariaDB - compare timings of two commits with each other, not with production.
+#----------------------------------------------------------------------------------------------------------
+TABLES = {
+    'customer': 'cdw_sapp_customer',
+    'credit': 'cdw_sapp_credit_card',
+    'branch': 'cdw_sapp_branch'
+}
+
+def sqlite_database(tables, statement_columns):
+    con = sqlite3.connect(':memory:', check_same_thread=False)
+    con.create_function('CONCAT', -1, lambda *values: ''.join('' if value is None else str(value) for value in values))
+    for name, table in TABLES.items():
+        dataframe = tables[name].copy()
+        for column in dataframe.columns:
+            if pd.api.types.is_datetime64_any_dtype(dataframe[column]):
+                dataframe[column] = dataframe[column].astype(str)
+        dataframe.to_sql(table, con, index=False)
+    con.execute('CREATE INDEX customer_ssn ON cdw_sapp_customer (SSN)')
+    con.execute('CREATE INDEX credit_ssn ON cdw_sapp_credit_card (CUST_SSN)')
+    con.execute('CREATE INDEX credit_card ON cdw_sapp_credit_card (CUST_CC_NO)')
+    # no precomputed statements - the bill page builds them from the snapshot
+    con.execute(f'CREATE TABLE cdw_sapp_monthly_statement ({", ".join(statement_columns)})')
+    return con
+
+# replace database.fetch (+ the copy imported by live.py) with queries against the stand-in
+def attach(con, database, live):
+    lock = threading.Lock()
+    def fetch(name, params=(), sql=None):
+        sql = (sql or database.QUERIES[name]).replace('%s', '?')
+        params = [param.item() if hasattr(param, 'item') else param for param in params]     # numpy -> python
+        with lock:
+            return con.execute(sql, params).fetchall()
+    database.fetch = fetch
+    live.fetch = fetch
@@ -1,6 +1,12 @@
+import os
+
 import dash
 from dash import Dash, html, dcc
 
+import snapshot                                                         # shared in-memory snapshot of the warehouse tables
+import memo                                                             # memoized callbacks
+from database import LIVE_QUERY
+
 app = Dash(__name__, use_pages=True, suppress_callback_exceptions=True) # need suppress callback exception for the edit existing customer details form
 
 app.layout = html.Main([
@@ -16,5 +22,17 @@ app.layout = html.Main([
 	dash.page_container
 ], className='app')
 
+# every request reads one version of the snapshot - a refresh swapped in meanwhile is seen by the next request
+app.server.before_request(snapshot.pin)
+app.server.teardown_request(snapshot.unpin)
+
+# hit/miss counters of the memoized callbacks (of this process - one per worker with wsgi.py)
+app.server.add_url_rule('/_memo', 'memo', memo.stats)
+
 if __name__ == '__main__':
+	# the pages load the snapshot on first use - warm it up in the background while the server starts
+	# (only in the process that serves requests, not in the reloader's watcher process)
+	if not LIVE_QUERY and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+		snapshot.warm_up()
+		snapshot.start_refresher()                                      # new rows loaded by the ETL, every Dashboard_Refresh_Seconds
 	app.run_server(debug=True)                                           # for code reloading / hot reloading
\ No newline at end of file
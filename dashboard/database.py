@@ -0,0 +1,420 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+import mysql.connector as mariadb
+from dotenv import load_dotenv              # environment variables
+import os
+#----------------------------------------------------------------------------------------------------------
+# Shared data-access layer for every page of the dashboard.
+# 1. One bounded connection pool per process (instead of a new connection for every table on every page).
+# 2. Prepared statements - each SQL statement is prepared once per pooled connection and then re-used.
+#    (named statements in QUERIES, or parameterized SQL built by the live query mode - see live.py)
+#    Only the PREPARED_CURSORS statements used last stay prepared on a connection - the live query SQL varies
+#    with the filters, the others are closed (deallocated on the server) before max_prepared_stmt_count is reached.
+# 3. Per-query timing - call counts, total and slowest time for every named statement.
+# 4. Write queue - customer edits are coalesced per SSN and written in batches by a background thread.
+#    A failed batch is retried with exponential backoff - after WRITE_RETRIES failed attempts it is appended
+#    to FAILED_WRITES (one JSON line per edit, to be applied by hand) instead of being retried forever.
+#----------------------------------------------------------------------------------------------------------
+# load the environment variables
+load_dotenv()
+
+# assign environment variables
+PASSWORD = os.getenv('MariaDB_Password')
+USER = os.getenv('MariaDB_Username')
+HOST = os.getenv('MariaDB_Host', 'localhost')
+DATABASE = 'creditcard_capstone'
+
+POOL_SIZE = int(os.getenv('MariaDB_Pool_Size', 5))                     # max open connections per process
+POOL_TIMEOUT = float(os.getenv('MariaDB_Pool_Timeout', 30))             # seconds to wait for a free connection
+PREPARED_CURSORS = int(os.getenv('MariaDB_Prepared_Cursors', 32))      # prepared statements kept per connection
+WRITE_RETRIES = int(os.getenv('MariaDB_Write_Retries', 5))              # failed attempts before edits are set aside
+WRITE_BACKOFF = 1                                                       # seconds before the first retry, doubled after each
+FAILED_WRITES = os.getenv('MariaDB_Failed_Writes', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'failed_writes.jsonl'))
+
+# live query mode - callbacks send filtered/aggregated SQL to MariaDB instead of using the in-memory snapshot
+LIVE_QUERY = os.getenv('Dashboard_Live_Query', '').lower() in ('1', 'true', 'yes')
+
+logger = logging.getLogger(__name__)
+
+# column names of each table (same order as the tables in MariaDB)
+CUSTOMER_COLUMNS = ['SSN',
+                    'FIRST_NAME',
+                    'MIDDLE_NAME',
+                    'LAST_NAME',
+                    'CREDIT_CARD_NO',
+                    'FULL_STREET_ADDRESS',
+                    'CUST_CITY',
+                    'CUST_STATE',
+                    'CUST_COUNTRY',
+                    'CUST_ZIP',
+                    'CUST_PHONE',
+                    'CUST_EMAIL',
+                    'LAST_UPDATED']
+
+CREDIT_COLUMNS = ['CUST_CC_NO',
+                  'TIMEID',
+                  'CUST_SSN',
+                  'BRANCH_CODE',
+                  'TRANSACTION_TYPE',
+                  'TRANSACTION_VALUE',
+                  'TRANSACTION_ID']
+
+BRANCH_COLUMNS = ['BRANCH_CODE',
+                  'BRANCH_NAME',
+                  'BRANCH_STREET',
+                  'BRANCH_CITY',
+                  'BRANCH_STATE',
+                  'BRANCH_ZIP',
+                  'BRANCH_PHONE',
+                  'LAST_UPDATED']
+
+STATEMENT_COLUMNS = ['CREDIT_CARD_NO',
+                     'YEAR',
+                     'MONTH',
+                     'CUST_SSN',
+                     'FIRST_NAME',
+                     'LAST_NAME',
+                     'FULL_STREET_ADDRESS',
+                     'CUST_CITY',
+                     'CUST_STATE',
+                     'CUST_ZIP',
+                     'BRANCH_CODE',
+                     'BRANCH_NAME',
+                     'BRANCH_STREET',
+                     'BRANCH_CITY',
+                     'BRANCH_STATE',
+                     'BRANCH_ZIP',
+                     'TRANSACTION_COUNT',
+                     'NEW_BALANCE',
+                     'REWARDS',
+                     'CREDIT_LIMIT',
+                     'AVAILABLE_CREDIT',
+                     'STATEMENT_DATE',
+                     'DUE_DATE']
+
+# columns of each table loaded into the dashboard snapshot
+TABLE_COLUMNS = {
+    'customer': CUSTOMER_COLUMNS,
+    'credit': CREDIT_COLUMNS,
+    'branch': BRANCH_COLUMNS
+}
+
+# change markers of each table - row count + the latest value of a column every load moves forward
+MARKER_COLUMNS = {
+    'customer': ('cdw_sapp_customer', 'LAST_UPDATED'),
+    'credit': ('cdw_sapp_credit_card', 'TRANSACTION_ID'),
+    'branch': ('cdw_sapp_branch', 'LAST_UPDATED')
+}
+
+# customer columns that can be edited (same order as the SET list of the update_customer statement)
+EDITABLE_COLUMNS = ['FIRST_NAME',
+                    'MIDDLE_NAME',
+                    'LAST_NAME',
+                    'CREDIT_CARD_NO',
+                    'FULL_STREET_ADDRESS',
+                    'CUST_CITY',
+                    'CUST_STATE',
+                    'CUST_COUNTRY',
+                    'CUST_ZIP',
+                    'CUST_PHONE',
+                    'CUST_EMAIL']
+
+# SQL statements - written once, prepared once per connection, parameters are always sent separately
+QUERIES = {
+    'customer': f'''
+        SELECT {', '.join(CUSTOMER_COLUMNS)}
+        FROM cdw_sapp_customer
+        ''',
+    'credit': f'''
+        SELECT {', '.join(CREDIT_COLUMNS)}
+        FROM cdw_sapp_credit_card
+        ''',
+    'branch': f'''
+        SELECT {', '.join(BRANCH_COLUMNS)}
+        FROM cdw_sapp_branch
+        ''',
+    **{f'{name}_marker': f'''
+        SELECT COUNT(*), MAX({column})
+        FROM {table_name}
+        ''' for name, (table_name, column) in MARKER_COLUMNS.items()},
+    **{f'{name}_delta': f'''
+        SELECT {', '.join(TABLE_COLUMNS[name])}
+        FROM {table_name}
+        WHERE {column} > %s
+        ''' for name, (table_name, column) in MARKER_COLUMNS.items()},
+    'monthly_statement': f'''
+        SELECT {', '.join(STATEMENT_COLUMNS)}
+        FROM cdw_sapp_monthly_statement
+        WHERE CREDIT_CARD_NO = %s AND YEAR = %s AND MONTH = %s
+        ''',
+    'update_customer': '''
+        UPDATE cdw_sapp_customer
+        SET
+            FIRST_NAME = %s, MIDDLE_NAME = %s, LAST_NAME = %s,
+            CREDIT_CARD_NO = %s, FULL_STREET_ADDRESS = %s, CUST_CITY = %s,
+            CUST_STATE = %s, CUST_COUNTRY = %s, CUST_ZIP = %s,
+            CUST_PHONE = %s, CUST_EMAIL = %s
+        WHERE SSN = %s
+        '''
+}
+#----------------------------------------------------------------------------------------------------------
+# connection pool - each slot holds a connection + the prepared cursors that belong to it
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)                              # most recently used connection first
+_pool_lock = threading.Lock()
+_pool_created = 0
+
+# per-query timing: query name -> {'calls', 'rows', 'total_ms', 'max_ms'}
+_stats = {}
+_stats_lock = threading.Lock()
+
+# write queue: ssn -> latest edited values (a second edit of the same customer replaces the first one)
+_pending = {}
+_pending_changed = threading.Condition()
+_writing = 0                                                            # edits taken by the writer, not committed yet
+_writer = None
+
+def _new_slot():
+    global _pool_created
+    with _pool_lock:
+        if _pool_created >= POOL_SIZE:
+            return None
+        _pool_created += 1
+    try:
+        con = mariadb.connect(
+            host=HOST,
+            user=USER,
+            password=PASSWORD,
+            database=DATABASE
+        )
+        return {'con': con, 'cursors': OrderedDict()}
+    except mariadb.Error:
+        with _pool_lock:
+            _pool_created -= 1
+        raise
+
+def _discard_slot(slot):
+    global _pool_created
+    try:
+        slot['con'].close()
+    except mariadb.Error:
+        pass
+    with _pool_lock:
+        _pool_created -= 1
+
+# re-use an idle connection, open a new one while under POOL_SIZE, otherwise wait for one to be released
+def _get_slot():
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+    slot = _new_slot()
+    if slot is None:
+        try:
+            slot = _pool.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise mariadb.errors.PoolError(f'No free MariaDB connection after {POOL_TIMEOUT} seconds') from None
+    return slot
+
+@contextmanager
+def connection():
+    slot = _get_slot()
+    while not slot['con'].is_connected():                               # server closed an idle connection
+        _discard_slot(slot)
+        slot = _get_slot()
+
+    broken = False
+    try:
+        yield slot
+    except mariadb.Error:
+        broken = True
+        raise
+    finally:
+        if broken:
+            _discard_slot(slot)                                         # never hand a broken connection to the next caller
+        else:
+            _pool.put_nowait(slot)
+
+def _prepared_cursor(slot, sql):
+    # MySQLCursorPrepared only re-prepares when the SQL text changes, so one cursor per statement keeps it prepared
+    cursors = slot['cursors']
+    cur = cursors.get(sql)
+    if cur is not None:
+        cursors.move_to_end(sql)                                        # least recently used first
+        return cur
+    while len(cursors) >= PREPARED_CURSORS:
+        _, evicted = cursors.popitem(last=False)
+        evicted.close()                                                 # deallocates the statement on the server
+    cur = slot['con'].cursor(prepared=True)
+    cursors[sql] = cur
+    return cur
+
+def _record(name, start, rows):
+    elapsed = (time.perf_counter() - start) * 1000
+    with _stats_lock:
+        stats = _stats.setdefault(name, {'calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['rows'] += rows
+        stats['total_ms'] += elapsed
+        stats['max_ms'] = max(stats['max_ms'], elapsed)
+    logger.debug('%s: %d rows in %.1f ms', name, rows, elapsed)
+
+def get_query_stats():
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+#----------------------------------------------------------------------------------------------------------
+# run a named SELECT statement (or parameterized `sql`, timed under `name`) and return the rows
+def fetch(name, params=(), sql=None):
+    sql = sql or QUERIES[name]
+    start = time.perf_counter()
+    with connection() as slot:
+        cur = _prepared_cursor(slot, sql)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    _record(name, start, len(rows))
+    return rows
+
+# run a named INSERT/UPDATE/DELETE statement and return the number of affected rows
+def execute(name, params=()):
+    start = time.perf_counter()
+    with connection() as slot:
+        cur = _prepared_cursor(slot, QUERIES[name])
+        cur.execute(QUERIES[name], params)
+        slot['con'].commit()
+        rowcount = cur.rowcount
+    _record(name, start, rowcount)
+    return rowcount
+
+# run a named INSERT/UPDATE/DELETE statement once per set of parameters - one transaction, one commit
+def execute_many(name, params_list):
+    start = time.perf_counter()
+    rowcount = 0
+    with connection() as slot:
+        cur = _prepared_cursor(slot, QUERIES[name])
+        try:
+            for params in params_list:
+                cur.execute(QUERIES[name], params)
+                rowcount += cur.rowcount
+            slot['con'].commit()
+        except mariadb.Error:
+            slot['con'].rollback()
+            raise
+    _record(name, start, rowcount)
+    return rowcount
+#----------------------------------------------------------------------------------------------------------
+# write queue - the callback only queues the edit, the writer thread applies every pending edit in one batch
+def queue_customer_update(ssn, values):
+    global _writer
+    with _pending_changed:
+        _pending[ssn] = {column: values[column] for column in EDITABLE_COLUMNS}
+        if _writer is None:
+            _writer = threading.Thread(target=_write_pending, name='customer-writer', daemon=True)
+            _writer.start()
+        _pending_changed.notify_all()
+
+def _write_pending():
+    global _writing
+    failures = 0                                                        # failed attempts in a row
+    while True:
+        with _pending_changed:
+            while not _pending:
+                _pending_changed.wait()
+            batch = dict(_pending)
+            _pending.clear()
+            _writing = len(batch)
+
+        try:
+            execute_many('update_customer', [[values[column] for column in EDITABLE_COLUMNS] + [ssn]
+                                             for ssn, values in batch.items()])
+            failures = 0
+        except mariadb.Error as err:
+            failures += 1
+            if failures > WRITE_RETRIES:
+                logger.error('customer edits not written after %d attempts (%s) - %d edits saved to %s',
+                             failures, err, len(batch), FAILED_WRITES)
+                _save_failed(batch)
+                failures = 0
+            else:
+                backoff = WRITE_BACKOFF * 2 ** (failures - 1)
+                logger.warning('customer edits not written (attempt %d of %d): %s - retrying in %g s',
+                               failures, WRITE_RETRIES + 1, err, backoff)
+                with _pending_changed:
+                    for ssn, values in batch.items():
+                        _pending.setdefault(ssn, values)                # retry, unless edited again meanwhile
+                time.sleep(backoff)
+        finally:
+            with _pending_changed:
+                _writing = 0
+                _pending_changed.notify_all()
+
+# edits given up on - appended to FAILED_WRITES, so they can still be applied once MariaDB is back
+def _save_failed(batch):
+    try:
+        with open(FAILED_WRITES, 'a') as f:
+            for ssn, values in batch.items():
+                f.write(json.dumps({'ssn': ssn, 'values': values}, default=str) + '\n')
+    except OSError:
+        logger.exception('could not save %d customer edits to %s: %s', len(batch), FAILED_WRITES, batch)
+
+# wait until every queued edit has been written (returns False on timeout) - also runs when the server stops
+def flush_writes(timeout=POOL_TIMEOUT):
+    with _pending_changed:
+        return _pending_changed.wait_for(lambda: not _pending and not _writing, timeout)
+
+atexit.register(flush_writes)
+#----------------------------------------------------------------------------------------------------------
+# functions: get data + update data
+def get_customer_data():
+    try:
+        return pd.DataFrame(fetch('customer'), columns=CUSTOMER_COLUMNS)
+    except mariadb.Error as err:
+        print(err)
+
+def get_credit_data():
+    try:
+        return pd.DataFrame(fetch('credit'), columns=CREDIT_COLUMNS)
+    except mariadb.Error as err:
+        print(err)
+
+def get_branch_data():
+    try:
+        return pd.DataFrame(fetch('branch'), columns=BRANCH_COLUMNS)
+    except mariadb.Error as err:
+        print(err)
+
+# [row count, max marker column] of a table - the snapshot cache is only used while this stays the same
+# (max is None for an empty table)
+def get_table_marker(name):
+    try:
+        count, latest = fetch(f'{name}_marker')[0]
+        return [count, None if latest is None else str(latest)]
+    except mariadb.Error as err:
+        print(err)
+
+# rows of a table with a later marker column value than `after` - the new/changed rows a snapshot refresh fetches
+def get_new_data(name, after):
+    try:
+        return pd.DataFrame(fetch(f'{name}_delta', (after,)), columns=TABLE_COLUMNS[name])
+    except mariadb.Error as err:
+        print(err)
+
+# one precomputed monthly statement (built by the credit ETL) - None if there is no statement
+# (a MariaDB error is raised, not returned as None - the bill page must not memoize a failed lookup)
+def get_monthly_statement(credit_card_no, year, month):
+    rows = fetch('monthly_statement', (str(credit_card_no), int(year), int(month)))
+    return dict(zip(STATEMENT_COLUMNS, rows[0])) if rows else None
+
+# args: first, middle, last, credit card, street, city, state, country, zip, phone, email, ssn
+def update_customer_data(*args):
+    try:
+        return execute('update_customer', args[:12]) > 0
+    except mariadb.Error as err:
+        print(err)
@@ -0,0 +1,330 @@
+import copy
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+
+from snapshot import get, derived, patches, updates
+#----------------------------------------------------------------------------------------------------------
+# Indexes over the shared snapshot - built once (on first use) so the callbacks do lookups instead of full scans.
+# 1. Partition index: rows of the transactions frame ordered by (year, month), year, month and zip code.
+# 2. Rollups: count + total value per transaction type, distinct branches + total value per customer state.
+# 3. Card ledger: rows of the transactions frame ordered by credit card number + (year, month), + per-month totals.
+# 4. Name index: normalized full names -> SSNs, + sorted names per field for prefix autocomplete.
+# 5. Customer index: rows ordered by SSN + day, so a customer's date range is two binary searches.
+# The partition, card + customer indexes are frames of int32 columns - row positions next to their sorted keys, so
+# a lookup is two binary searches + a slice, and they can be published to the WSGI workers like the tables.
+#----------------------------------------------------------------------------------------------------------
+EMPTY = np.array([], dtype=np.intp)
+
+# integer year + month + day of every row in the transactions frame (dates are parsed once, at load time)
+@derived('calendar')
+def build_calendar():
+    timeid = get('transactions')['TIMEID']                             # datetime64 (snapshot.COLUMN_TYPES)
+    return pd.DataFrame({'YEAR': timeid.dt.year.to_numpy(np.int32),
+                         'MONTH': timeid.dt.month.to_numpy(np.int32),
+                         'DAY': timeid.to_numpy().astype('datetime64[D]')})
+
+# partition index - row positions of the transactions frame ordered by each key (ascending within a key)
+# + the keys in the same order: YEAR_MONTH_ROW / YEAR_MONTH, YEAR_ROW / YEAR, MONTH_ROW / MONTH, ZIP_ROW / ZIP
+@derived('partitions', customer_columns=('CUST_ZIP',))
+def build_partitions():
+    calendar = get('calendar')
+    keys = {'YEAR_MONTH': calendar['YEAR'].to_numpy() * 100 + calendar['MONTH'].to_numpy(),
+            'YEAR': calendar['YEAR'].to_numpy(),
+            'MONTH': calendar['MONTH'].to_numpy(),
+            'ZIP': get('transactions')['CUST_ZIP'].to_numpy()}
+    columns = {}
+    for name, key in keys.items():
+        order = np.argsort(key, kind='stable')                      # stable - rows stay ascending within a key
+        columns[f'{name}_ROW'] = order.astype(np.int32)
+        columns[name] = key[order]
+    return pd.DataFrame(columns)
+
+# sorted years / months / zipcodes found in the transactions
+@derived('partition_values', customer_columns=('CUST_ZIP',))
+def build_partition_values():
+    index = get('partitions')
+    values = {}
+    for name, column in (('years', 'YEAR'), ('months', 'MONTH'), ('zipcodes', 'ZIP')):
+        keys = index[column].to_numpy()
+        values[name] = keys[np.r_[True, keys[1:] != keys[:-1]]].tolist() if len(keys) else []
+    return values
+
+def partition_keys(name):
+    return get('partition_values')[name]
+
+# row positions of the keys in [low, high] - two binary searches in the sorted keys
+# (values are cast to the keys' type - searching an int32 array for a python int converts the whole array)
+def key_rows(index, column, low, high=None):
+    keys = index[column].to_numpy()
+    start = np.searchsorted(keys, keys.dtype.type(low), side='left')
+    end = np.searchsorted(keys, keys.dtype.type(low if high is None else high), side='right')
+    return index[f'{column}_ROW'].to_numpy()[start:end]
+
+# row positions matching the filters (None = no filter = every row)
+def partition_rows(zipcode=None, month=None, year=None):
+    index = get('partitions')
+
+    if month is not None and year is not None:
+        rows = key_rows(index, 'YEAR_MONTH', year * 100 + month)
+    elif month is not None:
+        rows = key_rows(index, 'MONTH', month)
+    elif year is not None:
+        rows = key_rows(index, 'YEAR', year)
+    else:
+        rows = None
+
+    if zipcode is not None:
+        zipcode_rows = key_rows(index, 'ZIP', zipcode)
+        rows = zipcode_rows if rows is None else np.intersect1d(rows, zipcode_rows, assume_unique=True)
+
+    return rows
+#----------------------------------------------------------------------------------------------------------
+# card ledger - row positions of the transactions frame ordered by card, year + month (ascending within a month)
+# + CARD_MONTH = card * 1000000 + year * 100 + month (card = position of the card number in the categories)
+@derived('cards', customer_columns=('CREDIT_CARD_NO',))
+def build_cards():
+    calendar = get('calendar')
+    cards = get('transactions')['CREDIT_CARD_NO'].cat.codes.to_numpy().astype(np.int64)
+    keys = cards * 1000000 + calendar['YEAR'].to_numpy() * 100 + calendar['MONTH'].to_numpy()
+    order = np.argsort(keys, kind='stable')
+    return pd.DataFrame({'CARD_MONTH_ROW': order.astype(np.int32), 'CARD_MONTH': keys[order]})
+
+# per-month ledgers - one row per card + month (CARD_MONTH, ascending): START + COUNT of its rows in the card ledger
+# + their TOTAL value, summed once here instead of on every bill lookup (rebuilt with the card ledger)
+@derived('card_months', customer_columns=('CREDIT_CARD_NO',))
+def build_card_months():
+    cards = get('cards')
+    keys = cards['CARD_MONTH'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else EMPTY
+    values = get('transactions')['TRANSACTION_VALUE'].to_numpy()[cards['CARD_MONTH_ROW'].to_numpy()]
+    return pd.DataFrame({'CARD_MONTH': keys[starts],
+                         'START': starts.astype(np.int32),
+                         'COUNT': np.diff(np.r_[starts, len(keys)]).astype(np.int32),
+                         'TOTAL': np.add.reduceat(values, starts) if len(keys) else np.array([], dtype=np.float64)})
+
+def card_key(credit_card_no):
+    try:
+        return get('transactions')['CREDIT_CARD_NO'].cat.categories.get_loc(credit_card_no) * 1000000
+    except KeyError:
+        return None
+
+# True if the card has any transactions
+def card_exists(credit_card_no):
+    key = card_key(credit_card_no)
+    if key is None:
+        return False
+    keys = get('card_months')['CARD_MONTH'].to_numpy()
+    position = np.searchsorted(keys, keys.dtype.type(key))
+    return bool(position < len(keys) and keys[position] <= key + 999999)
+
+# a card's transactions in one month - {'rows', 'total', 'count'} (None if there are none)
+def card_month(credit_card_no, year, month):
+    key = card_key(credit_card_no)
+    if key is None:
+        return None
+    months = get('card_months')
+    keys = months['CARD_MONTH'].to_numpy()
+    position = np.searchsorted(keys, keys.dtype.type(key + year * 100 + month))
+    if position == len(keys) or keys[position] != key + year * 100 + month:
+        return None
+    start, count = int(months['START'].iat[position]), int(months['COUNT'].iat[position])
+    return {'rows': get('cards')['CARD_MONTH_ROW'].to_numpy()[start:start + count],
+            'total': float(months['TOTAL'].iat[position]),
+            'count': count}
+#----------------------------------------------------------------------------------------------------------
+# customer index - row positions of the transactions frame ordered by customer + day (ascending) + the SSN
+# and DAY of each, in the same order: CUSTOMER_ROW / SSN / DAY
+@derived('customers')
+def build_customers():
+    ssns = get('transactions')['SSN'].to_numpy()
+    order = len(ssns) - 1 - np.argsort(ssns[::-1], kind='stable')  # within a customer: last row (earliest day) first
+    return pd.DataFrame({'CUSTOMER_ROW': order.astype(np.int32),
+                         'SSN': ssns[order],
+                         'DAY': get('calendar')['DAY'].to_numpy()[order]})
+
+# row positions of a customer's transactions between two dates (inclusive), ordered by day in descending order
+def customer_rows(ssn, start_date=None, end_date=None):
+    index = get('customers')
+    ssns = index['SSN'].to_numpy()
+    first = np.searchsorted(ssns, ssns.dtype.type(ssn), side='left')
+    last = np.searchsorted(ssns, ssns.dtype.type(ssn), side='right')
+    rows = index['CUSTOMER_ROW'].to_numpy()[first:last]
+    days = index['DAY'].to_numpy()[first:last]
+    start = 0
+    end = len(rows)
+    if start_date:
+        start = np.searchsorted(days, np.datetime64(pd.to_datetime(start_date).date(), 'D'), side='left')
+    if end_date:
+        end = np.searchsorted(days, np.datetime64(pd.to_datetime(end_date).date(), 'D'), side='right')
+    return rows[start:end][::-1]
+#----------------------------------------------------------------------------------------------------------
+# rollups - built once over all transactions, then only new transactions are added (update_rollups)
+@derived('rollups', customer_columns=('CUST_STATE',))
+def build_rollups():
+    rollups = {'transaction_type': {}, 'state': {}}
+    update_rollups(rollups, get('transactions'))
+    return rollups
+
+# new transactions (snapshot refresh) - added to a copy, callbacks still on the previous version keep theirs
+@updates('rollups')
+def add_to_rollups(rollups, transactions_df):
+    rollups = copy.deepcopy(rollups)
+    update_rollups(rollups, transactions_df)
+    return rollups
+
+# add a batch of transactions to the rollups
+def update_rollups(rollups, transactions_df):
+    # observed=True - only the types/states in this batch (not every category of the column)
+    by_type = transactions_df.groupby('TRANSACTION_TYPE', observed=True)['TRANSACTION_VALUE'].agg(['count', 'sum'])
+    for transaction_type, row in by_type.iterrows():
+        totals = rollups['transaction_type'].setdefault(transaction_type, {'count': 0, 'sum': 0.0})
+        totals['count'] += int(row['count'])
+        totals['sum'] += float(row['sum'])
+
+    by_state = transactions_df.groupby('CUST_STATE', observed=True).agg(sum=('TRANSACTION_VALUE', 'sum'), 
+                                                         branches=('BRANCH_CODE', 'unique'))
+    for state, row in by_state.iterrows():
+        totals = rollups['state'].setdefault(state, {'branches': set(), 'sum': 0.0})
+        totals['branches'].update(row['branches'])
+        totals['sum'] += float(row['sum'])
+
+# number of transactions + total dollars for a transaction type
+def transaction_type_totals(transaction_type):
+    totals = get('rollups')['transaction_type'].get(transaction_type, {'count': 0, 'sum': 0.0})
+    return totals['count'], totals['sum']
+
+# number of branches + total dollars for a customer state
+def state_totals(state):
+    totals = get('rollups')['state'].get(state, {'branches': set(), 'sum': 0.0})
+    return len(totals['branches']), totals['sum']
+
+# sorted list of the transaction types / customer states
+def rollup_keys(name):
+    return sorted(get('rollups')[name])
+#----------------------------------------------------------------------------------------------------------
+# name index - normalized (lowercase, stripped) names, so a search never touches the name columns
+NAME_COLUMNS = ['FIRST_NAME', 'MIDDLE_NAME', 'LAST_NAME']
+
+def normalize(name):
+    return str(name).strip().lower() if name is not None else ''
+
+@derived('names', customer_columns=NAME_COLUMNS, tables=('customer',))
+def build_names():
+    customer_df = get('customer')
+    index = {
+        'full_name': {},                                            # (first, middle, last) -> [ssn, ...]
+        'customer': {},                                             # ssn -> (first, middle, last)
+        'row': {},                                                  # ssn -> row position in the customer frame
+        'ssns': {column: {} for column in NAME_COLUMNS},            # name -> {ssn, ...}
+        'sorted': {column: [] for column in NAME_COLUMNS},          # sorted names - prefix search with bisect
+        'display': {column: {} for column in NAME_COLUMNS}          # name -> name as written in the table
+    }
+    names = customer_df[NAME_COLUMNS].itertuples(index=False, name=None)
+    for row, (ssn, full_name) in enumerate(zip(customer_df['SSN'], names)):
+        index['row'][ssn] = row
+        _add_name(index, ssn, full_name)
+    for column in NAME_COLUMNS:
+        index['sorted'][column].sort()
+    return index
+
+def _add_name(index, ssn, full_name, keep_sorted=False):
+    key = tuple(normalize(name) for name in full_name)
+    index['full_name'].setdefault(key, []).append(ssn)
+    index['customer'][ssn] = key
+    for column, name, value in zip(NAME_COLUMNS, key, full_name):
+        ssns = index['ssns'][column].setdefault(name, set())
+        if not ssns:
+            index['display'][column][name] = value
+            if keep_sorted:
+                insort(index['sorted'][column], name)
+            else:
+                index['sorted'][column].append(name)
+        ssns.add(ssn)
+
+def _remove_name(index, ssn):
+    key = index['customer'].pop(ssn)
+    index['full_name'][key].remove(ssn)
+    if not index['full_name'][key]:
+        del index['full_name'][key]
+    for column, name in zip(NAME_COLUMNS, key):
+        ssns = index['ssns'][column][name]
+        ssns.discard(ssn)
+        if not ssns:
+            del index['ssns'][column][name]
+            del index['display'][column][name]
+            names = index['sorted'][column]
+            del names[bisect_left(names, name)]
+
+# keep the name index correct after a customer's name is edited - on a copy, callbacks still on the previous
+# version keep theirs (only the dicts + the entries of the old and new name are copied, the rest is shared)
+@patches('names')
+def patch_names(index, ssn, values):
+    full_name = tuple(values[column] for column in NAME_COLUMNS)
+    keys = [index['customer'][ssn], tuple(normalize(name) for name in full_name)]
+    index = {'full_name': dict(index['full_name']),
+             'customer': dict(index['customer']),
+             'row': index['row'],
+             'ssns': {column: dict(names) for column, names in index['ssns'].items()},
+             'sorted': {column: list(names) for column, names in index['sorted'].items()},
+             'display': {column: dict(names) for column, names in index['display'].items()}}
+    for key in keys:
+        if key in index['full_name']:
+            index['full_name'][key] = list(index['full_name'][key])
+        for column, name in zip(NAME_COLUMNS, key):
+            if name in index['ssns'][column]:
+                index['ssns'][column][name] = set(index['ssns'][column][name])
+
+    _remove_name(index, ssn)
+    _add_name(index, ssn, full_name, keep_sorted=True)
+    return index
+
+# SSNs of the customers with this full name (case-insensitive)
+def find_customers(first, middle, last):
+    return get('names')['full_name'].get((normalize(first), normalize(middle), normalize(last)), [])
+
+# row position of a customer in the customer frame
+def customer_row(ssn):
+    return get('names')['row'][ssn]
+
+# SSNs of the customers whose name (in one field) is `name`, or starts with it if no name matches exactly
+def _prefix_ssns(index, column, name):
+    if name in index['ssns'][column]:
+        return index['ssns'][column][name]
+
+    names = index['sorted'][column]
+    ssns = set()
+    for position in range(bisect_left(names, name), len(names)):
+        if not names[position].startswith(name):
+            break
+        ssns |= index['ssns'][column][names[position]]
+    return ssns
+
+# up to `limit` names for one field starting with what was typed, matching the other names typed (autocomplete)
+def suggest_names(column, first, middle, last, limit=10):
+    index = get('names')
+    typed = dict(zip(NAME_COLUMNS, (normalize(first), normalize(middle), normalize(last))))
+    prefix = typed.pop(column)
+
+    # customers matching the other names that were typed (a whole name, or the start of one)
+    candidates = None
+    for other_column, name in typed.items():
+        if name:
+            ssns = _prefix_ssns(index, other_column, name)
+            candidates = ssns if candidates is None else candidates & ssns
+
+    position = NAME_COLUMNS.index(column)
+    if candidates is None:
+        names = index['sorted'][column]
+        start = bisect_left(names, prefix)
+        matches = []
+        for name in names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+    else:
+        matches = sorted({index['customer'][ssn][position] for ssn in candidates 
+                          if index['customer'][ssn][position].startswith(prefix)})[:limit]
+
+    return [index['display'][column][name] for name in matches]
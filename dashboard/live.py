@@ -0,0 +1,231 @@
+import pandas as pd
+
+import memo                                 # the sidebar/dropdown lists are re-queried every Dashboard_Memo_Seconds
+from database import fetch, CUSTOMER_COLUMNS
+#----------------------------------------------------------------------------------------------------------
+# Live query mode (Dashboard_Live_Query=1) - MariaDB does the filtering, aggregation, sorting and paging.
+# 1. Every query is parameterized - user input is only ever sent as a parameter, never formatted into SQL.
+# 2. Column names + sort directions come from fixed lists below, never from the browser.
+# 3. Nothing is loaded at startup - the small lists used to build the page layouts are queried on first use,
+#    then again once they are older than Dashboard_Memo_Seconds (values loaded since show up).
+#----------------------------------------------------------------------------------------------------------
+# data table column -> SQL column (credit card transactions joined with the customer's zip + state)
+TRANSACTION_COLUMNS = {
+    'CUST_CC_NO': 'cc.CUST_CC_NO',
+    'TIMEID': 'cc.TIMEID',
+    'BRANCH_CODE': 'cc.BRANCH_CODE',
+    'TRANSACTION_TYPE': 'cc.TRANSACTION_TYPE',
+    'TRANSACTION_VALUE': 'cc.TRANSACTION_VALUE',
+    'TRANSACTION_ID': 'cc.TRANSACTION_ID',
+    'CUST_ZIP': 'c.CUST_ZIP',
+    'CUST_STATE': 'c.CUST_STATE'
+}
+
+TRANSACTIONS_FROM = '''
+        FROM cdw_sapp_credit_card cc
+        JOIN cdw_sapp_customer c ON c.SSN = cc.CUST_SSN
+        '''
+
+# data table filter operator -> SQL operator
+OPERATORS = {'eq': '=', 'ne': '<>', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+# lists used by the page layouts (sidebar filters + dropdowns)
+DISTINCT_QUERIES = {
+    'zipcodes': 'SELECT DISTINCT CUST_ZIP FROM cdw_sapp_customer ORDER BY CUST_ZIP',
+    'months': 'SELECT DISTINCT CAST(SUBSTRING(TIMEID, 5, 2) AS UNSIGNED) AS MONTH FROM cdw_sapp_credit_card ORDER BY MONTH',
+    'years': 'SELECT DISTINCT CAST(SUBSTRING(TIMEID, 1, 4) AS UNSIGNED) AS YEAR FROM cdw_sapp_credit_card ORDER BY YEAR',
+    'transaction_type': 'SELECT DISTINCT TRANSACTION_TYPE FROM cdw_sapp_credit_card ORDER BY TRANSACTION_TYPE',
+    'state': 'SELECT DISTINCT CUST_STATE FROM cdw_sapp_customer ORDER BY CUST_STATE'
+}
+
+# TIMEID is stored as YYYYMMDD text - None if the value is not a date
+def to_timeid(value):
+    try:
+        return pd.to_datetime(str(value)).strftime('%Y%m%d')
+    except ValueError:
+        return None
+
+# LIKE pattern matching the text itself - % and _ typed by the user are not wildcards (used with ESCAPE '!')
+def like_text(text):
+    return str(text).replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+def to_dates(dataframe):
+    dataframe['TIMEID'] = pd.to_datetime(dataframe['TIMEID'], format='%Y%m%d').dt.date
+    return dataframe
+
+@memo.memoize
+def distinct(name):
+    return [row[0] for row in fetch(f'distinct_{name}', sql=DISTINCT_QUERIES[name])]
+
+def date_range():
+    rows = fetch('date_range', sql='SELECT MIN(TIMEID), MAX(TIMEID) FROM cdw_sapp_credit_card')
+    return [pd.to_datetime(value, format='%Y%m%d').date() for value in rows[0]]
+#----------------------------------------------------------------------------------------------------------
+# All Customer Transactions page
+
+# WHERE clause + parameters for the sidebar filters and the data table filter query
+def transactions_where(zipcode=None, month=None, year=None, filters=()):
+    conditions = []
+    params = []
+
+    if zipcode is not None:
+        conditions.append('c.CUST_ZIP = %s')
+        params.append(int(zipcode))
+    if year is not None and month is not None:
+        conditions.append('cc.TIMEID LIKE %s')                         # prefix match - can use an index on TIMEID
+        params.append(f'{int(year):04d}{int(month):02d}%')
+    elif year is not None:
+        conditions.append('cc.TIMEID LIKE %s')
+        params.append(f'{int(year):04d}%')
+    elif month is not None:
+        conditions.append('SUBSTRING(cc.TIMEID, 5, 2) = %s')
+        params.append(f'{int(month):02d}')
+
+    for column, operator, value in filters:
+        if column not in TRANSACTION_COLUMNS:
+            continue
+        sql_column = TRANSACTION_COLUMNS[column]
+        if column == 'TIMEID' and operator in OPERATORS:
+            value = to_timeid(value)
+            if value is None:
+                conditions.append('1 = 0')                              # not a date - no row matches
+                continue
+
+        if operator in OPERATORS:
+            conditions.append(f'{sql_column} {OPERATORS[operator]} %s')
+            params.append(value)
+        elif operator == 'contains':
+            conditions.append(f"{sql_column} LIKE %s ESCAPE '!'")
+            params.append(f'%{like_text(value)}%')
+        elif operator == 'datestartswith':
+            conditions.append(f"{sql_column} LIKE %s ESCAPE '!'")
+            params.append(like_text(str(value).replace('-', '')) + '%')
+
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    return where, params
+
+# one page of the data table + the total number of matching rows
+def transactions_page(zipcode, month, year, filters, sort_by, page_current, page_size):
+    where, params = transactions_where(zipcode, month, year, filters)
+
+    order_by = 'cc.TIMEID DESC'
+    if sort_by and sort_by[0]['column_id'] in TRANSACTION_COLUMNS:
+        direction = 'ASC' if sort_by[0]['direction'] == 'asc' else 'DESC'
+        order_by = f'{TRANSACTION_COLUMNS[sort_by[0]["column_id"]]} {direction}'
+    order_by += ', cc.TRANSACTION_ID'                                   # unique tie-breaker - pages never overlap
+
+    columns = ', '.join(f'{sql_column} AS {column}' for column, sql_column in TRANSACTION_COLUMNS.items())
+    rows = fetch('transactions_page',
+                 params + [int(page_size), int(page_current or 0) * int(page_size)],
+                 sql=f'SELECT {columns} {TRANSACTIONS_FROM} {where} ORDER BY {order_by} LIMIT %s OFFSET %s')
+    total = fetch('transactions_count', params, sql=f'SELECT COUNT(*) {TRANSACTIONS_FROM} {where}')[0][0]
+
+    return to_dates(pd.DataFrame(rows, columns=list(TRANSACTION_COLUMNS))), total
+
+# number of transactions + total dollars for a transaction type
+def transaction_type_totals(transaction_type):
+    rows = fetch('transaction_type_totals', (transaction_type,), sql='''
+        SELECT COUNT(*), COALESCE(SUM(TRANSACTION_VALUE), 0)
+        FROM cdw_sapp_credit_card
+        WHERE TRANSACTION_TYPE = %s
+        ''')
+    return int(rows[0][0]), float(rows[0][1])
+
+# number of branches + total dollars for a customer state
+def state_totals(state):
+    rows = fetch('state_totals', (state,), sql=f'''
+        SELECT COUNT(DISTINCT cc.BRANCH_CODE), COALESCE(SUM(cc.TRANSACTION_VALUE), 0)
+        {TRANSACTIONS_FROM}
+        WHERE c.CUST_STATE = %s
+        ''')
+    return int(rows[0][0]), float(rows[0][1])
+#----------------------------------------------------------------------------------------------------------
+# Monthly Bill page
+
+# True if the card has any transactions (as indexes.card_exists - a card without any has no bill)
+def card_exists(credit_card_no):
+    return bool(fetch('card_exists', (credit_card_no,), sql=f'''
+        SELECT 1
+        {TRANSACTIONS_FROM}
+        WHERE c.CREDIT_CARD_NO = %s
+        LIMIT 1
+        '''))
+
+# a card's transactions for one month (ordered by day in descending order)
+def card_month(credit_card_no, year, month):
+    rows = fetch('card_month', (credit_card_no, f'{int(year):04d}{int(month):02d}%'), sql=f'''
+        SELECT cc.TIMEID, cc.TRANSACTION_TYPE, cc.TRANSACTION_VALUE, cc.CUST_SSN AS SSN, cc.BRANCH_CODE, cc.TRANSACTION_ID
+        {TRANSACTIONS_FROM}
+        WHERE c.CREDIT_CARD_NO = %s AND cc.TIMEID LIKE %s
+        ORDER BY cc.TIMEID DESC
+        ''')
+    return to_dates(pd.DataFrame(rows, columns=['TIMEID', 'TRANSACTION_TYPE', 'TRANSACTION_VALUE', 'SSN', 'BRANCH_CODE', 'TRANSACTION_ID']))
+
+def branch(branch_code):
+    rows = fetch('branch_by_code', (int(branch_code),), sql='''
+        SELECT BRANCH_NAME, BRANCH_STREET, BRANCH_CITY, BRANCH_STATE, BRANCH_ZIP
+        FROM cdw_sapp_branch
+        WHERE BRANCH_CODE = %s
+        ''')
+    return dict(zip(['BRANCH_NAME', 'BRANCH_STREET', 'BRANCH_CITY', 'BRANCH_STATE', 'BRANCH_ZIP'], rows[0]))
+#----------------------------------------------------------------------------------------------------------
+# Customer Details page
+
+# first customer with this full name - the default MariaDB collation is case-insensitive
+def find_customer(first, middle, last):
+    rows = fetch('find_customer', (first.strip(), middle.strip(), last.strip()), sql=f'''
+        SELECT {', '.join(CUSTOMER_COLUMNS)}
+        FROM cdw_sapp_customer
+        WHERE FIRST_NAME = %s AND MIDDLE_NAME = %s AND LAST_NAME = %s
+        LIMIT 1
+        ''')
+    return pd.DataFrame(rows, columns=CUSTOMER_COLUMNS)
+
+def customer(ssn):
+    rows = fetch('customer_by_ssn', (int(ssn),), sql=f'''
+        SELECT {', '.join(CUSTOMER_COLUMNS)}
+        FROM cdw_sapp_customer
+        WHERE SSN = %s
+        ''')
+    return dict(zip(CUSTOMER_COLUMNS, rows[0]))
+
+# a customer's transactions between two dates (ordered by day in descending order)
+def customer_transactions(ssn, start_date=None, end_date=None):
+    conditions = 'CUST_SSN = %s'
+    params = [int(ssn)]
+    if start_date and end_date:
+        conditions += ' AND TIMEID BETWEEN %s AND %s'
+        params += [to_timeid(start_date), to_timeid(end_date)]
+
+    rows = fetch('customer_transactions', params, sql=f'''
+        SELECT CUST_CC_NO, TIMEID, BRANCH_CODE, TRANSACTION_TYPE, TRANSACTION_VALUE, TRANSACTION_ID
+        FROM cdw_sapp_credit_card
+        WHERE {conditions}
+        ORDER BY TIMEID DESC
+        ''')
+    return to_dates(pd.DataFrame(rows, columns=['CREDIT_CARD_NO',
+                                                'TIMEID',
+                                                'BRANCH_CODE',
+                                                'TRANSACTION_TYPE',
+                                                'TRANSACTION_VALUE',
+                                                'TRANSACTION_ID']))
+
+# up to `limit` names for one field starting with what was typed, matching the other names typed (autocomplete)
+def suggest_names(column, first, middle, last, limit=10):
+    typed = dict(zip(['FIRST_NAME', 'MIDDLE_NAME', 'LAST_NAME'],
+                     ((name or '').strip() for name in (first, middle, last))))
+    conditions = []
+    params = []
+    for name_column, name in typed.items():
+        if name or name_column == column:
+            conditions.append(f"{name_column} LIKE %s ESCAPE '!'")
+            params.append(like_text(name) + '%')
+
+    rows = fetch(f'suggest_{column.lower()}', params + [limit], sql=f'''
+        SELECT DISTINCT {column}
+        FROM cdw_sapp_customer
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {column}
+        LIMIT %s
+        ''')
+    return [row[0] for row in rows]
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import snapshot
+#----------------------------------------------------------------------------------------------------------
+# Memoized callbacks - a callback's output only depends on its inputs + the snapshot it reads, so the result of
+# a popular filter is computed once and re-used by every request with the same inputs.
+# 1. Key: the snapshot version the request is pinned to + the inputs (active_cell dicts, sort_by lists, ... made
+#    hashable). A refresh or a customer edit bumps the version - results of older versions are never served again.
+# 2. Each callback keeps its MEMO_SIZE most recently used results, for at most MEMO_SECONDS - in live query mode
+#    MariaDB changes without a new version, so that is how stale a result can get there.
+# 3. Results are shared between requests - like the snapshot frames, they are read-only (Dash only serializes them).
+# 4. Hits + misses are counted per callback - stats(), or /_memo on the running server.
+#----------------------------------------------------------------------------------------------------------
+MEMO_SIZE = int(os.getenv('Dashboard_Memo_Size', 256))                  # results kept per callback (0 = off)
+MEMO_SECONDS = float(os.getenv('Dashboard_Memo_Seconds', 300))          # seconds a result is served (0 = no limit)
+
+# callback name -> its results (key -> (time stored, result), least recently used first) + counters
+RESULTS = {}
+COUNTERS = {}
+
+_lock = threading.Lock()                    # held for a lookup/store only, never while a callback runs
+
+def memoize(function):
+    name = function.__name__
+    results = RESULTS[name] = OrderedDict()
+    counters = COUNTERS[name] = {'hits': 0, 'misses': 0}
+
+    @wraps(function)
+    def memoized(*args, **kwargs):
+        if MEMO_SIZE <= 0:
+            return function(*args, **kwargs)
+        try:
+            key = (snapshot.version(), freeze(args), freeze(kwargs))
+            hash(key)
+        except TypeError:                                               # an input that cannot be a key - not memoized
+            return function(*args, **kwargs)
+
+        with _lock:
+            entry = results.get(key)
+            if entry is not None and (not MEMO_SECONDS or time.monotonic() - entry[0] < MEMO_SECONDS):
+                results.move_to_end(key)
+                counters['hits'] += 1
+                return entry[1]
+            counters['misses'] += 1
+
+        result = function(*args, **kwargs)                              # exceptions (e.g. PreventUpdate) are not stored
+        with _lock:
+            results[key] = (time.monotonic(), result)
+            results.move_to_end(key)
+            while len(results) > MEMO_SIZE:
+                results.popitem(last=False)
+        return result
+    return memoized
+
+# callback input -> hashable value (dicts + lists -> tuples, tagged so a dict never equals a list)
+def freeze(value):
+    if isinstance(value, dict):
+        return dict, tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return list, tuple(freeze(item) for item in value)
+    return value
+
+# callback name -> {'hits', 'misses', 'size'}
+def stats():
+    with _lock:
+        return {name: {**counters, 'size': len(RESULTS[name])} for name, counters in COUNTERS.items()}
+
+def clear():
+    with _lock:
+        for results in RESULTS.values():
+            results.clear()
@@ -1,265 +1,189 @@
-import numpy as np
 import pandas as pd
 
-import mysql.connector as mariadb
-from dotenv import load_dotenv              # environment variables
-import os
-
 from datetime import datetime
 
 import dash
 from dash import Dash, dash_table, dcc, html, Input, Output
+
+import mysql.connector as mariadb
+from database import get_monthly_statement, LIVE_QUERY
+import snapshot                             # shared in-memory snapshot of the warehouse tables
+import indexes                              # partition index + card ledger over the snapshot
+import live                                 # live query mode - filters run in MariaDB
+import memo                                 # results re-used for the same inputs + snapshot version
+import staging                              # Dashboard_Source=parquet - the snapshot comes from the ETL's Parquet files
 #----------------------------------------------------------------------------------------------------------
 # 1. Used to generate a monthly bill for a credit card number for a given month and year.
 #----------------------------------------------------------------------------------------------------------
-# load the environment variables
-load_dotenv()
-
-# assign environment variables
-PASSWORD = os.getenv('MariaDB_Password')
-USER = os.getenv('MariaDB_Username')
-
-# functions: get data + update data
-def get_customer_data():
-    try:
-        # establish connection to MariaDB
-        con = mariadb.connect(
-            host='localhost',
-            user=USER,
-            password=PASSWORD,
-            database='creditcard_capstone'
-        )
-
-        # create a cursor
-        cur = con.cursor()
-        # SQL statement
-        query = ''' 
-        SELECT *
-        FROM cdw_sapp_customer
-        '''
-        # execute SQL statement
-        cur.execute(query)
-
-        # convert results to pandas dataframe
-        customer_df = pd.DataFrame(cur, columns=['SSN', 
-                                                 'FIRST_NAME', 
-                                                 'MIDDLE_NAME', 
-                                                 'LAST_NAME', 
-                                                 'CREDIT_CARD_NO', 
-                                                 'FULL_STREET_ADDRESS', 
-                                                 'CUST_CITY', 
-                                                 'CUST_STATE', 
-                                                 'CUST_COUNTRY', 
-                                                 'CUST_ZIP', 
-                                                 'CUST_PHONE', 
-                                                 'CUST_EMAIL', 
-                                                 'LAST_UPDATED'])
-        # close connection to MariaDB
-        con.close()
-
-        return customer_df
-    except mariadb.ERROR as err:
-        print(err)
-
-def get_credit_data():
-    try:
-        # establish connection to MariaDB
-        con = mariadb.connect(
-            host='localhost',
-            user=USER,
-            password=PASSWORD,
-            database='creditcard_capstone'
-        )
+# precomputed monthly statements (CDW_SAPP_MONTHLY_STATEMENT) only exist in MariaDB - not looked up when the
+# snapshot comes from Parquet. One lookup per card + month + snapshot version - a failed one is not memoized
+statement_table = LIVE_QUERY or not staging.PARQUET_SOURCE
+memoized_statement = memo.memoize(get_monthly_statement)
 
-        # create a cursor
-        cur = con.cursor()
-        # SQL statement
-        query = ''' 
-        SELECT *
-        FROM cdw_sapp_credit_card
-        '''
-        # execute SQL statement
-        cur.execute(query)
-
-        # convert results to pandas dataframe
-        credit_df = pd.DataFrame(cur, columns=['CUST_CC_NO', 
-                                               'TIMEID', 
-                                               'CUST_SSN', 
-                                               'BRANCH_CODE',
-                                               'TRANSACTION_TYPE', 
-                                               'TRANSACTION_VALUE', 
-                                               'TRANSACTION_ID'])
-        # close connection to MariaDB
-        con.close()
-
-        return credit_df
-    except mariadb.ERROR as err:
-        print(err)
-
-def get_branch_data():
+# the card's statement row - None if there is none, or MariaDB failed (the next request looks it up again)
+def monthly_statement(credit_card_no, year, month):
     try:
-        # establish connection to MariaDB
-        con = mariadb.connect(
-            host='localhost',
-            user=USER,
-            password=PASSWORD,
-            database='creditcard_capstone'
-        )
-
-        # create a cursor
-        cur = con.cursor()
-        # SQL statement
-        query = ''' 
-        SELECT *
-        FROM cdw_sapp_branch
-        '''
-        # execute SQL statement
-        cur.execute(query)
-
-        # convert results to pandas dataframe
-        branch_df = pd.DataFrame(cur, columns=['BRANCH_CODE', 
-                                               'BRANCH_NAME', 
-                                               'BRANCH_STREET', 
-                                               'BRANCH_CITY',
-                                               'BRANCH_STATE', 
-                                               'BRANCH_ZIP', 
-                                               'BRANCH_PHONE', 
-                                               'LAST_UPDATED'])
-        # close connection to MariaDB
-        con.close()
-
-        return branch_df
-    except mariadb.ERROR as err:
+        return memoized_statement(credit_card_no, year, month)
+    except mariadb.Error as err:
         print(err)
-#----------------------------------------------------------------------------------------------------------
-# read cleaned data
-branch_df = get_branch_data()
-customer_df = get_customer_data()
-credit_card_df = get_credit_data()
-credit_card_df.rename(columns={'CUST_SSN':'SSN'}, inplace=True)
-
-# merge both dataframes
-merged_df = credit_card_df.merge(customer_df, on='SSN')
-merged_df = merged_df.merge(branch_df, on='BRANCH_CODE')
-merged_df.drop(columns=['SSN', 
-                        'CUST_CC_NO',
-                        'CUST_COUNTRY', 
-                        'CUST_PHONE', 
-                        'CUST_EMAIL', 
-                        'BRANCH_CODE', 
-                        'LAST_UPDATED_x', 
-                        'LAST_UPDATED_y'], 
-                        inplace=True)
-merged_df['TIMEID'] = pd.to_datetime(merged_df['TIMEID'], format='%Y%m%d')
-merged_df['TIMEID'] = merged_df['TIMEID'].dt.date 
 
-# find unique months
-list_of_months = pd.to_datetime(merged_df['TIMEID']).dt.month.unique()
-list_of_months.sort()
-months_df = pd.DataFrame(list_of_months, columns=['Filter by Month'])
-# find unique years
-list_of_years = pd.to_datetime(merged_df['TIMEID']).dt.year.unique()
-list_of_years.sort()
-years_df = pd.DataFrame(list_of_years, columns=['Filter by Year'])
+# sidebar filters (months, years) - looked up when the page is requested, not at import
+def filter_values(name):
+    return live.distinct(name) if LIVE_QUERY else indexes.partition_keys(name)
 #----------------------------------------------------------------------------------------------------------
 # Plotly Dash App
 app = Dash(__name__)
 # for multi-page functionality
 dash.register_page(__name__)
 
-layout = html.Main([
-    html.Div([
-        html.H2('Monthly Bill Statement', id='bill_header'),
-        html.Label('Generate bill by specifying credit card number, month, and year: '),
-        html.Br(),
-        dcc.Input(id='cc', type='text', placeholder='Credit Card Number', minLength=16, maxLength=16, debounce=True),
-        html.A(html.Button('Clear all fields'), href='/pages/customers-monthly-bill'),
-        html.Div(id='err'),
+# built for every request of the page - the snapshot is loaded on first use (or by the warm-up), not at import
+def layout(**kwargs):
+    months_df = pd.DataFrame(filter_values('months'), columns=['Filter by Month'])
+    years_df = pd.DataFrame(filter_values('years'), columns=['Filter by Year'])
+
+    return html.Main([
         html.Div([
-            html.Section([
-                html.Div([
-                    html.Section([
-                        html.Div([
-                            html.H3('New Balance'),
-                            html.H3(id='new_balance')
-                        ], className='info'),
-                        html.Div([
-                            html.H3('Minimum Payment Due'),
-                            html.H3(id='minimum_payment')
-                        ], className='info'),
-                        html.Div([
-                            html.H3('Payment Due Date'),
-                            html.H3(id='due_date')
-                        ], className='info'),
-                        html.P('Late Payment Warning: If we do not receive your minimum payment by the above date, \
-                            you may have to pay up to a $40 late fee and your APRs may be increased up to \
-                            the Penalty APR of 29.24%'),
-                    ], className='balance'),
-                    html.Section([
-                        html.Div([
-                            html.H3('Reward Dollars'),
-                            html.H4(id='today'),
-                            html.H3(id='reward_dollars')
-                        ]),
-                        html.Div([
-                            html.H3('Credit Limit'),
-                            html.H4(id='credit_limit'),
-                            html.H3('Available Credit'),
-                            html.H4(id='available_credit')
-                        ], className='credit')
-                    ], className='summary'),
-                ], className='bill_statement'),
-                html.Div([
+            html.H2('Monthly Bill Statement', id='bill_header'),
+            html.Label('Generate bill by specifying credit card number, month, and year: '),
+            html.Br(),
+            dcc.Input(id='cc', type='text', placeholder='Credit Card Number', minLength=16, maxLength=16, debounce=True),
+            html.A(html.Button('Clear all fields'), href='/pages/customers-monthly-bill'),
+            html.Div(id='err'),
+            html.Div([
+                html.Section([
                     html.Div([
                         html.Section([
                             html.Div([
-                                html.P(id='name'),
-                                html.P(id='street'),
-                                html.P(id='zip')
-                            ]),
+                                html.H3('New Balance'),
+                                html.H3(id='new_balance')
+                            ], className='info'),
+                            html.Div([
+                                html.H3('Minimum Payment Due'),
+                                html.H3(id='minimum_payment')
+                            ], className='info'),
                             html.Div([
-                                html.P('$_______________.______'),
-                                html.P('Amount Enclosed'),
-                            ])
-                        ], className='cust_address'),
+                                html.H3('Payment Due Date'),
+                                html.H3(id='due_date')
+                            ], className='info'),
+                            html.P('Late Payment Warning: If we do not receive your minimum payment by the above date, \
+                                you may have to pay up to a $40 late fee and your APRs may be increased up to \
+                                the Penalty APR of 29.24%'),
+                        ], className='balance'),
                         html.Section([
                             html.Div([
-                                html.P(id='bank_name'),
-                                html.P(id='bank_street'),
-                                html.P(id='bank_zip')
-                            ])
-                        ], className='bank_address'), 
-                    ], className='check')
-                ], className='check_container'),
-                html.Div([
+                                html.H3('Reward Dollars'),
+                                html.H4(id='today'),
+                                html.H3(id='reward_dollars')
+                            ]),
+                            html.Div([
+                                html.H3('Credit Limit'),
+                                html.H4(id='credit_limit'),
+                                html.H3('Available Credit'),
+                                html.H4(id='available_credit')
+                            ], className='credit')
+                        ], className='summary'),
+                    ], className='bill_statement'),
                     html.Div([
-                        html.Section([
-                            html.H3('Transactions')
-                        ]),
-                        dash_table.DataTable(id='monthly_activity', 
-                                             page_size=10,
-                                             style_as_list_view=True,
-                                             style_header={'fontWeight': 'bold'},
-                                             style_cell={'textAlign': 'center', 'font-family': 'Sans-serif'})
-                    ], className='monthly_transactions')
-                ], className='monthly_transactions_container')
-            ]),
-            html.Aside([
-                dash_table.DataTable(months_df.to_dict('records'), 
-                                        [{'name': i, 'id': i} for i in months_df],
-                                        id='month',
-                                        style_header={'fontWeight': 'bold'}, 
-                                        style_table={'height': '300px','overflowY': 'auto'}),
-                html.Br(),
-                dash_table.DataTable(years_df.to_dict('records'), 
-                                        [{'name': i, 'id': i} for i in years_df],
-                                        id='year',
-                                        style_header={'fontWeight': 'bold'}, 
-                                        style_table={'height': '150px','overflowY': 'auto'})
-            ], className='sidebar')
-        ], className='container')
-    ], className='main_container')
-], className='bill')
+                        html.Div([
+                            html.Section([
+                                html.Div([
+                                    html.P(id='name'),
+                                    html.P(id='street'),
+                                    html.P(id='zip')
+                                ]),
+                                html.Div([
+                                    html.P('$_______________.______'),
+                                    html.P('Amount Enclosed'),
+                                ])
+                            ], className='cust_address'),
+                            html.Section([
+                                html.Div([
+                                    html.P(id='bank_name'),
+                                    html.P(id='bank_street'),
+                                    html.P(id='bank_zip')
+                                ])
+                            ], className='bank_address'), 
+                        ], className='check')
+                    ], className='check_container'),
+                    html.Div([
+                        html.Div([
+                            html.Section([
+                                html.H3('Transactions')
+                            ]),
+                            dash_table.DataTable(id='monthly_activity', 
+                                                 page_size=10,
+                                                 style_as_list_view=True,
+                                                 style_header={'fontWeight': 'bold'},
+                                                 style_cell={'textAlign': 'center', 'font-family': 'Sans-serif'})
+                        ], className='monthly_transactions')
+                    ], className='monthly_transactions_container')
+                ]),
+                html.Aside([
+                    dash_table.DataTable(months_df.to_dict('records'), 
+                                            [{'name': i, 'id': i} for i in months_df],
+                                            id='month',
+                                            style_header={'fontWeight': 'bold'}, 
+                                            style_table={'height': '300px','overflowY': 'auto'}),
+                    html.Br(),
+                    dash_table.DataTable(years_df.to_dict('records'), 
+                                            [{'name': i, 'id': i} for i in years_df],
+                                            id='year',
+                                            style_header={'fontWeight': 'bold'}, 
+                                            style_table={'height': '150px','overflowY': 'auto'})
+                ], className='sidebar')
+            ], className='container')
+        ], className='main_container')
+    ], className='bill')
+#----------------------------------------------------------------------------------------------------------
+# monthly statement computed from the snapshot - same totals + branch as a row of CDW_SAPP_MONTHLY_STATEMENT
+# (used when there is no statement table, or the credit ETL has not built the card's month yet)
+def statement_from_snapshot(transactions_df, new_balance, year, month):
+    # customer + branch of the latest transaction in the month - latest day, then highest TRANSACTION_ID (as the ETL)
+    latest = transactions_df.sort_values(['TIMEID', 'TRANSACTION_ID']).iloc[-1]
+
+    # fixed bug when clicking on month 12 - need to increment year by 1 + reset month to 1
+    if month == 12:
+        due_date = datetime.strptime(f'{year + 1}-01-01', '%Y-%m-%d').date()
+    else:
+        due_date = datetime.strptime(f'{year}-{month + 1}-01', '%Y-%m-%d').date()
+    today = datetime.strptime(f'{year}-{month}-01', '%Y-%m-%d').date()
+    credit_limit = 10000
+
+    return {'CUST_SSN': latest['SSN'],
+            'BRANCH_CODE': latest['BRANCH_CODE'],
+            'NEW_BALANCE': new_balance,
+            'REWARDS': new_balance * 0.02,
+            'CREDIT_LIMIT': credit_limit,
+            'AVAILABLE_CREDIT': credit_limit - new_balance,
+            'STATEMENT_DATE': today,
+            'DUE_DATE': due_date}
+
+# current name + address of the customer and the branch printed on the bill - the statement table keeps the ones
+# of the ETL run that built the row, so edits + later customer/branch loads would never reach past bills
+# (None if the customer or the branch is not there - e.g. the statement row is older than the snapshot)
+def addresses(ssn, branch_code):
+    try:
+        if LIVE_QUERY:
+            customer = live.customer(ssn)
+            branch = live.branch(branch_code)
+        else:
+            customer = snapshot.get('customer').iloc[indexes.customer_row(ssn)]         # row position from the name index
+            branch_df = snapshot.get('branch')
+            branch = branch_df[branch_df['BRANCH_CODE'] == branch_code].iloc[0]
+    except (KeyError, IndexError):
+        return None
+
+    return {'FIRST_NAME': customer['FIRST_NAME'],
+            'LAST_NAME': customer['LAST_NAME'],
+            'FULL_STREET_ADDRESS': customer['FULL_STREET_ADDRESS'],
+            'CUST_CITY': customer['CUST_CITY'],
+            'CUST_STATE': customer['CUST_STATE'],
+            'CUST_ZIP': customer['CUST_ZIP'],
+            'BRANCH_NAME': branch['BRANCH_NAME'],
+            'BRANCH_STREET': branch['BRANCH_STREET'],
+            'BRANCH_CITY': branch['BRANCH_CITY'],
+            'BRANCH_STATE': branch['BRANCH_STATE'],
+            'BRANCH_ZIP': branch['BRANCH_ZIP']}
 #----------------------------------------------------------------------------------------------------------
 # update customer bill based on user input - *NEED TO CONVERT @app.callback -> @dash.callback FOR MULTI-PAGE FUNCTIONALITY*
 @dash.callback(
@@ -270,54 +194,59 @@ layout = html.Main([
      Output('bank_zip', 'children'), Output('monthly_activity', 'data')], 
     [Input('cc', 'value'), Input('month', 'active_cell'), Input('year', 'active_cell')] 
 )
+@memo.memoize
 def update_bill(cc, month, year):
     if cc and month and year:
         # check if text is numeric
         if cc.isnumeric() != True:
             return ['(Please enter only numbers)','', '', '', '', '', '', '', '', '', '', '', '', '', None]
         else:
-            # filter by credit card number
-            cc_transactions = merged_df['CREDIT_CARD_NO'] == cc
-            if merged_df[cc_transactions].empty:
+            # look up the credit card in the card ledger (or in MariaDB in live query mode)
+            if (live.card_exists(cc) if LIVE_QUERY else indexes.card_exists(cc)) != True:
                 return ['(No credit card found with this number...please try again)','', '', '', '', '', '', '', '', '', '', '', '', '', None]
             
-            # filter by month
-            month_cell_value = months_df.iloc[month['row']].values[0]
-            month_target = pd.to_datetime(merged_df['TIMEID']).dt.month == month_cell_value
-            # filter by year
-            year_cell_value = years_df.iloc[year['row']].values[0]
-            year_target = pd.to_datetime(merged_df['TIMEID']).dt.year == year_cell_value
-            # filter by month and year
-            common_target = month_target.isin(year_target)
-
-            # used to calculate all output values
-            filtered_merged_df = merged_df[cc_transactions & common_target]
+            # filter by month and year - the card's slice for that month
+            month_cell_value = filter_values('months')[month['row']]
+            year_cell_value = filter_values('years')[year['row']]
+            if LIVE_QUERY:
+                filtered_merged_df = live.card_month(cc, year_cell_value, month_cell_value)
+                card_month = {'total': float(filtered_merged_df['TRANSACTION_VALUE'].sum())} if len(filtered_merged_df) else None
+            else:
+                card_month = indexes.card_month(cc, year_cell_value, month_cell_value)
             # if there are no transactions for that month
-            if filtered_merged_df.empty:
+            if card_month is None:
+                return ['','$0.00', '', '', '', '', '', '', '', '', '', '', '', '', None]
+
+            # the card's transactions for that month
+            if not LIVE_QUERY:
+                filtered_merged_df = snapshot.get('transactions').iloc[card_month['rows']]
+
+            # precomputed monthly statement (one row of CDW_SAPP_MONTHLY_STATEMENT, built by the credit ETL) - totals + branch
+            statement = monthly_statement(cc, year_cell_value, month_cell_value) if statement_table else None
+            if statement is None:
+                statement = statement_from_snapshot(filtered_merged_df, card_month['total'], year_cell_value, month_cell_value)
+            bill_addresses = addresses(statement['CUST_SSN'], statement['BRANCH_CODE'])
+            if bill_addresses is None:
                 return ['','$0.00', '', '', '', '', '', '', '', '', '', '', '', '', None]
+            statement = {**statement, **bill_addresses}
 
-            # calculate the output values to display in bill
-            new_balance = filtered_merged_df['TRANSACTION_VALUE'].sum()
+            # output values to display in bill
+            new_balance = float(statement['NEW_BALANCE'])
             minimum_payment = '$40.00'
-            # fixed bug when clicking on month 12 - need to increment year by 1 + reset month to 1
-            if month_cell_value == 12:
-                due_date = datetime.strptime(f'{year_cell_value + 1}-01-01', '%Y-%m-%d').date()
-            else:
-                due_date = datetime.strptime(f'{year_cell_value}-{month_cell_value + 1}-01', '%Y-%m-%d').date()
-            today = datetime.strptime(f'{year_cell_value}-{month_cell_value}-01', '%Y-%m-%d').date()
-            rewards = new_balance * 0.02
-            credit_limit = 10000
-            available_credit = credit_limit - new_balance
+            due_date = statement['DUE_DATE']
+            today = statement['STATEMENT_DATE']
+            rewards = float(statement['REWARDS'])
+            credit_limit = float(statement['CREDIT_LIMIT'])
+            available_credit = float(statement['AVAILABLE_CREDIT'])
             
-            # select 1 row to collect customer details + bank details
-            target_row = filtered_merged_df.iloc[0]
-            name = f'{target_row["FIRST_NAME"]} {target_row["LAST_NAME"]}' 
-            street = target_row['FULL_STREET_ADDRESS'].split(',')
+            # customer details + bank details
+            name = f'{statement["FIRST_NAME"]} {statement["LAST_NAME"]}' 
+            street = statement['FULL_STREET_ADDRESS'].split(',')
             street = f'{street[1]} {street[0]}'
-            zip = f'{target_row["CUST_CITY"]}, {target_row["CUST_STATE"]} {target_row["CUST_ZIP"]}'
-            bank_name = target_row["BRANCH_NAME"]
-            bank_street = target_row["BRANCH_STREET"]
-            bank_zip = f'{target_row["BRANCH_CITY"]}, {target_row["BRANCH_STATE"]} {target_row["BRANCH_ZIP"]}'
+            zip = f'{statement["CUST_CITY"]}, {statement["CUST_STATE"]} {statement["CUST_ZIP"]}'
+            bank_name = statement["BRANCH_NAME"]
+            bank_street = statement["BRANCH_STREET"]
+            bank_zip = f'{statement["BRANCH_CITY"]}, {statement["BRANCH_STATE"]} {statement["BRANCH_ZIP"]}'
 
             # monthly transactions
             rearranged_df = filtered_merged_df[['TIMEID', 'TRANSACTION_TYPE', 'TRANSACTION_VALUE']]
@@ -337,7 +266,7 @@ def update_bill(cc, month, year):
                     bank_name, 
                     bank_street, 
                     bank_zip, 
-                    rearranged_df.to_dict('records')]
+                    snapshot.to_records(rearranged_df)]
     else:
         # defaults - when the page first loads 
         return ['','', '', '', '', '', '', '', '', '', '', '', '', '', None]
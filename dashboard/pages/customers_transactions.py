@@ -1,290 +1,285 @@
 import numpy as np
 import pandas as pd
 
-import mysql.connector as mariadb
-from dotenv import load_dotenv              # environment variables
-import os
+import math
 
 import dash
 from dash import Dash, dash_table, dcc, html, Input, Output
+
+import snapshot                             # shared in-memory snapshot of the warehouse tables
+import indexes                              # partition index + rollups over the snapshot
+import live                                 # live query mode - filters + aggregates run in MariaDB
+import memo                                 # results re-used for the same inputs + snapshot version
+from database import LIVE_QUERY
 #----------------------------------------------------------------------------------------------------------
 # 1. Used to display the transactions made by customers living in a given zip code for a given month and year. 
 #    (Order by day in descending order.)
 # 2. Used to display the number and total values of transactions for a given type.
 # 3. Used to display the number and total values of transactions for branches in a given state.
 #----------------------------------------------------------------------------------------------------------
-# load the environment variables
-load_dotenv()
+# where the stats come from: the precomputed rollups, or GROUP BY queries in live query mode
+totals = live if LIVE_QUERY else indexes
 
-# assign environment variables
-PASSWORD = os.getenv('MariaDB_Password')
-USER = os.getenv('MariaDB_Username')
+# columns displayed in the data table
+table_columns = ['CUST_CC_NO',
+                 'TIMEID',
+                 'BRANCH_CODE',
+                 'TRANSACTION_TYPE',
+                 'TRANSACTION_VALUE',
+                 'TRANSACTION_ID',
+                 'CUST_ZIP',
+                 'CUST_STATE']
 
-def get_customer_data():
-    try:
-        # establish connection to MariaDB
-        con = mariadb.connect(
-            host='localhost',
-            user=USER,
-            password=PASSWORD,
-            database='creditcard_capstone'
-        )
+# sidebar filters (zip codes, months, years) + dropdown labels - looked up when the page is requested, not at import
+def filter_values(name):
+    return live.distinct(name) if LIVE_QUERY else indexes.partition_keys(name)
 
-        # create a cursor
-        cur = con.cursor()
-        # SQL statement
-        query = ''' 
-        SELECT *
-        FROM cdw_sapp_customer
-        '''
-        # execute SQL statement
-        cur.execute(query)
+def dropdown_values(name):
+    return live.distinct(name) if LIVE_QUERY else indexes.rollup_keys(name)
+#----------------------------------------------------------------------------------------------------------
+# Plotly Dash App
+app = Dash(__name__)
+# for multi-page functionality
+dash.register_page(__name__, path='/')
 
-        # convert results to pandas dataframe
-        customer_df = pd.DataFrame(cur, columns=['SSN', 
-                                                 'FIRST_NAME', 
-                                                 'MIDDLE_NAME', 
-                                                 'LAST_NAME', 
-                                                 'CREDIT_CARD_NO', 
-                                                 'FULL_STREET_ADDRESS', 
-                                                 'CUST_CITY', 
-                                                 'CUST_STATE', 
-                                                 'CUST_COUNTRY', 
-                                                 'CUST_ZIP', 
-                                                 'CUST_PHONE', 
-                                                 'CUST_EMAIL', 
-                                                 'LAST_UPDATED'])
-        # close connection to MariaDB
-        con.close()
+# built for every request of the page - the snapshot is loaded on first use (or by the warm-up), not at import
+def layout(**kwargs):
+    transaction_type_options = [{'label': type, 'value': type} for type in dropdown_values('transaction_type')]
+    state_options = [{'label': s, 'value': s} for s in dropdown_values('state')]
+    zipcodes_df = pd.DataFrame(filter_values('zipcodes'), columns=['Filter by Zip Code'])
+    months_df = pd.DataFrame(filter_values('months'), columns=['Filter by Month'])
+    years_df = pd.DataFrame(filter_values('years'), columns=['Filter by Year'])
 
-        return customer_df
-    except mariadb.ERROR as err:
-        print(err)
+    return html.Main([
+        html.Div([
+            html.H2('All Customer Transactions'),
+            html.Div([
+                html.Section([
+                    dash_table.DataTable([],                                            # https://dash.plotly.com/datatable
+                                        [{'name': i, 'id': i} for i in table_columns], 
+                                        page_size=10, 
+                                        page_current=0,
+                                        page_action='custom',                   # paging, sorting + filtering happen on the server
+                                        sort_action='custom',                   # https://dash.plotly.com/datatable/callbacks
+                                        sort_mode='single',
+                                        filter_action='custom',
+                                        filter_query='',
+                                        id='data_table',
+                                        style_as_list_view=True,
+                                        style_header={'fontWeight': 'bold'},
+                                        style_cell={'textAlign': 'center', 'font-family': 'Sans-serif'}),
+                    html.Div([
+                        html.Section([
+                            html.Div([
+                                html.Section([
+                                    html.P('Transactions'),
+                                    html.P(id='transaction_number', children=['0'])
+                                ]),
+                                html.Section([
+                                    html.P('Total Dollars'),
+                                    html.P(id='transaction_dollars', children=['$0'])
+                                ])
+                            ], className='values'),
+                            dcc.Dropdown(
+                                id='transaction_type',
+                                className='dropdown',
+                                placeholder='Select a transaction type',
+                                options=transaction_type_options,
+                                maxHeight=100
+                            )], className='values_container'),
+                        html.Section([
+                            html.Div([
+                                html.Section([
+                                    html.P('Branches'),
+                                    html.P(id='branch_number', children=['0'])
+                                ]),
+                                html.Section([
+                                    html.P('Total Dollars'),
+                                    html.P(id='state_dollars', children=['$0'])
+                                ])
+                            ], className='values'),
+                            dcc.Dropdown(
+                                id='state',
+                                className='dropdown',
+                                placeholder='Select a state',
+                                options=state_options,
+                                maxHeight=100
+                            )], className='values_container')
+                    ], className='stats')
+                ], className='data'),
+                html.Aside([
+                    dash_table.DataTable(zipcodes_df.to_dict('records'), 
+                                            [{'name': i, 'id': i} for i in zipcodes_df],
+                                            id='zipcode_list',
+                                            style_header={'fontWeight': 'bold'}, 
+                                            style_table={'height': '350px','overflowY': 'auto'}),
+                    html.Br(),
+                    dash_table.DataTable(months_df.to_dict('records'), 
+                                            [{'name': i, 'id': i} for i in months_df],
+                                            id='months_list',
+                                            style_header={'fontWeight': 'bold'}, 
+                                            style_table={'height': '150px','overflowY': 'auto'}),
+                    html.Br(),
+                    dash_table.DataTable(years_df.to_dict('records'), 
+                                            [{'name': i, 'id': i} for i in years_df],
+                                            id='years_list',
+                                            style_header={'fontWeight': 'bold'}, 
+                                            style_table={'height': '150px','overflowY': 'auto'})
+                ], className='data_sidebar')
+            ], className='container')
+        ], className='main_container')
+    ], className='transactions')
+#----------------------------------------------------------------------------------------------------------
+# parse one part of the data table filter query (e.g. "{TRANSACTION_VALUE} ge 50") - https://dash.plotly.com/datatable/callbacks
+operators = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
 
-def get_credit_data():
-    try:
-        # establish connection to MariaDB
-        con = mariadb.connect(
-            host='localhost',
-            user=USER,
-            password=PASSWORD,
-            database='creditcard_capstone'
-        )
+def split_filter_part(filter_part):
+    for operator_type in operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
 
-        # create a cursor
-        cur = con.cursor()
-        # SQL statement
-        query = ''' 
-        SELECT *
-        FROM cdw_sapp_credit_card
-        '''
-        # execute SQL statement
-        cur.execute(query)
+                value_part = value_part.strip()
+                v0 = value_part[0]
+                if (v0 == value_part[-1] and v0 in ("'", '"', '`')):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
 
-        # convert results to pandas dataframe
-        credit_df = pd.DataFrame(cur, columns=['CUST_CC_NO', 
-                                               'TIMEID', 
-                                               'CUST_SSN', 
-                                               'BRANCH_CODE',
-                                               'TRANSACTION_TYPE', 
-                                               'TRANSACTION_VALUE', 
-                                               'TRANSACTION_ID'])
-        # close connection to MariaDB
-        con.close()
+                # word operators need spaces after them in the filter string, but we don't want these later
+                return name, operator_type[0].strip(), value
 
-        return credit_df
-    except mariadb.ERROR as err:
-        print(err)
-#----------------------------------------------------------------------------------------------------------
-# read cleaned data + filter for only the SSN (need this to merge dataframes) and CUST_ZIP
-customer_df = get_customer_data()
-customer_df = customer_df[['SSN', 'CUST_ZIP', 'CUST_STATE']]
+    return [None] * 3
 
-# read cleaned data + rename column (need this to merge dataframes)
-credit_card_df = get_credit_data()
-credit_card_df.rename(columns={'CUST_SSN':'SSN'}, inplace=True)
+# apply the data table filter query to a dataframe
+def apply_filter_query(dataframe, filter_query):
+    for filter_part in filter_query.split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in table_columns:
+            continue
 
-# merge both dataframes
-merged_df = credit_card_df.merge(customer_df, on='SSN')
-merged_df.drop(columns=['SSN'], inplace=True)
-merged_df['TIMEID'] = pd.to_datetime(merged_df['TIMEID'], format='%Y%m%d')
-merged_df['TIMEID'] = merged_df['TIMEID'].dt.date 
+        try:
+            dataframe = dataframe.loc[filter_matches(dataframe[column], column, operator, value)]
+        except (ValueError, TypeError):
+            return dataframe.iloc[0:0]                                      # not a date / text vs a number - no row matches
 
-# dropdown label
-transaction_type = merged_df['TRANSACTION_TYPE'].unique()
-transaction_type_options = [{'label': type, 'value': type} for type in transaction_type]
-# state label
-state = merged_df['CUST_STATE'].unique()
-state.sort()
-state_options = [{'label': s, 'value': s} for s in state]
+    return dataframe
 
-# find unique zipcodes
-list_of_zipcodes = merged_df['CUST_ZIP'].sort_values().unique()
-zipcodes_df = pd.DataFrame(list_of_zipcodes, columns=['Filter by Zip Code'])
-# find unique months
-list_of_months = pd.to_datetime(merged_df['TIMEID']).dt.month.unique()
-list_of_months.sort()
-months_df = pd.DataFrame(list_of_months, columns=['Filter by Month'])
-# find unique years
-list_of_years = pd.to_datetime(merged_df['TIMEID']).dt.year.unique()
-list_of_years.sort()
-years_df = pd.DataFrame(list_of_years, columns=['Filter by Year'])
-#----------------------------------------------------------------------------------------------------------
-# Plotly Dash App
-app = Dash(__name__)
-# for multi-page functionality
-dash.register_page(__name__, path='/')
+# rows of one column matching one part of the filter query
+def filter_matches(values, column, operator, value):
+    if column == 'TIMEID' and operator not in ('contains', 'datestartswith'):
+        value = pd.to_datetime(str(value))                                  # TIMEID holds dates - compare dates
+    if isinstance(values.dtype, pd.CategoricalDtype) and operator in ('lt', 'le', 'gt', 'ge'):
+        values = values.astype(str)                                         # categories have no order - compare the text
 
-layout = html.Main([
-    html.Div([
-        html.H2('All Customer Transactions'),
-        html.Div([
-            html.Section([
-                dash_table.DataTable(merged_df.to_dict('records'),          # https://dash.plotly.com/datatable
-                                    [{'name': i, 'id': i} for i in merged_df.columns], 
-                                    page_size=10, 
-                                    id='data_table',
-                                    style_as_list_view=True,
-                                    style_header={'fontWeight': 'bold'},
-                                    style_cell={'textAlign': 'center', 'font-family': 'Sans-serif'}),
-                html.Div([
-                    html.Section([
-                        html.Div([
-                            html.Section([
-                                html.P('Transactions'),
-                                html.P(id='transaction_number', children=['0'])
-                            ]),
-                            html.Section([
-                                html.P('Total Dollars'),
-                                html.P(id='transaction_dollars', children=['$0'])
-                            ])
-                        ], className='values'),
-                        dcc.Dropdown(
-                            id='transaction_type',
-                            className='dropdown',
-                            placeholder='Select a transaction type',
-                            options=transaction_type_options,
-                            maxHeight=100
-                        )], className='values_container'),
-                    html.Section([
-                        html.Div([
-                            html.Section([
-                                html.P('Branches'),
-                                html.P(id='branch_number', children=['0'])
-                            ]),
-                            html.Section([
-                                html.P('Total Dollars'),
-                                html.P(id='state_dollars', children=['$0'])
-                            ])
-                        ], className='values'),
-                        dcc.Dropdown(
-                            id='state',
-                            className='dropdown',
-                            placeholder='Select a state',
-                            options=state_options,
-                            maxHeight=100
-                        )], className='values_container')
-                ], className='stats')
-            ], className='data'),
-            html.Aside([
-                dash_table.DataTable(zipcodes_df.to_dict('records'), 
-                                        [{'name': i, 'id': i} for i in zipcodes_df],
-                                        id='zipcode_list',
-                                        style_header={'fontWeight': 'bold'}, 
-                                        style_table={'height': '350px','overflowY': 'auto'}),
-                html.Br(),
-                dash_table.DataTable(months_df.to_dict('records'), 
-                                        [{'name': i, 'id': i} for i in months_df],
-                                        id='months_list',
-                                        style_header={'fontWeight': 'bold'}, 
-                                        style_table={'height': '150px','overflowY': 'auto'}),
-                html.Br(),
-                dash_table.DataTable(years_df.to_dict('records'), 
-                                        [{'name': i, 'id': i} for i in years_df],
-                                        id='years_list',
-                                        style_header={'fontWeight': 'bold'}, 
-                                        style_table={'height': '150px','overflowY': 'auto'})
-            ], className='data_sidebar')
-        ], className='container')
-    ], className='main_container')
-], className='transactions')
+    if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+        return getattr(values, operator)(value)
+    elif operator == 'contains':
+        return text_matches(values, lambda text: text.str.contains(str(value), regex=False))
+    return text_matches(values, lambda text: text.str.startswith(str(value)))
+
+# test the text of every value - on a categorical column only its categories are tested (then looked up by code)
+def text_matches(values, test):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        matches = np.append(test(values.cat.categories.to_series().astype(str)).to_numpy(dtype=bool), False)
+        return matches[values.cat.codes.to_numpy()]                     # code -1 (null) -> the extra False
+    return test(values.astype(str))
 #----------------------------------------------------------------------------------------------------------
 # update customer transaction based on user input - *NEED TO CONVERT @app.callback -> @dash.callback FOR MULTI-PAGE FUNCTIONALITY*
+# only the requested page is sent to the browser (+ the page count), not the whole table
 @dash.callback(
-    Output('data_table', 'data'), 
-    [Input('zipcode_list', 'active_cell'), Input('months_list', 'active_cell'), Input('years_list', 'active_cell')] 
+    [Output('data_table', 'data'), Output('data_table', 'page_count')],
+    [Input('zipcode_list', 'active_cell'), Input('months_list', 'active_cell'), Input('years_list', 'active_cell'),
+     Input('data_table', 'page_current'), Input('data_table', 'page_size'), Input('data_table', 'sort_by'),
+     Input('data_table', 'filter_query')]
 )
-def update_data_table(zipcode_list, months_list, years_list):
-    if zipcode_list == None and months_list == None and years_list == None:
-        return merged_df.to_dict('records')
-    else:
-        # defaults to all, if end-user does not click on any filters 
-        zipcode_target = merged_df['CUST_ZIP'] != None
-        month_target = merged_df['TIMEID'] != None
-        year_target = merged_df['TIMEID'] != None
+@memo.memoize
+def update_data_table(zipcode_list, months_list, years_list, page_current, page_size, sort_by, filter_query):
+    # defaults to all, if end-user does not click on any filters 
+    zipcode_cell_value = None
+    month_cell_value = None
+    year_cell_value = None
+
+    # filter by zipcode 
+    if zipcode_list:
+        zipcode_cell_value = filter_values('zipcodes')[zipcode_list['row']]
+
+    # filter by month
+    if months_list:
+        month_cell_value = filter_values('months')[months_list['row']]
+    
+    # filter by year
+    if years_list:
+        year_cell_value = filter_values('years')[years_list['row']]
+    
+    # live query mode - MariaDB filters, sorts and returns only the requested page
+    if LIVE_QUERY:
+        filters = [split_filter_part(filter_part) for filter_part in (filter_query or '').split(' && ')]
+        page_df, total = live.transactions_page(zipcode_cell_value, month_cell_value, year_cell_value, 
+                                                filters, sort_by, page_current, page_size)
+        return [snapshot.to_records(page_df[table_columns]), max(math.ceil(total / page_size), 1)]
+
+    # look up the matching rows in the partition index (rows are already ordered by day in descending order)
+    merged_df = snapshot.get('transactions')
+    rows = indexes.partition_rows(zipcode_cell_value, month_cell_value, year_cell_value)
+    if rows is None:
+        rows = np.arange(len(merged_df))
 
-        # filter by zipcode 
-        if zipcode_list:
-            zipcode_cell_value = zipcodes_df.iloc[zipcode_list['row']].values[0]
-            zipcode_target = merged_df['CUST_ZIP'] == zipcode_cell_value
+    start = (page_current or 0) * page_size
+    end = start + page_size
 
-        # filter by month
-        if months_list:
-            month_cell_value = months_df.iloc[months_list['row']].values[0]
-            month_target = pd.to_datetime(merged_df['TIMEID']).dt.month == month_cell_value
-        
-        # filter by year
-        if years_list:
-            year_cell_value = years_df.iloc[years_list['row']].values[0]
-            year_target = pd.to_datetime(merged_df['TIMEID']).dt.year == year_cell_value
-        
-        # if both month filter + year filter are clicked, need to find only the ones in common in both
-        if months_list and years_list:
-            common_target = month_target.isin(year_target)
-            filtered_df = merged_df[zipcode_target & common_target]
-        elif months_list == None and years_list:
-            filtered_df = merged_df[zipcode_target & year_target]
-        elif months_list and years_list == None:
-            filtered_df = merged_df[zipcode_target & month_target]
-        else:
-            filtered_df = merged_df[zipcode_target & month_target & year_target]
+    if filter_query or sort_by:
+        # filter + sort only the rows selected in the sidebar, then cut out the requested page
+        filtered_df = apply_filter_query(merged_df.iloc[rows], filter_query or '')
+        if sort_by:
+            filtered_df = filtered_df.sort_values(sort_by[0]['column_id'], 
+                                                  ascending=sort_by[0]['direction'] == 'asc', 
+                                                  kind='stable')
+        total = len(filtered_df)
+        page_df = filtered_df.iloc[start:end]
+    else:
+        # no table filter/sort - only the rows of the requested page are ever copied
+        total = len(rows)
+        page_df = merged_df.iloc[rows[start:end]]
 
-        filtered_df = filtered_df.sort_values('TIMEID', ascending=False)
-        # needs to match the data in data_table
-        return filtered_df.to_dict('records')
+    # needs to match the data in data_table
+    return [snapshot.to_records(page_df[table_columns]), max(math.ceil(total / page_size), 1)]
 #----------------------------------------------------------------------------------------------------------
 # update stats based on transaction type - *NEED TO CONVERT @app.callback -> @dash.callback FOR MULTI-PAGE FUNCTIONALITY*
 @dash.callback(
     [Output('transaction_number', 'children'), Output('transaction_dollars', 'children')],
     [Input('transaction_type', 'value')]
 )
+@memo.memoize
 def update_transaction_type(transaction_type):
-    # filter by transaction type
-    type = merged_df['TRANSACTION_TYPE'] == transaction_type
-    filtered_df = merged_df[type]
-    
-    # find the count + sum 
-    number = filtered_df['TRANSACTION_TYPE'].count()
-    dollars = filtered_df['TRANSACTION_VALUE'].sum()
+    if not transaction_type:
+        return ['0', '$0']
 
-    if transaction_type:
-        return [number, f'${dollars:,.2f}']                                 # how to format string numbers with a comma
-    return ['0', '$0']
+    # find the count + sum (precomputed per transaction type, or one GROUP BY query in live query mode)
+    number, dollars = totals.transaction_type_totals(transaction_type)
+    return [number, f'${dollars:,.2f}']                                     # how to format string numbers with a comma
 #----------------------------------------------------------------------------------------------------------
 # update stats based on state - *NEED TO CONVERT @app.callback -> @dash.callback FOR MULTI-PAGE FUNCTIONALITY*
 @dash.callback(
     [Output('branch_number', 'children'), Output('state_dollars', 'children')],
     [Input('state', 'value')]
 )
+@memo.memoize
 def update_state(state):
-    # filter by state
-    target_state = merged_df['CUST_STATE'] == state
-    filtered_df = merged_df[target_state]
-    
-    # find the count + sum 
-    number = len(filtered_df['BRANCH_CODE'].unique())
-    dollars = filtered_df['TRANSACTION_VALUE'].sum()
+    if not state:
+        return ['0', '$0']
 
-    if state:
-        return [number, f'${dollars:,.2f}']                                  # how to format string numbers with a comma
-    return ['0', '$0']
+    # find the count + sum (precomputed per state, or one GROUP BY query in live query mode)
+    number, dollars = totals.state_totals(state)
+    return [number, f'${dollars:,.2f}']                                     # how to format string numbers with a comma
@@ -0,0 +1,41 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+import indexes                                                          # noqa: F401 - registers the derived frames (calendar, ...)
+import shared
+import snapshot
+#----------------------------------------------------------------------------------------------------------
+# Loader for serving with several worker processes - loads the snapshot once, publishes it to shared memory
+# (shared.py) for the WSGI workers (wsgi.py), then publishes every refreshed version (+ the customer edits):
+#   Dashboard_Shared_Dir=/dev/shm/dashboard python dashboard/publish.py
+#   Dashboard_Shared_Dir=/dev/shm/dashboard gunicorn --chdir dashboard --workers 4 wsgi:server
+# the published files stay when it stops - workers keep serving the last version
+#----------------------------------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python dashboard/publish.py', description='Publish the dashboard snapshot for the WSGI workers.')
+    parser.add_argument('--interval', type=float, default=snapshot.REFRESH_SECONDS,
+                        help='seconds between polls for new data (default: Dashboard_Refresh_Seconds, 0 = publish once)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if not shared.SHARED_DIR:
+        parser.error('Dashboard_Shared_Dir is not set')
+    os.makedirs(shared.SHARED_DIR, exist_ok=True)
+    snapshot.publish()
+    while args.interval > 0:
+        time.sleep(args.interval)
+        try:
+            # new data, or edits the workers would otherwise replay on their own copies (e.g. a rebuilt zip index)
+            if snapshot.refresh() or shared.edits_size() > snapshot.edits_offset():
+                snapshot.publish()
+        except Exception:
+            logger.exception('snapshot refresh failed')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import pyarrow as pa
+#----------------------------------------------------------------------------------------------------------
+# Shared-memory snapshot for serving with several worker processes (wsgi.py + publish.py).
+# 1. One loader process (publish.py) loads the tables + the transactions frame once and writes them as Arrow IPC
+#    files to Dashboard_Shared_Dir - on a tmpfs such as /dev/shm the files are memory, nothing goes to disk.
+# 2. Workers memory-map the files and convert them to pandas without copying (split_blocks) - every worker
+#    reads the same physical pages, so adding workers does not add copies of the tables.
+# 3. A refreshed version goes to a new folder, then current.json is replaced - workers switch on their next
+#    request. Older folders are removed (a worker that mapped one keeps its pages until it switches).
+# 4. Customer edits are appended to edits.jsonl - every worker (+ the loader, before it publishes) replays them.
+#    Every publish rotates the log: only the edits not in the new version are carried over to a new edits.jsonl,
+#    so it never grows past the edits of one publish interval (a new worker replays just those).
+#----------------------------------------------------------------------------------------------------------
+SHARED_DIR = os.getenv('Dashboard_Shared_Dir', '')
+CURRENT = 'current.json'                    # version, folder, tables + how much of the edits log they contain
+EDITS = 'edits.jsonl'
+EDITS_LOCK = 'edits.lock'                   # appends (shared) vs. the loader rotating the log (exclusive)
+KEEP_VERSIONS = 2
+
+# frames published - the tables + derived frames the pages read (the other indexes are built by every worker)
+SHARED_TABLES = ['customer', 'branch', 'transactions', 'calendar', 'partitions', 'cards', 'card_months', 'customers']
+
+def shared_path(*names):
+    return os.path.join(SHARED_DIR, *names)
+
+def read_current():
+    try:
+        with open(shared_path(CURRENT)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+# changes with every publish (current.json is replaced, not rewritten) - one stat call per request
+def current_stamp():
+    try:
+        stat = os.stat(shared_path(CURRENT))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+# write the frames as a new version - `edits`: bytes of the edits log `log` already applied to them
+# returns (version, log the workers replay from: the edits not applied yet)
+def publish(frames, edits, log):
+    current = read_current()
+    version = current['version'] + 1 if current else 1
+    folder = f'v{version}'
+    os.makedirs(shared_path(folder), exist_ok=True)
+    for name, dataframe in frames.items():
+        table = pa.Table.from_pandas(dataframe, preserve_index=False)
+        with pa.OSFile(shared_path(folder, f'{name}.arrow'), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    with edits_lock(exclusive=True):                                    # no edit is appended while the log is replaced
+        new_log = rotate_edits(edits, log)
+        path = shared_path(CURRENT)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'version': version, 'folder': folder, 'tables': list(frames), 'edits_log': new_log}, f, indent=1)
+        os.replace(f'{path}.tmp', path)                                 # workers never see half a version
+
+    for old in os.listdir(SHARED_DIR):
+        if old.startswith('v') and old[1:].isdigit() and int(old[1:]) <= version - KEEP_VERSIONS:
+            shutil.rmtree(shared_path(old), ignore_errors=True)
+    return version, new_log
+
+# the frames of a published version - memory-mapped, read-only (set_values copies a column before changing it)
+def attach(current):
+    frames = {}
+    for name in current['tables']:
+        table = pa.ipc.open_file(pa.memory_map(shared_path(current['folder'], f'{name}.arrow'))).read_all()
+        frames[name] = table.to_pandas(split_blocks=True)               # zero-copy: numbers, dates + category codes
+    return frames
+#----------------------------------------------------------------------------------------------------------
+# customer edits log - one JSON line per edit, appended by the worker that made it
+# a log is known by its inode - offsets into it mean nothing once the loader has replaced it
+@contextmanager
+def edits_lock(exclusive=False):
+    with open(shared_path(EDITS_LOCK), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield                                                           # released when the file is closed
+
+def append_edit(ssn, values):
+    with edits_lock(), open(shared_path(EDITS), 'a') as f:
+        f.write(json.dumps({'ssn': int(ssn), 'values': values}) + '\n')    # one small write - lines never interleave
+
+def edits_size():
+    try:
+        return os.stat(shared_path(EDITS)).st_size
+    except FileNotFoundError:
+        return 0
+
+# edits after byte `offset` of `log` -> ([edit, ...], new offset, log read) - nothing if the log was replaced
+# since (the version it belongs to is replaced too), any log if `log` is None (none existed yet)
+def read_edits(offset, log=None):
+    try:
+        with open(shared_path(EDITS), 'rb') as f:
+            current_log = os.fstat(f.fileno()).st_ino
+            if log is not None and current_log != log:
+                return [], offset, log
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset, log
+    data = data[:data.rfind(b'\n') + 1]                                 # a line still being written is read next time
+    return [json.loads(line) for line in data.splitlines()], offset + len(data), current_log
+
+# loader, holding the exclusive lock: replace the log by the edits after byte `offset` of `log` (the ones not in
+# the version being published) -> the new log
+def rotate_edits(offset, log):
+    pending, _, _ = read_edits(offset, log)
+    path = shared_path(EDITS)
+    with open(f'{path}.tmp', 'w') as f:
+        f.writelines(json.dumps(edit) + '\n' for edit in pending)
+    os.replace(f'{path}.tmp', path)
+    return os.stat(path).st_ino
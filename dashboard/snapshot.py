@@ -0,0 +1,558 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import database
+import shared
+import staging
+#----------------------------------------------------------------------------------------------------------
+# Single in-memory snapshot of the warehouse tables, shared by every page of the dashboard.
+# 1. Each table is loaded from MariaDB once per process (not once per page) - on first use, not at import,
+#    so the pages register at once; warm_up() loads everything in a background thread after startup.
+# 2. Derived frames (merged transactions, indexes, ...) are built once, on first use, from the shared tables.
+# 3. Pages treat everything handed out here as read-only - edits go through update_customer().
+# 4. Tables are compacted as they are loaded (COLUMN_TYPES) - categoricals for repeated text, narrow integers,
+#    datetime64 for TIMEID. Values are only formatted for display when rows are sent to the browser (to_records).
+# 5. Loaded tables are cached on disk as Arrow files (CACHE_DIR) - the next start memory-maps them instead of
+#    querying MariaDB, as long as the table's row count + latest LAST_UPDATED / TRANSACTION_ID are unchanged.
+# 6. A background refresher polls those markers - only new/changed rows are fetched, the derived frames are
+#    brought up to date off the request path, then the new version is swapped in at once. Every request is
+#    pinned to one version (pin/unpin), so a callback never mixes frames of two versions.
+# 7. Several worker processes (wsgi.py): one loader publishes the tables + the big indexes to shared memory
+#    (shared.py, publish.py) and every worker attaches to them - only the small indexes are built per worker.
+#----------------------------------------------------------------------------------------------------------
+CACHE_DIR = os.getenv('Dashboard_Cache_Dir', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dashboard_cache'))
+CACHE_INDEX = os.path.join(CACHE_DIR, 'snapshot.json')                 # table -> source + marker of the cached file
+
+REFRESH_SECONDS = float(os.getenv('Dashboard_Refresh_Seconds', 60))      # seconds between polls (0 = never)
+
+logger = logging.getLogger(__name__)
+
+# name -> function that loads a warehouse table (from MariaDB, or the ETL's Parquet files - Dashboard_Source=parquet)
+source = staging if staging.PARQUET_SOURCE else database
+LOADERS = {
+    'customer': source.get_customer_data,
+    'credit': source.get_credit_data,
+    'branch': source.get_branch_data
+}
+
+# key of each table - a row fetched again replaces the row with the same key
+KEYS = {
+    'customer': 'SSN',
+    'credit': 'TRANSACTION_ID',
+    'branch': 'BRANCH_CODE'
+}
+
+# column types of the loaded tables - columns not listed keep the type they were loaded with
+COLUMN_TYPES = {
+    'customer': {'SSN': 'int32',
+                 'CREDIT_CARD_NO': 'category',             # repeated on every transaction of the card
+                 'CUST_CITY': 'category',
+                 'CUST_STATE': 'category',
+                 'CUST_COUNTRY': 'category',
+                 'CUST_ZIP': 'int32',
+                 'LAST_UPDATED': 'datetime64[ns]'},
+    'credit': {'CUST_CC_NO': 'category',                   # ~50 transactions per card
+               'TIMEID': 'datetime64[ns]',                 # YYYYMMDD text -> dates
+               'CUST_SSN': 'int32',
+               'BRANCH_CODE': 'int16',
+               'TRANSACTION_TYPE': 'category',
+               'TRANSACTION_ID': 'int32'},
+    'branch': {'BRANCH_CODE': 'int16',
+               'BRANCH_NAME': 'category',
+               'BRANCH_CITY': 'category',
+               'BRANCH_STATE': 'category',
+               'BRANCH_ZIP': 'int32',
+               'LAST_UPDATED': 'datetime64[ns]'}
+}
+
+# name -> function that builds a derived frame/index from the snapshot (registered with @derived)
+BUILDERS = {}
+# name -> tables a derived frame/index is built from (directly or through other derived frames)
+TABLE_DEPENDENCIES = {}
+# name -> customer columns a derived frame/index depends on (rebuilt when update_customer changes one of them)
+CUSTOMER_DEPENDENCIES = {}
+# name -> function that returns a patched copy of a derived index after a customer update (instead of a rebuild)
+PATCHERS = {}
+# name -> function that adds new transactions to a derived frame/index (instead of a rebuild on refresh)
+UPDATERS = {}
+
+_snapshot = {}
+_version = 0                                # + 1 for every new version swapped in + every customer edit
+_markers = {}                               # table -> marker of the rows loaded
+_edits = None                               # customer edits made while a new version is built - replayed on it
+_published = None                           # shared mode - stamp of the published version attached to
+_edits_offset = 0                           # shared mode - bytes of the shared edits log applied
+_edits_log = None                           # shared mode - the edits log they were read from (shared.read_edits)
+_local = threading.local()                  # version pinned by the current thread (one request)
+_lock = threading.RLock()                   # re-entrant: builders call get() for the tables they need
+_cache_lock = threading.Lock()
+_attach_lock = threading.Lock()
+
+def get(name):
+    snapshot = getattr(_local, 'snapshot', None)
+    if snapshot is None:
+        snapshot = _snapshot
+    if name not in snapshot:
+        with _lock, pinned(snapshot):                                   # builders read the same version
+            if name not in snapshot:
+                snapshot[name] = load_table(name) if name in LOADERS else BUILDERS[name]()
+    return snapshot[name]
+
+# version of the snapshot the current thread reads (changes when a refresh is swapped in)
+def version():
+    pinned_version = getattr(_local, 'version', None)
+    return _version if pinned_version is None else pinned_version
+
+# one request reads one version, even if a refresh is swapped in meanwhile (app.py - before/teardown request)
+def pin():
+    if shared.SHARED_DIR and not database.LIVE_QUERY:
+        follow_published()
+    _local.snapshot, _local.version = _snapshot, _version
+
+def unpin(exception=None):
+    _local.snapshot, _local.version = None, None
+
+@contextmanager
+def pinned(snapshot, snapshot_version=None):
+    previous = getattr(_local, 'snapshot', None), getattr(_local, 'version', None)
+    _local.snapshot, _local.version = snapshot, snapshot_version
+    try:
+        yield snapshot
+    finally:
+        _local.snapshot, _local.version = previous
+
+# load the tables + build every derived frame/index in a background thread - the server is up in the meantime
+# (a callback that needs something not loaded yet waits for it, like on first use)
+def warm_up(names=None):
+    def load():
+        loaded = list(LOADERS) + list(BUILDERS)
+        if shared.SHARED_DIR:
+            if attach_published():
+                loaded = list(BUILDERS)                                 # the tables the pages read are published
+            else:
+                logger.warning('nothing published in %s yet - loading the tables in this process', shared.SHARED_DIR)
+        for name in names or loaded:
+            try:
+                get(name)
+            except Exception:
+                logger.exception('warm-up of %s failed', name)
+    thread = threading.Thread(target=load, name='snapshot-warm-up', daemon=True)
+    thread.start()
+    return thread
+#----------------------------------------------------------------------------------------------------------
+# on-disk cache of the tables - Arrow IPC files (uncompressed, so they can be memory-mapped)
+def cache_path(name):
+    return os.path.join(CACHE_DIR, f'{name}.arrow')
+
+def read_cache_index():
+    if not os.path.exists(CACHE_INDEX):
+        return {}
+    with open(CACHE_INDEX) as f:
+        return json.load(f)
+
+def update_cache_index(name, entry):
+    with _cache_lock:
+        index = read_cache_index()
+        if entry is None:
+            index.pop(name, None)
+        else:
+            index[name] = entry
+        with open(f'{CACHE_INDEX}.tmp', 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(f'{CACHE_INDEX}.tmp', CACHE_INDEX)                   # readers never see a half-written index
+
+# a table from the cache if its marker is unchanged, otherwise from the source (then cached for the next start)
+def load_table(name):
+    marker = source.get_table_marker(name)                              # taken first - a load that happens meanwhile
+    _markers[name] = marker                                             # only makes the data look older than it is
+    cached = read_cache_index().get(name)
+    if cached and cached['source'] == source.__name__ and os.path.exists(cache_path(name)):
+        if marker is None:
+            logger.warning('no marker for %s (source unreachable?) - using the cached table', name)
+        if marker is None or cached['marker'] == marker:
+            return read_cached(name)
+
+    dataframe = LOADERS[name]()
+    if dataframe is not None:
+        dataframe = compact(name, dataframe)
+        if marker is not None:
+            write_cached(name, dataframe, marker)                       # compact types are cached as they are
+    return dataframe
+
+# convert the columns of a loaded table to their COLUMN_TYPES
+def compact(name, dataframe):
+    types = {}
+    for column, dtype in COLUMN_TYPES[name].items():
+        values = dataframe[column]
+        if str(values.dtype) == dtype:
+            continue
+        if dtype.startswith('datetime64'):
+            dataframe[column] = pd.to_datetime(values, format='%Y%m%d' if column == 'TIMEID' else None)
+        elif dtype.startswith('int') and values.isna().any():           # no narrow type for a column with nulls
+            continue
+        else:
+            types[column] = dtype
+    return dataframe.astype(types)
+
+def read_cached(name):
+    table = pa.ipc.open_file(pa.memory_map(cache_path(name))).read_all()     # pages are read on demand, no parsing
+    return compact(name, table.to_pandas())                             # (no-op unless cached before COLUMN_TYPES)
+
+def write_cached(name, dataframe, marker):
+    path = cache_path(name)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(dataframe, preserve_index=False)
+        with pa.OSFile(f'{path}.tmp', 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(f'{path}.tmp', path)
+    except (pa.ArrowException, OSError) as err:                         # the dashboard works without the cache
+        logger.warning('%s not cached: %s', name, err)
+        return
+    update_cache_index(name, {'source': source.__name__, 'marker': marker, 'rows': len(dataframe)})
+
+# drop a table from the cache - e.g. after an edit that does not move its marker
+def forget_cached(name):
+    if name in read_cache_index():
+        update_cache_index(name, None)
+
+def derived(name, customer_columns=(), tables=('customer', 'credit')):
+    def register(builder):
+        BUILDERS[name] = builder
+        TABLE_DEPENDENCIES[name] = set(tables)
+        CUSTOMER_DEPENDENCIES[name] = set(customer_columns)
+        return builder
+    return register
+
+def patches(name):
+    def register(patcher):
+        PATCHERS[name] = patcher
+        return patcher
+    return register
+
+def updates(name):
+    def register(updater):
+        UPDATERS[name] = updater
+        return updater
+    return register
+#----------------------------------------------------------------------------------------------------------
+# derived frames
+
+# credit card transactions + the customer columns the pages filter on (one copy shared by all pages)
+# rows are ordered by day in descending order - so filtered row positions never need re-sorting
+@derived('transactions')
+def build_transactions():
+    merged_df = merge_customers(get('credit'))
+    merged_df = merged_df.sort_values('TIMEID', ascending=False, kind='stable', ignore_index=True)
+    return merged_df
+
+# inner join on SSN that keeps the order of the credit rows (merge groups them by SSN) - a day's rows are
+# then in load order, whether the frame was built at once or refreshed with new rows (add_transactions)
+def merge_customers(credit_df):
+    customer_df = get('customer')[['CREDIT_CARD_NO',
+                                   'CUST_STATE',
+                                   'CUST_ZIP']]
+    rows = pd.Index(get('customer')['SSN']).get_indexer(credit_df['CUST_SSN'])
+    found = rows >= 0                                                   # transactions of unknown customers are left out
+    credit_df = credit_df[found].rename(columns={'CUST_SSN': 'SSN'}).reset_index(drop=True)
+    return pd.concat([credit_df, customer_df.iloc[rows[found]].reset_index(drop=True)], axis=1)
+
+# new transactions go in at their day - two binary searches + one copy, no re-sort of the whole frame
+# (same order as a rebuild: after the rows of the same day that were there before)
+@updates('transactions')
+def add_transactions(merged_df, new_df):
+    new_df = new_df[merged_df.columns].sort_values('TIMEID', ascending=False, kind='stable', ignore_index=True)
+    days = -merged_df['TIMEID'].to_numpy().view('i8')                  # negated - ascending for searchsorted
+    positions = np.searchsorted(days, -new_df['TIMEID'].to_numpy().view('i8'), side='right')
+    order = np.insert(np.arange(len(merged_df)), positions, np.arange(len(merged_df), len(merged_df) + len(new_df)))
+    return concat_rows([merged_df, new_df]).take(order).reset_index(drop=True)
+
+# frames with the same columns, one after the other - categorical columns get the (sorted) categories of all frames
+def concat_rows(frames):
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = frames[0][column].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[column].astype(object).dropna().unique())
+            dtype = pd.CategoricalDtype(categories)
+            frames = [frame if frame[column].dtype == dtype else frame.astype({column: dtype}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+#----------------------------------------------------------------------------------------------------------
+# refresh - poll the markers of the loaded tables, fetch what changed, swap the new version in
+# returns True if a new version was swapped in
+def refresh():
+    with recording_edits():
+        current = _snapshot
+        tables = [name for name in LOADERS if name in current]
+        markers = {name: source.get_table_marker(name) for name in tables}
+        changed = [name for name in tables if markers[name] is not None and markers[name] != _markers.get(name)]
+
+        new = {name: current[name] for name in tables}
+        appended = {}                                                   # table -> new rows, if no row was replaced
+        for name in list(changed):
+            table, new_rows = fetch_changes(name, current[name], markers[name])
+            if table is None:                                           # source unreachable - next time
+                changed.remove(name)
+                continue
+            new[name] = table
+            if new_rows is not None:
+                appended[name] = new_rows
+        if not changed:
+            return False
+
+        with pinned(new):
+            update_derived(current, new, set(changed), appended)
+        swap(new)
+        _markers.update({name: markers[name] for name in changed})
+
+    for name in changed:
+        write_cached(name, new[name], markers[name])                    # the next start begins from this version
+    logger.info('snapshot version %d - %s refreshed', _version, ', '.join(changed))
+    return True
+
+# customer edits made from now on are recorded - swap() replays them on the new version
+@contextmanager
+def recording_edits():
+    global _edits
+    with _lock:
+        _edits = []
+    try:
+        yield
+    finally:
+        with _lock:
+            _edits = None
+
+# a new version in place of the current one - requests pinned to the current one keep reading it
+# `replay`: the customer edits recorded while it was built are applied to it first
+def swap(new, replay=True):
+    global _snapshot, _version
+    with _lock:
+        for ssn, values, edited in (_edits if replay else ()):
+            apply_customer_update(new, ssn, values, edited)
+        _snapshot, _version = new, _version + 1
+
+# rows of a table newer than the latest marker value it holds -> (table with them, the new rows if none was replaced)
+def fetch_changes(name, table, marker):
+    column = database.MARKER_COLUMNS[name][1]
+    latest = table[column].max() if len(table) else None
+    if latest is None or pd.isna(latest):
+        return compact(name, LOADERS[name]()), None
+    new_df = source.get_new_data(name, latest.to_pydatetime() if isinstance(latest, pd.Timestamp) else int(latest))
+    if new_df is None:
+        return None, None
+
+    new_df = compact(name, new_df)
+    replaced = table[KEYS[name]].isin(new_df[KEYS[name]]).to_numpy()
+    table = concat_rows([table[~replaced] if replaced.any() else table, new_df])
+    if len(table) != marker[0]:                                         # rows deleted/changed without moving the marker
+        logger.info('%s: %d rows expected, %d after the delta - loading the whole table', name, marker[0], len(table))
+        return compact(name, LOADERS[name]()), None
+    return table, None if replaced.any() else new_df
+
+# derived frames of the new version - kept if none of their tables changed, updated with the new transactions
+# (UPDATERS) if credit rows were only added, rebuilt otherwise (the current version pinned is `new`)
+def update_derived(current, new, changed, appended):
+    new_transactions_df = None
+    for name in BUILDERS:
+        if name not in current:                                         # not built yet - built on first use
+            continue
+        if not TABLE_DEPENDENCIES[name] & changed:
+            new[name] = current[name]
+        elif changed == {'credit'} and 'credit' in appended and name in UPDATERS:
+            if new_transactions_df is None:
+                new_transactions_df = merge_customers(appended['credit'])
+            new[name] = UPDATERS[name](current[name], new_transactions_df)
+        else:
+            get(name)
+
+# poll for new data every `interval` seconds in a background thread (None if refreshing is turned off)
+def start_refresher(interval=REFRESH_SECONDS):
+    if interval <= 0:
+        return None
+    def poll():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh()
+            except Exception:
+                logger.exception('snapshot refresh failed')
+    thread = threading.Thread(target=poll, name='snapshot-refresher', daemon=True)
+    thread.start()
+    return thread
+#----------------------------------------------------------------------------------------------------------
+# shared mode (Dashboard_Shared_Dir) - the loader publishes, the workers attach (shared.py)
+
+# loader: the shared frames + the edits the workers logged -> a new published version
+def publish():
+    global _edits_offset, _edits_log
+    with _lock:
+        for name in shared.SHARED_TABLES:
+            get(name)
+        edits, _edits_offset, _edits_log = shared.read_edits(_edits_offset, _edits_log)
+        if edits:
+            swap(edited_version(edits), replay=False)
+        published, _edits_log = shared.publish({name: get(name) for name in shared.SHARED_TABLES}, _edits_offset, _edits_log)
+        _edits_offset = 0                                               # the new log only holds edits not published yet
+    logger.info('snapshot published - version %d', published)
+    return published
+
+# loader: bytes of the edits log already published (more in the log -> edits to publish)
+def edits_offset():
+    return _edits_offset
+
+# worker (before every request): switch to a newly published version in the background, replay new edits
+def follow_published():
+    if shared.current_stamp() != _published and not _attach_lock.locked():
+        threading.Thread(target=attach_published, name='snapshot-attach', daemon=True).start()
+    elif shared.edits_size() > _edits_offset:
+        follow_edits()
+
+# attach to the published version + rebuild the indexes this worker had, then swap it in (False if none published)
+def attach_published():
+    global _published, _edits_offset, _edits_log
+    with _attach_lock, recording_edits():
+        stamp = shared.current_stamp()
+        if stamp == _published:
+            return True
+        current = shared.read_current()
+        if current is None:
+            return False
+        new = shared.attach(current)
+        edits, offset, log = shared.read_edits(0, current.get('edits_log'))
+        with pinned(new):
+            for edit in edits:
+                apply_customer_update(new, edit['ssn'], edit['values'])
+            for name in BUILDERS:
+                if name in _snapshot and name not in new:
+                    get(name)
+        swap(new)
+        _published, _edits_offset, _edits_log = stamp, offset, log
+    logger.info('snapshot version %d - attached to published version %d', _version, current['version'])
+    return True
+
+# edits made by the other workers since the last request
+def follow_edits():
+    global _edits_offset, _edits_log
+    with _lock:
+        edits, _edits_offset, _edits_log = shared.read_edits(_edits_offset, _edits_log)
+        if edits:
+            swap(edited_version(edits), replay=False)                   # results memoized before the edits are not served again
+
+# edits from the shared log applied to a copy of the current version (nothing to apply to if the customers are not loaded)
+def edited_version(edits):
+    new = dict(_snapshot)
+    if 'customer' in new:
+        for edit in edits:
+            apply_customer_update(new, edit['ssn'], edit['values'])
+    return new
+#----------------------------------------------------------------------------------------------------------
+# update a customer in every frame of the snapshot (so all pages see the latest changes without a restart)
+# the edit goes to a copy of the current version, swapped in as a new version - a request pinned to the current one
+# never sees it half applied (and results memoized before the edit are not served again)
+# returns the columns that changed (None if the snapshot is not loaded - changes are unknown)
+def update_customer(ssn, values):
+    global _version
+    with _lock:
+        if 'customer' not in _snapshot:                            # nothing loaded yet (or live query mode)
+            forget_cached('customer')                               # edits do not change LAST_UPDATED
+            _version += 1
+            return None
+        new = dict(_snapshot)
+        changed = apply_customer_update(new, ssn, values)
+        if _edits is not None:                                      # a new version is being built from the previous frames
+            _edits.append((ssn, values, changed))
+        if changed:
+            swap(new, replay=False)
+            forget_cached('customer')
+            if shared.SHARED_DIR:                                   # the other workers + the loader replay it
+                shared.append_edit(ssn, values)
+        return changed
+
+# `snapshot` - a version no request reads yet: the frames + indexes it changes are replaced by changed copies
+# (the previous version may share them), every other frame stays shared
+# `changed` - the columns known to have changed (when an edit is replayed on a new version)
+def apply_customer_update(snapshot, ssn, values, changed=None):
+    customer_df = snapshot['customer']
+    customer = customer_df['SSN'] == ssn
+    values = {column: to_column_type(customer_df[column], value) for column, value in values.items()}
+    if changed is None:
+        previous = customer_df.loc[customer, list(values)]
+        changed = {column for column in values if not (previous[column] == values[column]).all()}
+    snapshot['customer'] = customer_df = customer_df.copy(deep=False)      # set_values copies the columns it writes
+    set_values(customer_df, customer, values)
+
+    if 'transactions' in snapshot:
+        snapshot['transactions'] = merged_df = snapshot['transactions'].copy(deep=False)
+        set_values(merged_df, merged_df['SSN'] == ssn, {column: value for column, value in values.items()
+                                                        if column in merged_df.columns})
+
+    # patch the indexes built on a changed column (the patchers return a copy), or drop them - they are rebuilt on next use
+    for name in list(snapshot):
+        if CUSTOMER_DEPENDENCIES.get(name, set()) & changed:
+            if name in PATCHERS:
+                snapshot[name] = PATCHERS[name](snapshot[name], ssn, values)
+            else:
+                del snapshot[name]
+    return changed
+
+# a value typed in a form -> the type of the column it is written to (e.g. '75002' -> 75002 for CUST_ZIP)
+# raises ValueError if the column cannot hold it (e.g. 'ABCDE' for CUST_ZIP) - compacted types are never given up
+def to_column_type(column, value):
+    dtype = column.dtype
+    if pd.api.types.is_integer_dtype(dtype):
+        if isinstance(value, str):
+            value = value.strip()
+        if isinstance(value, bool) or not (isinstance(value, (int, np.integer)) or (isinstance(value, str) and value.lstrip('-').isdigit())):
+            raise ValueError(f'{column.name}: {value!r} is not a whole number')
+        number = int(value)
+        limits = np.iinfo(dtype)
+        if not limits.min <= number <= limits.max:                      # np.int32('99999999999') would wrap around
+            raise ValueError(f'{column.name}: {value!r} is out of range')
+        return dtype.type(number)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        try:
+            return pd.Timestamp(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column.name}: {value!r} is not a date') from None
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories.dtype == object and value is not None and not isinstance(value, str):
+        raise ValueError(f'{column.name}: {value!r} is not text')           # mixed categories could not be kept sorted
+    return value
+
+# write values into rows of a compacted frame (a new category is added first) - every value is checked against
+# the column type (COLUMN_TYPES) before anything is written, a value that does not fit raises ValueError
+# copy-on-write: a written column is replaced by a changed copy, so the frames of the previous version (or the
+# read-only ones of shared.attach) it was copied from never change
+def set_values(dataframe, rows, values):
+    values = {column: to_column_type(dataframe[column], value) for column, value in values.items()}
+    for column, value in values.items():
+        dtype = dataframe[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype) and value is not None and value not in dtype.categories:
+            column_values = dataframe[column].cat.set_categories(dtype.categories.union([value]))   # kept sorted
+        else:
+            column_values = dataframe[column].copy()
+        column_values.loc[rows] = value
+        dataframe[column] = column_values
+#----------------------------------------------------------------------------------------------------------
+# display - frames keep their compact types, only the rows sent to the browser are formatted
+
+# rows of a frame as dash_table records (dates as YYYY-MM-DD, categories as their text, numpy -> python values)
+# column by column - several times faster than to_dict('records') on categorical columns
+def to_records(dataframe):
+    columns = {}
+    for column in dataframe.columns:
+        values = dataframe[column]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            text = np.datetime_as_string(values.to_numpy(), unit='D').astype(object)
+            text[values.isna().to_numpy()] = None
+            columns[column] = text.tolist()
+        else:
+            columns[column] = values.tolist()
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
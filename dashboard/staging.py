@@ -0,0 +1,47 @@
+import json
+import os
+
+import pandas as pd
+
+from database import CUSTOMER_COLUMNS, CREDIT_COLUMNS, BRANCH_COLUMNS, TABLE_COLUMNS, MARKER_COLUMNS
+#----------------------------------------------------------------------------------------------------------
+# Parquet staging layer (written by the ETL - etl/parquet.py) as a data source for the dashboard.
+# Dashboard_Source=parquet - the snapshot tables are read from the Parquet files instead of MariaDB.
+# 1. Only the columns the dashboard uses are read (column pruning).
+# 2. Credit is partitioned by YEAR + MONTH - filters on them skip whole folders (partition pruning).
+#----------------------------------------------------------------------------------------------------------
+PARQUET_DIR = os.getenv('Parquet_Dir', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parquet'))
+PARQUET_SOURCE = os.getenv('Dashboard_Source', '').lower() == 'parquet'
+
+# table -> files + row counts (empty if the ETL has not staged anything yet)
+def read_manifest():
+    path = os.path.join(PARQUET_DIR, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+# read a staged table - e.g. read_table('credit', ['TIMEID', 'TRANSACTION_VALUE'], [('YEAR', '=', 2018)])
+def read_table(name, columns=None, filters=None):
+    return pd.read_parquet(os.path.join(PARQUET_DIR, name), engine='pyarrow', columns=columns, filters=filters)
+
+# same frames as get_customer_data(), get_credit_data() + get_branch_data() (database.py)
+def get_customer_data():
+    return read_table('customer', CUSTOMER_COLUMNS)
+
+def get_credit_data(year=None, month=None):
+    filters = [(column, '=', value) for column, value in (('YEAR', year), ('MONTH', month)) if value is not None]
+    return read_table('credit', CREDIT_COLUMNS, filters or None)
+
+def get_branch_data():
+    return read_table('branch', BRANCH_COLUMNS)
+
+# [row count, time staged] of a table (from the manifest) - None if it has not been staged
+def get_table_marker(name):
+    table = read_manifest().get(name)
+    return [table['rows'], table['updated']] if table else None
+
+# rows of a staged table with a later marker column value than `after` (same as database.get_new_data)
+def get_new_data(name, after):
+    column = MARKER_COLUMNS[name][1]
+    return read_table(name, TABLE_COLUMNS[name], [(column, '>', after)])
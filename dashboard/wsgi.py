@@ -0,0 +1,17 @@
+import snapshot
+from app import app
+from database import LIVE_QUERY
+from shared import SHARED_DIR
+#----------------------------------------------------------------------------------------------------------
+# WSGI entry point - production serving with several worker processes (app.py runs the single-process dev server):
+#   gunicorn --chdir dashboard --workers 4 wsgi:server
+# With Dashboard_Shared_Dir set, the tables are loaded once by publish.py and every worker attaches to them
+# (shared.py) - more workers add concurrency, not copies of the tables. Without it every worker loads its own.
+# No --preload: the warm-up + refresher threads start in each worker, after the fork.
+#----------------------------------------------------------------------------------------------------------
+server = app.server
+
+if not LIVE_QUERY:
+    snapshot.warm_up()
+    if not SHARED_DIR:
+        snapshot.start_refresher()                                      # in shared mode publish.py refreshes
@@ -0,0 +1,6 @@
+#----------------------------------------------------------------------------------------------------------
+# ETL + ELT pipelines for the credit card and loan data (shared by the notebooks + the command line).
+# extract.py / transform.py / load.py - the steps of each pipeline
+# pipelines.py - the pipelines + the stages they depend on
+# runner.py - runs the stages in parallel, in dependency order (python -m etl)
+#----------------------------------------------------------------------------------------------------------
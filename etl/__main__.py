@@ -0,0 +1,36 @@
+import argparse
+import logging
+import sys
+
+from etl.pipelines import STAGES
+from etl.runner import run
+from etl.session import stop_spark
+#----------------------------------------------------------------------------------------------------------
+# Command line (headless - e.g. from cron):
+#   python -m etl                           every pipeline, incremental
+#   python -m etl credit loan --full        only these pipelines (+ the stages they depend on), every record
+# exit code 1 if any stage failed or was skipped
+#----------------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m etl', description='Run the credit card + loan ETL pipelines.')
+    parser.add_argument('stages', nargs='*', choices=list(STAGES), metavar='stage',
+                        help=f'stages to run (default: all) - {", ".join(STAGES)}')
+    parser.add_argument('--full', action='store_true', help='re-process every record (ignore the high-water marks)')
+    parser.add_argument('--retries', type=int, default=2, help='retries per stage (default: 2)')
+    parser.add_argument('--retry-delay', type=int, default=30, help='seconds before the first retry (default: 30)')
+    parser.add_argument('--workers', type=int, default=None, help='max stages running at the same time (default: all)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        status = run(STAGES, args.stages, incremental=not args.full, retries=args.retries,
+                     retry_delay=args.retry_delay, max_workers=args.workers)
+    finally:
+        stop_spark()                                   # if a pipeline started Spark
+
+    for name, result in status.items():
+        print(f'{name}: {result}')
+    return 0 if all(result == 'done' for result in status.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+from dotenv import load_dotenv              # environment variables
+import os
+import tempfile
+#----------------------------------------------------------------------------------------------------------
+# Settings shared by every pipeline - database, source files + log files.
+# Paths are relative to the repository (not the working directory), so the pipelines can run from cron.
+#----------------------------------------------------------------------------------------------------------
+# load the environment variables
+load_dotenv()
+
+# assign environment variables
+PASSWORD = os.getenv('MariaDB_Password')
+USER = os.getenv('MariaDB_Username')
+HOST = os.getenv('MariaDB_Host', 'localhost')
+DATABASE = 'creditcard_capstone'
+
+# loading - 'bulk' (TSV files + LOAD DATA LOCAL INFILE) or 'jdbc' (batched INSERTs, also the fallback for bulk)
+LOAD_STRATEGY = os.getenv('ETL_Load_Strategy', 'bulk')
+LOAD_PARTITIONS = int(os.getenv('ETL_Load_Partitions', 4))             # files loaded / JDBC connections in parallel
+JDBC_BATCHSIZE = int(os.getenv('ETL_JDBC_Batchsize', 10000))            # rows per INSERT batch
+STAGING_DIR = os.getenv('ETL_Staging_Dir', tempfile.gettempdir())      # local disk - read by LOAD DATA LOCAL INFILE
+
+# engine - 'auto' (pandas for input files up to ETL_Pandas_Max_MB, Spark above), 'pandas' or 'spark' (see etl/engine.py)
+ENGINE = os.getenv('ETL_Engine', 'auto')
+PANDAS_MAX_MB = int(os.getenv('ETL_Pandas_Max_MB', 64))
+
+# reading - PERMISSIVE (bad records set aside in _corrupt_record), DROPMALFORMED or FAILFAST (stop at the first bad record)
+READ_MODE = os.getenv('ETL_Read_Mode', 'PERMISSIVE')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CDW_FILES = os.path.join(ROOT, 'cdw_files')
+CC_LOGFILE = os.path.join(ROOT, 'cc_logfile.txt')
+LOAN_LOGFILE = os.path.join(ROOT, 'loan_logfile.txt')
+METRICS_FILE = os.getenv('ETL_Metrics_File', os.path.join(ROOT, 'etl_metrics.jsonl'))   # stage metrics - JSON lines (etl/metrics.py)
+PARQUET_DIR = os.getenv('Parquet_Dir', os.path.join(ROOT, 'parquet'))  # staging layer - read by the dashboard too
+
+# external api
+LOAN_URL = 'https://raw.githubusercontent.com/platformps/LoanDataset/main/loan_data.json'
+DOWNLOAD_CACHE = os.getenv('ETL_Download_Cache', os.path.join(ROOT, 'download_cache'))     # api responses by content hash
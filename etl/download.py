@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from etl.config import DOWNLOAD_CACHE
+#----------------------------------------------------------------------------------------------------------
+# Cached, conditional downloads for the api sources (loan data).
+# 1. The response body is streamed to disk in chunks and hashed on the way - stored once per content
+#    (objects/<sha256>.json), so the same content is never kept twice.
+# 2. The ETag / Last-Modified of the last download are sent back (If-None-Match / If-Modified-Since) -
+#    an unchanged source answers 304 Not Modified: one round trip, no body, no new file.
+# 3. The hash of the last content a pipeline loaded is kept too - unchanged content -> nothing to load.
+# 4. Connection errors, timeouts, bodies cut off mid-stream, 429 + 5xx responses are retried with exponential backoff.
+#----------------------------------------------------------------------------------------------------------
+INDEX = 'index.json'                                # url -> hash, validators + the hash last loaded
+CHUNK_SIZE = 1024 * 1024
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                requests.exceptions.ChunkedEncodingError)                  # connection dropped mid-body
+
+logger = logging.getLogger(__name__)
+
+_index_lock = threading.Lock()
+
+def read_index(cache_dir=DOWNLOAD_CACHE):
+    path = os.path.join(cache_dir, INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def update_index(url, values, cache_dir=DOWNLOAD_CACHE):
+    with _index_lock:
+        index = read_index(cache_dir)
+        index.setdefault(url, {}).update(values)
+        path = os.path.join(cache_dir, INDEX)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(f'{path}.tmp', path)             # readers never see a half-written index
+
+# download url into the cache (if it changed) - returns {'path', 'sha256', 'changed', 'loaded', ...}
+#   changed - the content differs from the previous download
+#   loaded  - the content is the one a pipeline already loaded (see mark_loaded)
+def download(url, cache_dir=DOWNLOAD_CACHE, retries=3, backoff=1, timeout=30):
+    os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+    entry = read_index(cache_dir).get(url, {})
+    cached = entry.get('sha256') and os.path.exists(object_path(entry['sha256'], cache_dir))
+
+    headers = {}
+    if cached:                                      # no validators without the file they describe
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    attempt = 0
+    while True:
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code in RETRY_STATUS and attempt < retries:
+                    raise requests.HTTPError(f'{response.status_code} {response.reason}', response=response)
+                if response.status_code == 304 and not cached:
+                    # nothing cached to re-use (e.g. a 304 from a proxy) - asked again past any cache, not an attempt
+                    if 'Cache-Control' in headers:
+                        raise requests.HTTPError('304 Not Modified without a cached copy', response=response)
+                    logger.warning('download of %s: 304 Not Modified without a cached copy - downloading again', url)
+                    headers = {'Cache-Control': 'no-cache'}
+                    continue
+                if response.status_code == 304:
+                    sha256, changed = entry['sha256'], False
+                else:
+                    response.raise_for_status()
+                    sha256 = save_body(response, cache_dir)
+                    changed = sha256 != entry.get('sha256')
+                    entry = {'etag': response.headers.get('ETag'),
+                             'last_modified': response.headers.get('Last-Modified'),
+                             'size': os.path.getsize(object_path(sha256, cache_dir))}
+            break
+        except RETRY_ERRORS as err:
+            status = getattr(err.response, 'status_code', None)
+            if attempt == retries or (status is not None and status not in RETRY_STATUS):
+                raise
+            logger.warning('download of %s failed (attempt %d of %d): %s - retrying in %g s',
+                           url, attempt + 1, retries + 1, err, backoff * 2 ** attempt)
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+    entry.update({'sha256': sha256, 'checked': datetime.now().isoformat(timespec='seconds')})
+    update_index(url, entry, cache_dir)
+    loaded_sha256 = read_index(cache_dir)[url].get('loaded_sha256')
+    return {'path': object_path(sha256, cache_dir), 'sha256': sha256, 'changed': changed,
+            'loaded': sha256 == loaded_sha256, 'not_modified': response.status_code == 304}
+
+# stream the body to a temporary file, hashing every chunk - then move it to objects/<sha256>.json
+def save_body(response, cache_dir=DOWNLOAD_CACHE):
+    sha256 = hashlib.sha256()
+    descriptor, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.part')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                sha256.update(chunk)
+                f.write(chunk)
+        os.replace(temporary_path, object_path(sha256.hexdigest(), cache_dir))      # same content -> same file
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    return sha256.hexdigest()
+
+def object_path(sha256, cache_dir=DOWNLOAD_CACHE):
+    return os.path.join(cache_dir, 'objects', f'{sha256}.json')
+
+# the content a pipeline has loaded (the next run skips it if the source has not changed)
+def mark_loaded(url, sha256, cache_dir=DOWNLOAD_CACHE):
+    update_index(url, {'loaded_sha256': sha256}, cache_dir)
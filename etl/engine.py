@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+
+from etl import pandas_engine, spark_engine
+from etl.config import ENGINE, PANDAS_MAX_MB
+#----------------------------------------------------------------------------------------------------------
+# Engine selection - the same pipeline steps run on pandas/pyarrow (pandas_engine.py) or Spark (spark_engine.py).
+# Starting Spark (JVM, executors, scheduling) costs more than the whole job for small files - customer (952 rows)
+# and branch (115 rows) run on pandas, big credit files still run on Spark.
+#----------------------------------------------------------------------------------------------------------
+ENGINES = {
+    'pandas': pandas_engine,
+    'spark': spark_engine
+}
+
+# engine for the input files - 'auto' picks pandas if they add up to PANDAS_MAX_MB or less
+def choose_engine(*files, engine=ENGINE):
+    if engine != 'auto':
+        return ENGINES[engine]
+    size = sum(os.path.getsize(file) for file in files)
+    return pandas_engine if size <= PANDAS_MAX_MB * 1024 * 1024 else spark_engine
+
+# engine a dataframe was made by (e.g. the result of an earlier stage)
+def engine_of(dataframe):
+    return pandas_engine if isinstance(dataframe, pd.DataFrame) else spark_engine
@@ -0,0 +1,59 @@
+import os
+
+from pyspark import SparkFiles
+
+from etl.config import HOST, READ_MODE
+from etl.download import download
+from etl.schemas import CORRUPT_RECORD, with_corrupt_record
+from etl.session import spark
+
+# json reader - with a schema (etl/schemas.py) Spark does not scan the file to infer the types
+def json_reader(schema=None, mode=READ_MODE):
+    reader = spark().read.option('mode', mode)
+    if schema is not None:
+        if mode == 'PERMISSIVE':
+            schema = with_corrupt_record(schema)
+            reader = reader.option('columnNameOfCorruptRecord', CORRUPT_RECORD)
+        reader = reader.schema(schema)
+    return reader
+
+# extract json file
+def extract_json(file, schema=None, mode=READ_MODE):
+    return json_reader(schema, mode).json(file)
+
+# extract table from MariaDB
+def extract_db(db_name, table_name, user, password):
+    return spark().read.format("jdbc") \
+                       .option("url", f"jdbc:mysql://{HOST}:3306/{db_name}") \
+                       .option("dbtable", table_name) \
+                       .option("user", user) \
+                       .option("password", password) \
+                       .load()
+
+# extract api - the response is downloaded into the download cache (etl/download.py) - only if it changed -
+# and handed to Spark as a local file (https://stackoverflow.com/questions/41820977/how-to-save-json-data-fetched-from-url-in-pyspark)
+def extract_api(url, schema=None, mode=READ_MODE):
+    return extract_download(download(url), schema, mode)
+
+# read a downloaded file (the result of download(url))
+def extract_download(downloaded, schema=None, mode=READ_MODE):
+    spark().sparkContext.addFile(downloaded['path'])                        # local file -> every executor (no second download)
+    absolute_filepath = SparkFiles.get(os.path.basename(downloaded['path']))    # get absolute path to the file
+    dataframe = json_reader(schema, mode).json(absolute_filepath)           # converts json file -> pyspark dataframe
+    return dataframe
+
+# records that matched the schema (PERMISSIVE mode keeps the others in _corrupt_record)
+# the parsed records are cached - Spark cannot filter on _corrupt_record straight from the file (e.g. for a count),
+# and the file is still only parsed once
+def valid_records(dataframe):
+    if CORRUPT_RECORD not in dataframe.columns:
+        return dataframe
+    dataframe = dataframe.cache()
+    return dataframe.filter(dataframe[CORRUPT_RECORD].isNull()).drop(CORRUPT_RECORD)
+
+# records that did not match the schema - the raw text of each record
+def corrupt_records(dataframe):
+    if CORRUPT_RECORD not in dataframe.columns:
+        return None
+    dataframe = dataframe.cache()
+    return dataframe.filter(dataframe[CORRUPT_RECORD].isNotNull()).select(CORRUPT_RECORD)
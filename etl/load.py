@@ -0,0 +1,261 @@
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+from pyspark.sql.functions import lit
+
+import mysql.connector as mariadb
+from mysql.connector import errorcode
+
+from etl.config import HOST, LOAD_STRATEGY, LOAD_PARTITIONS, JDBC_BATCHSIZE, STAGING_DIR
+#----------------------------------------------------------------------------------------------------------
+# Loading functions - append/overwrite, incremental upsert (high-water mark + staging table)
+# 1. bulk: the dataframe is written as partitioned TSV files, then every file is loaded at the same time
+#    with LOAD DATA LOCAL INFILE - secondary indexes are dropped first and rebuilt once at the end.
+# 2. jdbc: batched INSERTs over several connections (rewriteBatchedStatements) - used when bulk is not possible.
+#----------------------------------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+
+# string types JDBC creates - no index without a prefix length, so key columns of these types become VARCHAR
+TEXT_TYPES = ('text', 'tinytext', 'mediumtext', 'longtext')
+
+# TSV format understood by both Spark and LOAD DATA - every value quoted ("" inside a value), no backslash escaping
+# (values are loaded exactly as they are - NULL is written as \N and turned back into NULL by the SET clause)
+TSV_OPTIONS = {
+    'sep': '\t',
+    'quote': '"',
+    'escape': '"',
+    'quoteAll': 'true',
+    'nullValue': '\\N',
+    'dateFormat': 'yyyy-MM-dd',
+    'timestampFormat': 'yyyy-MM-dd HH:mm:ss',
+    'header': 'false'
+}
+
+LOAD_DATA = '''
+    LOAD DATA LOCAL INFILE %s
+    INTO TABLE {table_name}
+    CHARACTER SET utf8mb4
+    FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+    LINES TERMINATED BY '\\n'
+    ({variables})
+    SET {columns}
+    '''
+
+# load/write data to MariaDB - strategy = 'bulk' or 'jdbc'
+def load_to_db(dataframe, db_name, table_name, user, password, mode='append', strategy=LOAD_STRATEGY):
+    if strategy == 'bulk' and local_infile_enabled(db_name, user, password):
+        bulk_load_to_db(dataframe, db_name, table_name, user, password, mode)
+    else:
+        jdbc_load_to_db(dataframe, db_name, table_name, user, password, mode)
+
+# load/write data to MariaDB with JDBC - batched INSERTs, one connection per partition
+def jdbc_load_to_db(dataframe, db_name, table_name, user, password, mode='append'):
+    dataframe.write.format("jdbc") \
+                    .mode(mode) \
+                    .option("truncate", "true") \
+                    .option("url", f"jdbc:mysql://{HOST}:3306/{db_name}?rewriteBatchedStatements=true") \
+                    .option("dbtable", table_name) \
+                    .option("user", user) \
+                    .option("password", password) \
+                    .option("batchsize", JDBC_BATCHSIZE) \
+                    .option("numPartitions", LOAD_PARTITIONS) \
+                    .save()
+
+# the server has to allow LOAD DATA LOCAL INFILE (local_infile = ON), otherwise bulk falls back to JDBC
+def local_infile_enabled(db_name, user, password):
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    cur.execute('SELECT @@GLOBAL.local_infile')
+    enabled = bool(cur.fetchone()[0])
+    con.close()
+    if not enabled:
+        logger.warning('local_infile is disabled on the server - loading with JDBC instead')
+    return enabled
+
+# load/write data to MariaDB with LOAD DATA LOCAL INFILE - one TSV file per partition, loaded in parallel
+def bulk_load_to_db(dataframe, db_name, table_name, user, password, mode='append'):
+    # create the table (or empty it for "overwrite") with the same column types as the JDBC path - no rows are sent
+    jdbc_load_to_db(dataframe.limit(0), db_name, table_name, user, password, mode)
+
+    staging_dir = tempfile.mkdtemp(prefix=f'{table_name}_', dir=STAGING_DIR)
+    try:
+        dataframe.repartition(LOAD_PARTITIONS).write.mode('overwrite').options(**TSV_OPTIONS).csv(staging_dir)
+        files = sorted(glob(os.path.join(staging_dir, 'part-*')))
+        variables = [f'@column_{position}' for position in range(len(dataframe.columns))]
+        sql = LOAD_DATA.format(table_name=table_name, 
+                               variables=', '.join(variables),
+                               columns=', '.join(f"`{column}` = NULLIF({variable}, '\\\\N')" 
+                                                 for column, variable in zip(dataframe.columns, variables)))
+
+        indexes = drop_secondary_indexes(db_name, table_name, user, password)
+        try:
+            with ThreadPoolExecutor(max_workers=LOAD_PARTITIONS) as executor:
+                list(executor.map(lambda file: load_file(file, sql, staging_dir, db_name, user, password), files))
+        finally:
+            create_indexes(db_name, table_name, indexes, user, password)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def load_file(file, sql, staging_dir, db_name, user, password):
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name,
+                          allow_local_infile_in_path=staging_dir)              # only files from the staging directory
+    cur = con.cursor()
+    try:
+        cur.execute('SET unique_checks = 0, foreign_key_checks = 0')
+        cur.execute(sql, (file,))
+        con.commit()
+    finally:
+        con.close()
+
+# drop every index except the primary key - returns (name, non_unique, columns) to create them again
+def drop_secondary_indexes(db_name, table_name, user, password):
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    cur.execute('''
+        SELECT INDEX_NAME, MAX(NON_UNIQUE), 
+               GROUP_CONCAT(CONCAT('`', COLUMN_NAME, '`', IF(SUB_PART IS NULL, '', CONCAT('(', SUB_PART, ')'))) 
+                            ORDER BY SEQ_IN_INDEX)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY'
+        GROUP BY INDEX_NAME
+        ''', (db_name, table_name))
+    indexes = cur.fetchall()
+    if indexes:
+        cur.execute(f'ALTER TABLE {table_name} ' + ', '.join(f'DROP INDEX `{name}`' for name, _, _ in indexes))
+    con.close()
+    return indexes
+
+# create the indexes dropped before a bulk load - one ALTER TABLE, so the table is only rebuilt once
+def create_indexes(db_name, table_name, indexes, user, password):
+    if not indexes:
+        return
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    cur.execute(f'ALTER TABLE {table_name} ' + ', '.join(f'ADD {"" if non_unique else "UNIQUE "}INDEX `{name}` ({columns})'
+                                                         for name, non_unique, columns in indexes))
+    con.close()
+
+# create the monthly statement table (primary key = credit card number, year, month) if it does not exist yet
+# - upsert_to_db then keeps this table definition on every refresh
+def create_statement_table(db_name, user, password):
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS CDW_SAPP_MONTHLY_STATEMENT (
+        CREDIT_CARD_NO VARCHAR(16) NOT NULL,
+        YEAR INT NOT NULL,
+        MONTH INT NOT NULL,
+        CUST_SSN INT,
+        FIRST_NAME VARCHAR(50),
+        LAST_NAME VARCHAR(50),
+        FULL_STREET_ADDRESS VARCHAR(100),
+        CUST_CITY VARCHAR(50),
+        CUST_STATE VARCHAR(2),
+        CUST_ZIP INT,
+        BRANCH_CODE INT,
+        BRANCH_NAME VARCHAR(50),
+        BRANCH_STREET VARCHAR(100),
+        BRANCH_CITY VARCHAR(50),
+        BRANCH_STATE VARCHAR(2),
+        BRANCH_ZIP INT,
+        TRANSACTION_COUNT INT,
+        NEW_BALANCE DECIMAL(12, 2),
+        REWARDS DECIMAL(12, 2),
+        CREDIT_LIMIT DECIMAL(12, 2),
+        AVAILABLE_CREDIT DECIMAL(12, 2),
+        STATEMENT_DATE DATE,
+        DUE_DATE DATE,
+        PRIMARY KEY (CREDIT_CARD_NO, YEAR, MONTH)
+    )
+    ''')
+    con.close()
+
+# high-water mark of a table - the largest value of `column` already loaded (None if the table does not exist yet)
+# (an index on `column` - see ensure_keys - makes this one index lookup instead of a table scan)
+def get_watermark(db_name, table_name, column, user, password):
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    try:
+        cur.execute(f'SELECT MAX({column}) FROM {table_name}')
+        return cur.fetchone()[0]
+    except mariadb.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:                     # anything else is not a first run - no full reload
+            raise
+        return None                                                     # first run - table not created yet
+    finally:
+        con.close()
+
+# keep only the records after the high-water mark (every record on the first run, or when watermark = None)
+def new_records(dataframe, column, watermark):
+    if watermark is None:
+        return dataframe
+    return dataframe.filter(column > lit(watermark))
+
+# upsert data to MariaDB by primary key - rows are written to a staging table, then replace/extend the table in one transaction
+# (re-running a job never duplicates rows, and only the new/changed rows are sent)
+# `watermark` - the column get_watermark reads for this table (indexed, like the key columns)
+def upsert_to_db(dataframe, db_name, table_name, key_columns, user, password, watermark=None):
+    if not dataframe.head(1):                                   # nothing new since the last run
+        return
+
+    staging_table = f'{table_name}_STAGING'
+    load_to_db(dataframe, db_name, staging_table, user, password, mode='overwrite')
+    merge_staging(db_name, table_name, staging_table, dataframe.columns, key_columns, user, password, watermark)
+
+# replace/extend the table with the rows of its staging table - in one transaction
+# rows are matched through the primary key, so the cost follows the size of the staging table, not of the table
+def merge_staging(db_name, table_name, staging_table, columns, key_columns, user, password, watermark=None):
+    updates = ', '.join(f'{column} = VALUES({column})' for column in columns if column not in key_columns)
+    columns = ', '.join(columns)
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    try:
+        cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} LIKE {staging_table}')            # first run
+        ensure_keys(cur, db_name, table_name, key_columns, watermark)
+        if updates:
+            cur.execute(f'INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging_table} '
+                        f'ON DUPLICATE KEY UPDATE {updates}')
+        else:                                                           # every column is part of the key
+            cur.execute(f'INSERT IGNORE INTO {table_name} ({columns}) SELECT {columns} FROM {staging_table}')
+        con.commit()
+    except mariadb.Error:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+# primary key on the key columns + an index on the watermark column (the tables JDBC creates have neither, and TEXT
+# for strings - a key column of a TEXT_TYPES type becomes VARCHAR(255) first). A table created without the key gets it now:
+# ALTER IGNORE keeps the first row of every key, so duplicates loaded before are removed once.
+def ensure_keys(cur, db_name, table_name, key_columns, watermark=None):
+    cur.execute('''
+        SELECT INDEX_NAME, MAX(NON_UNIQUE), GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        GROUP BY INDEX_NAME
+        ''', (db_name, table_name))
+    indexes = cur.fetchall()
+    cur.execute('''
+        SELECT COLUMN_NAME, DATA_TYPE
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        ''', (db_name, table_name))
+    types = {column.upper(): data_type.lower() for column, data_type in cur.fetchall()}
+
+    indexes = [(name, non_unique, columns.upper().split(',')) for name, non_unique, columns in indexes]
+    key = [column.upper() for column in key_columns]
+
+    indexed = list(dict.fromkeys(key_columns + ([watermark] if watermark else [])))
+    changes = [f'MODIFY {column} VARCHAR(255)' for column in indexed if types.get(column.upper()) in TEXT_TYPES]
+    has_key = any(not non_unique and columns == key for _, non_unique, columns in indexes)
+    if not has_key:
+        has_primary_key = any(name == 'PRIMARY' for name, _, _ in indexes)
+        changes.append(f'ADD {"UNIQUE INDEX merge_key" if has_primary_key else "PRIMARY KEY"} ({", ".join(key_columns)})')
+    if watermark and watermark.upper() != key[0] and not any(columns[0] == watermark.upper() for _, _, columns in indexes):
+        changes.append(f'ADD INDEX watermark ({watermark})')
+    if changes:
+        cur.execute(f'ALTER {"" if has_key else "IGNORE "}TABLE {table_name} ' + ', '.join(changes))
@@ -0,0 +1,149 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from pyspark import SparkContext
+
+from etl.config import METRICS_FILE
+#----------------------------------------------------------------------------------------------------------
+# Stage metrics - one JSON line per stage (replaces the "Started/Ended" lines of log()).
+#   with stage('Credit Loading') as metrics:      or      @timed('Credit Loading')
+#       ...                                                def load(...):
+# 1. Wall time in milliseconds, start/end timestamps, ok/failed (+ the error).
+# 2. Spark jobs + stages the block ran (its own job group) - rows + bytes read/written come from their
+#    task metrics (Spark UI REST api), so no extra count() is run. metrics['rows_out'] = ... overrides them.
+#    Work done without Spark (pandas engine) adds its rows with add_rows() - 0 if a stage read + wrote nothing.
+# 3. Stages can be nested (Credit ETL Job > Credit Loading) - the outer stage includes the inner stages' jobs.
+# python -m etl.report - latency per stage across runs (this format + the old cc_logfile.txt/loan_logfile.txt)
+#----------------------------------------------------------------------------------------------------------
+RUN_ID = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]     # one per process (notebook kernel / python -m etl)
+
+logger = logging.getLogger(__name__)
+
+_write_lock = threading.Lock()              # stages run in parallel threads - one line at a time
+_local = threading.local()                  # per thread - the stages currently open (innermost last)
+
+@contextmanager
+def stage(name, metrics_file=METRICS_FILE):
+    stack = _open_stages()
+    parent = stack[-1] if stack else None
+    metrics = {'run_id': RUN_ID,
+               'stage': name,
+               'parent': parent['metrics']['stage'] if parent else None,
+               'start': datetime.now().isoformat(timespec='milliseconds')}
+    frame = {'metrics': metrics, 'job_group': f'{RUN_ID}:{name}:{uuid.uuid4().hex[:8]}', 'job_ids': set()}
+    sc = SparkContext._active_spark_context
+    previous_group = _set_job_group(sc, frame['job_group'], name)
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield metrics
+        metrics['status'] = 'ok'
+    except BaseException as err:
+        metrics['status'] = 'failed'
+        metrics['error'] = f'{type(err).__name__}: {err}'
+        raise
+    finally:
+        metrics['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        metrics['end'] = datetime.now().isoformat(timespec='milliseconds')
+        stack.pop()
+        _set_job_group(sc, *previous_group)
+        if sc is not None:
+            frame['job_ids'].update(sc.statusTracker().getJobIdsForGroup(frame['job_group']))
+        if parent:
+            parent['job_ids'].update(frame['job_ids'])
+        _add_spark_metrics(sc, metrics, frame['job_ids'])
+        if sc is None:
+            metrics.setdefault('rows_in', 0)
+            metrics.setdefault('rows_out', 0)
+        write_metrics(metrics, metrics_file)
+
+# decorator - the whole function is one stage
+def timed(name, metrics_file=METRICS_FILE):
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name, metrics_file):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# rows read/written without Spark - added to every open stage (an outer stage includes its inner stages, like their jobs)
+def add_rows(rows_in=0, rows_out=0):
+    for frame in _open_stages():
+        metrics = frame['metrics']
+        metrics['rows_in'] = metrics.get('rows_in', 0) + rows_in
+        metrics['rows_out'] = metrics.get('rows_out', 0) + rows_out
+
+def write_metrics(metrics, metrics_file=METRICS_FILE):
+    line = json.dumps(metrics, default=str)
+    with _write_lock:
+        with open(metrics_file, 'a') as f:
+            f.write(line + '\n')
+#----------------------------------------------------------------------------------------------------------
+# helpers
+
+def _open_stages():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+# jobs started by this thread are tagged with the group - returns the previous (group, description)
+def _set_job_group(sc, group, description):
+    if sc is None:
+        return None, None
+    previous = sc.getLocalProperty('spark.jobGroup.id'), sc.getLocalProperty('spark.job.description')
+    sc.setLocalProperty('spark.jobGroup.id', group)
+    sc.setLocalProperty('spark.job.description', description)
+    return previous
+
+# Spark reports finished jobs asynchronously (listener bus) - wait a moment for their final metrics
+def _wait_for_jobs(tracker, job_ids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [tracker.getJobInfo(job_id) for job_id in job_ids]
+        if all(job is not None and job.status in ('SUCCEEDED', 'FAILED') for job in jobs):
+            return
+        time.sleep(0.05)
+
+# Spark job + stage ids, rows + bytes read/written (None if Spark or its UI is not running)
+def _add_spark_metrics(sc, metrics, job_ids):
+    if sc is None:
+        return
+    tracker = sc.statusTracker()
+    job_ids = sorted(job_ids)
+    _wait_for_jobs(tracker, job_ids)
+    stage_ids = sorted({stage_id for job_id in job_ids
+                        for stage_id in getattr(tracker.getJobInfo(job_id), 'stageIds', [])})
+    metrics['spark_jobs'] = job_ids
+    metrics['spark_stages'] = stage_ids
+
+    totals = {'rows_in': 'inputRecords', 'rows_out': 'outputRecords', 'bytes_read': 'inputBytes', 'bytes_written': 'outputBytes'}
+    if not sc.uiWebUrl:
+        return
+    sums = dict.fromkeys(totals, 0)
+    try:
+        for stage_id in stage_ids:
+            url = f'{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages/{stage_id}?details=false'
+            try:
+                with urlopen(url, timeout=10) as response:
+                    attempts = json.load(response)
+            except HTTPError as err:
+                if err.code == 404:                     # skipped stage (its output was cached/reused)
+                    continue
+                raise
+            for attempt in attempts:
+                for key, field in totals.items():
+                    sums[key] += attempt.get(field, 0)
+    except (OSError, ValueError) as err:
+        logger.warning('no Spark task metrics for %s: %s', metrics['stage'], err)
+        return
+    for key, value in sums.items():
+        metrics.setdefault(key, value)                 # values set inside the block win
@@ -0,0 +1,384 @@
+import json
+import os
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dateutil.tz import tzlocal
+
+import mysql.connector as mariadb
+
+from etl.config import HOST, JDBC_BATCHSIZE, PARQUET_DIR
+from etl.load import merge_staging
+from etl.metrics import add_rows
+from etl.parquet import LAYOUT, publish
+#----------------------------------------------------------------------------------------------------------
+# pandas/pyarrow engine - same steps + same output as the Spark engine (spark_engine.py), without a JVM.
+# Used for small inputs (see engine.py) - customer + branch files, small credit reloads.
+# 1. Records are read with the same schemas (etl/schemas.py) - a record that does not match is dropped,
+#    like valid_records() in PERMISSIVE mode.
+# 2. The transforms are vectorized column operations with Spark's semantics (initcap, concat_ws, casts).
+# 3. Parquet files + database tables get the same layout + column types as the Spark engine writes.
+#----------------------------------------------------------------------------------------------------------
+NAME = 'pandas'
+
+# Spark type -> pandas dtype (nullable integers, like Spark)
+DTYPES = {
+    'string': object,
+    'integer': 'Int32',
+    'double': 'float64',
+    'timestamp': 'datetime64[ns]'
+}
+
+# pandas dtype -> column type of the table Spark JDBC creates (so the staging table + target table match)
+SQL_TYPES = {
+    'object': 'TEXT',
+    'Int32': 'INTEGER',
+    'float64': 'DOUBLE PRECISION',
+    'datetime64[ns]': 'TIMESTAMP'
+}
+
+#----------------------------------------------------------------------------------------------------------
+# extract - json lines file -> records matching the schema
+def extract_json(file, schema):
+    types = {field.name: field.dataType.typeName() for field in schema.fields}
+    rows = []
+    with open(file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+                records = value if isinstance(value, list) else [value]     # an array holds one record per element
+                rows += [parse_record(record, types) for record in records]
+            except ValueError:                                              # not json / does not match the schema
+                continue
+    dataframe = pd.DataFrame(rows, columns=list(types))
+    add_rows(rows_in=len(dataframe))
+    return dataframe.astype({name: DTYPES[type_name] for name, type_name in types.items()})
+
+def parse_record(record, types):
+    if not isinstance(record, dict):
+        raise ValueError(record)
+    return [parse_value(record.get(name), type_name) for name, type_name in types.items()]
+
+# one json value -> the value Spark reads for that type
+def parse_value(value, type_name):
+    if value is None:
+        return None
+    if type_name == 'string':
+        return value if isinstance(value, str) else json.dumps(value, separators=(',', ':'))   # raw text of a number, ...
+    if type_name == 'integer':
+        if type(value) is not int or not -2 ** 31 <= value < 2 ** 31:
+            raise ValueError(value)
+        return value
+    if type_name == 'double':
+        if type(value) not in (int, float):
+            raise ValueError(value)
+        return float(value)
+    if type_name == 'timestamp':
+        try:
+            timestamp = datetime.fromisoformat(value)
+        except TypeError:
+            raise ValueError(value)
+        if timestamp.tzinfo is not None:                                    # with an offset -> local time, like Spark
+            timestamp = timestamp.astimezone(tzlocal()).replace(tzinfo=None)
+        return timestamp
+    raise ValueError(type_name)
+
+# keep only the records after the high-water mark (every record on the first run, or when watermark = None)
+def new_records(dataframe, column, watermark):
+    if watermark is None:
+        return dataframe
+    return dataframe[(column > watermark).fillna(False)]
+
+def is_empty(dataframe):
+    return dataframe.empty
+#----------------------------------------------------------------------------------------------------------
+# Spark functions used by the transforms (null in -> null out, unless Spark skips nulls)
+
+# initcap - lower case, then upper case for the first letter + every letter after a space
+def initcap(column):
+    return to_object(column.str.lower().str.replace(r'(?:^| )\S', lambda match: match.group(0).upper(), regex=True))
+
+# concat_ws - null values are skipped (all null -> empty string)
+def concat_ws(separator, *columns):
+    result = None
+    for column in columns:
+        column = column.astype('string')
+        result = column if result is None else (result + separator + column).fillna(result).fillna(column)
+    return to_object(result.fillna(''))
+
+# concat of the phone number parts - null if the phone number is null
+def phone_number(column):
+    column = column.astype('string')
+    return to_object('(781)' + column.str[0:3] + '-' + column.str[2:6])
+
+# cast string -> int (decimals are truncated, anything else is null)
+def to_int(column):
+    numbers = pd.to_numeric(column.astype('string').str.strip(), errors='coerce')
+    numbers = np.trunc(numbers).where((numbers >= -2 ** 31) & (numbers < 2 ** 31))
+    return numbers.astype('Int32')
+
+def to_object(column):
+    return column.astype(object).where(column.notna(), None)
+#----------------------------------------------------------------------------------------------------------
+# transform customer data
+def transform_customer(dataframe):
+    dataframe = dataframe.copy()
+    # name transformation
+    dataframe['FIRST_NAME'] = initcap(dataframe['FIRST_NAME'])                                               # convert to title case
+    dataframe['MIDDLE_NAME'] = to_object(dataframe['MIDDLE_NAME'].str.lower())                               # convert to lower case
+    dataframe['LAST_NAME'] = initcap(dataframe['LAST_NAME'])                                                 # convert to title case
+
+    # address transformation
+    dataframe['FULL_STREET_ADDRESS'] = concat_ws(', ', dataframe['STREET_NAME'], dataframe['APT_NO'])        # concat street name + apt no
+
+    # phone number transformation
+    dataframe['CUST_PHONE'] = phone_number(dataframe['CUST_PHONE'])                                          # change format of phone number
+
+    # convert data types
+    dataframe['CUST_ZIP'] = to_int(dataframe['CUST_ZIP'])
+
+    # rearrange columns
+    return dataframe[['SSN',
+                      'FIRST_NAME',
+                      'MIDDLE_NAME',
+                      'LAST_NAME',
+                      'CREDIT_CARD_NO',
+                      'FULL_STREET_ADDRESS',
+                      'CUST_CITY',
+                      'CUST_STATE',
+                      'CUST_COUNTRY',
+                      'CUST_ZIP',
+                      'CUST_PHONE',
+                      'CUST_EMAIL',
+                      'LAST_UPDATED']].reset_index(drop=True)
+
+# transform branch data
+def transform_branch(dataframe):
+    dataframe = dataframe.copy()
+    # zip code transformation
+    dataframe['BRANCH_ZIP'] = dataframe['BRANCH_ZIP'].fillna(999999)                                        # replace null values
+
+    # phone number transformation
+    dataframe['BRANCH_PHONE'] = phone_number(dataframe['BRANCH_PHONE'])                                      # change format of phone number
+
+    # rearrange columns
+    return dataframe[['BRANCH_CODE',
+                      'BRANCH_NAME',
+                      'BRANCH_STREET',
+                      'BRANCH_CITY',
+                      'BRANCH_STATE',
+                      'BRANCH_ZIP',
+                      'BRANCH_PHONE',
+                      'LAST_UPDATED']].reset_index(drop=True)
+
+# transform credit data
+def transform_credit(dataframe):
+    dataframe = dataframe.copy()
+    # date transformation - 'YYYY-M-D' cast to a date (a missing day/month -> 1st, an invalid date -> null), then YYYYMMDD
+    parts = concat_ws('-', dataframe['YEAR'], dataframe['MONTH'], dataframe['DAY']) \
+                .astype(str).str.extract(r'^(\d{4,7})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+    dates = pd.to_datetime(pd.DataFrame({'year': pd.to_numeric(parts[0]),
+                                         'month': pd.to_numeric(parts[1]).fillna(1),
+                                         'day': pd.to_numeric(parts[2]).fillna(1)}), errors='coerce')
+    dataframe['TIMEID'] = to_object(dates.dt.strftime('%Y%m%d'))
+
+    # rename column
+    dataframe = dataframe.rename(columns={'CREDIT_CARD_NO': 'CUST_CC_NO'})
+
+    # rearrange columns
+    return dataframe[['CUST_CC_NO',
+                      'TIMEID',
+                      'CUST_SSN',
+                      'BRANCH_CODE',
+                      'TRANSACTION_TYPE',
+                      'TRANSACTION_VALUE',
+                      'TRANSACTION_ID']].reset_index(drop=True)
+
+# round - half up, on the shortest decimal text of the value (like Spark's round of a double: 2.675 -> 2.68)
+def round_half_up(column, scale):
+    exponent = Decimal(1).scaleb(-scale)
+    return column.map(lambda value: value if pd.isna(value) else
+                                    float(Decimal(repr(value)).quantize(exponent, rounding=ROUND_HALF_UP))).astype('float64')
+
+# transform monthly statement data - one row per credit card, year and month (same rows as transform.py)
+def transform_monthly_statement(credit_df, customer_df, branch_df):
+    # year + month of each transaction (TIMEID = YYYYMMDD)
+    credit_df = with_partition_columns(credit_df)
+    keys = ['CUST_CC_NO', 'YEAR', 'MONTH']
+
+    # totals per credit card, year and month
+    statement_df = credit_df.groupby(keys) \
+                            .agg(TRANSACTION_COUNT=('TRANSACTION_ID', 'count'),
+                                 NEW_BALANCE=('TRANSACTION_VALUE', 'sum')) \
+                            .reset_index()
+    statement_df['NEW_BALANCE'] = round_half_up(statement_df['NEW_BALANCE'], 2)
+
+    # customer + branch of the latest transaction in the month (printed on the bill) - nulls last, like desc() in Spark
+    latest_df = credit_df.sort_values(['TIMEID', 'TRANSACTION_ID'], ascending=False, na_position='last') \
+                         .drop_duplicates(keys)[keys + ['CUST_SSN', 'BRANCH_CODE']]
+    statement_df = statement_df.merge(latest_df, on=keys)
+
+    # customer address + branch address
+    customer_df = customer_df[['SSN',
+                               'FIRST_NAME',
+                               'LAST_NAME',
+                               'FULL_STREET_ADDRESS',
+                               'CUST_CITY',
+                               'CUST_STATE',
+                               'CUST_ZIP']].rename(columns={'SSN': 'CUST_SSN'})
+    branch_df = branch_df[['BRANCH_CODE',
+                           'BRANCH_NAME',
+                           'BRANCH_STREET',
+                           'BRANCH_CITY',
+                           'BRANCH_STATE',
+                           'BRANCH_ZIP']]
+    statement_df = statement_df.dropna(subset=['CUST_SSN']).merge(customer_df, on='CUST_SSN')       # null keys never join
+    statement_df = statement_df.merge(branch_df.dropna(subset=['BRANCH_CODE']), on='BRANCH_CODE', how='left')
+
+    # bill values - rewards at 2%, credit limit of $10,000, payment due on the 1st of the next month
+    statement_df['TRANSACTION_COUNT'] = statement_df['TRANSACTION_COUNT'].astype('Int32')
+    statement_df['REWARDS'] = round_half_up(statement_df['NEW_BALANCE'] * 0.02, 2)
+    statement_df['CREDIT_LIMIT'] = pd.array([10000] * len(statement_df), dtype='Int32')
+    statement_df['AVAILABLE_CREDIT'] = round_half_up(10000 - statement_df['NEW_BALANCE'], 2)
+    statement_df['STATEMENT_DATE'] = pd.to_datetime(pd.DataFrame({'year': statement_df['YEAR'],
+                                                                  'month': statement_df['MONTH'],
+                                                                  'day': 1}), errors='coerce')
+    statement_df['DUE_DATE'] = statement_df['STATEMENT_DATE'] + pd.DateOffset(months=1)
+
+    # rename column
+    statement_df = statement_df.rename(columns={'CUST_CC_NO': 'CREDIT_CARD_NO'})
+
+    # rearrange columns
+    return statement_df[['CREDIT_CARD_NO',
+                         'YEAR',
+                         'MONTH',
+                         'CUST_SSN',
+                         'FIRST_NAME',
+                         'LAST_NAME',
+                         'FULL_STREET_ADDRESS',
+                         'CUST_CITY',
+                         'CUST_STATE',
+                         'CUST_ZIP',
+                         'BRANCH_CODE',
+                         'BRANCH_NAME',
+                         'BRANCH_STREET',
+                         'BRANCH_CITY',
+                         'BRANCH_STATE',
+                         'BRANCH_ZIP',
+                         'TRANSACTION_COUNT',
+                         'NEW_BALANCE',
+                         'REWARDS',
+                         'CREDIT_LIMIT',
+                         'AVAILABLE_CREDIT',
+                         'STATEMENT_DATE',
+                         'DUE_DATE']].reset_index(drop=True)
+#----------------------------------------------------------------------------------------------------------
+# staging layer - same folders + manifest as etl/parquet.py (Spark engine)
+
+# timestamps are stored like Spark stores them (INT96, UTC) - and read back as local time
+def to_arrow(dataframe):
+    dataframe = dataframe.copy()
+    for column in dataframe.columns:
+        if pd.api.types.is_datetime64_any_dtype(dataframe[column]):
+            dataframe[column] = dataframe[column].dt.tz_localize(tzlocal(), ambiguous=False, nonexistent='shift_forward') \
+                                                 .dt.tz_convert('UTC').dt.tz_localize(None)
+    # no pandas metadata (nullable dtypes, ...) - like the files Spark writes, readable by every reader
+    return pa.Table.from_pandas(dataframe, preserve_index=False).replace_schema_metadata(None)
+
+def from_arrow(table):
+    dataframe = table.to_pandas()
+    for column in dataframe.columns:
+        if pd.api.types.is_datetime64_any_dtype(dataframe[column]):
+            dataframe[column] = dataframe[column].dt.tz_localize('UTC').dt.tz_convert(tzlocal()).dt.tz_localize(None)
+    return dataframe
+
+def with_partition_columns(credit_df):
+    credit_df = credit_df.copy()
+    credit_df['YEAR'] = to_int(credit_df['TIMEID'].str[0:4])
+    credit_df['MONTH'] = to_int(credit_df['TIMEID'].str[4:6])
+    return credit_df
+
+def stage_to_parquet(dataframe, name, incremental=True):
+    keys = LAYOUT[name]['keys']
+    partition_by = LAYOUT[name]['partition_by']
+    path = os.path.join(PARQUET_DIR, name)
+    staged_path = f'{path}.staging'
+
+    if partition_by:
+        dataframe = with_partition_columns(dataframe)
+    replace_all = not incremental or not partition_by or not os.path.exists(path)
+
+    if incremental and os.path.exists(path):
+        if dataframe.empty:                                     # nothing new since the last run
+            return
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        touched = None
+        if partition_by:
+            # only the partitions with new rows are read + rewritten
+            for values in dataframe[partition_by].drop_duplicates().itertuples(index=False):
+                partition = None
+                for column, value in zip(partition_by, values):
+                    partition = ds.field(column) == value if partition is None else partition & (ds.field(column) == value)
+                touched = partition if touched is None else touched | partition
+        previous_df = from_arrow(dataset.to_table(filter=touched))
+        for column in partition_by:
+            previous_df[column] = previous_df[column].astype('Int32')
+        # previous rows, minus the ones replaced by a new version + the new rows
+        replaced = previous_df.set_index(keys).index.isin(dataframe.set_index(keys).index)
+        dataframe = pd.concat([previous_df.loc[~replaced, dataframe.columns], dataframe], ignore_index=True)
+        add_rows(rows_in=len(previous_df))
+
+    add_rows(rows_out=len(dataframe))
+    pq.write_to_dataset(to_arrow(dataframe), staged_path, partition_cols=partition_by or None,
+                        use_deprecated_int96_timestamps=True, existing_data_behavior='delete_matching')
+    publish(name, staged_path, replace_all)
+
+# staged table (or the rows matching a filter) -> dataframe with the dtypes of the transforms (nullable integers)
+def read_staged(name, filter=None):
+    dataset = ds.dataset(os.path.join(PARQUET_DIR, name), format='parquet', partitioning='hive')
+    dataframe = from_arrow(dataset.to_table(filter=filter))
+    add_rows(rows_in=len(dataframe))
+    return dataframe.astype({field.name: 'Int32' for field in dataset.schema if pa.types.is_int32(field.type)})
+
+# credit card transactions in the same card + month as the new transactions (the statements that need a refresh)
+# read from the staging layer - the credit stage staged the new rows already, only the touched partitions are opened
+def touched_months(new_credit_df):
+    keys = ['CUST_CC_NO', 'YEAR', 'MONTH']
+    months_df = with_partition_columns(new_credit_df)[keys].dropna().drop_duplicates()
+    touched = None
+    for year, month in months_df[['YEAR', 'MONTH']].drop_duplicates().itertuples(index=False):
+        partition = (ds.field('YEAR') == year) & (ds.field('MONTH') == month)
+        touched = partition if touched is None else touched | partition
+    credit_df = read_staged('credit', touched)
+    return credit_df.merge(months_df, on=keys)[list(new_credit_df.columns)]
+#----------------------------------------------------------------------------------------------------------
+# upsert data to MariaDB by primary key - batched INSERTs into the staging table, then the same merge as the Spark engine
+def upsert_to_db(dataframe, db_name, table_name, key_columns, user, password, watermark=None):
+    if dataframe.empty:                                         # nothing new since the last run
+        return
+
+    staging_table = f'{table_name}_STAGING'
+    columns = ', '.join(f'{column} {SQL_TYPES[str(dtype)]}' for column, dtype in dataframe.dtypes.items())
+    insert = f'INSERT INTO {staging_table} ({", ".join(dataframe.columns)}) VALUES ({", ".join(["%s"] * len(dataframe.columns))})'
+    rows = [tuple(None if pd.isna(value) else value for value in row)
+            for row in to_object(dataframe).itertuples(index=False, name=None)]
+
+    con = mariadb.connect(host=HOST, user=user, password=password, database=db_name)
+    cur = con.cursor()
+    try:
+        cur.execute(f'DROP TABLE IF EXISTS {staging_table}')
+        cur.execute(f'CREATE TABLE {staging_table} ({columns})')
+        for start in range(0, len(rows), JDBC_BATCHSIZE):
+            cur.executemany(insert, rows[start:start + JDBC_BATCHSIZE])                  # multi-row INSERTs
+        con.commit()
+    finally:
+        con.close()
+    add_rows(rows_out=len(rows))
+    merge_staging(db_name, table_name, staging_table, dataframe.columns, key_columns, user, password, watermark)
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from functools import reduce
+from glob import glob
+
+import pyarrow.parquet as pq
+from pyspark.sql.functions import col, substring
+
+from etl.config import PARQUET_DIR
+from etl.session import spark
+#----------------------------------------------------------------------------------------------------------
+# Parquet staging layer - the transformed tables as columnar files, between transform and load.
+# 1. Credit is partitioned by YEAR + MONTH (of TIMEID) - readers filtering on them only open those folders.
+# 2. Incremental runs only rewrite what changed: the touched YEAR/MONTH partitions of credit, the (small)
+#    customer + branch tables. Rows are replaced by primary key, so a re-run never duplicates them.
+# 3. manifest.json lists the files + row counts of every table (read by the dashboard + the notebooks).
+#----------------------------------------------------------------------------------------------------------
+MANIFEST = os.path.join(PARQUET_DIR, 'manifest.json')
+
+# table -> primary key + partition columns
+LAYOUT = {
+    'customer': {'keys': ['SSN'], 'partition_by': []},
+    'branch': {'keys': ['BRANCH_CODE'], 'partition_by': []},
+    'credit': {'keys': ['TRANSACTION_ID'], 'partition_by': ['YEAR', 'MONTH']}
+}
+
+_manifest_lock = threading.Lock()                   # pipelines run in parallel - one manifest update at a time
+
+# YEAR + MONTH partition columns of the credit table (TIMEID = YYYYMMDD)
+def with_partition_columns(credit_df):
+    credit_df = credit_df.withColumn('YEAR', substring(credit_df['TIMEID'], 1, 4).cast('int'))
+    return credit_df.withColumn('MONTH', substring(credit_df['TIMEID'], 5, 2).cast('int'))
+
+# write a transformed table (or the new/changed rows of it) to the staging layer
+def stage_to_parquet(dataframe, name, incremental=True):
+    keys = LAYOUT[name]['keys']
+    partition_by = LAYOUT[name]['partition_by']
+    path = os.path.join(PARQUET_DIR, name)
+    staged_path = f'{path}.staging'
+
+    if partition_by:
+        dataframe = with_partition_columns(dataframe)
+    replace_all = not incremental or not partition_by or not os.path.exists(path)
+
+    if incremental and os.path.exists(path):
+        if not dataframe.head(1):                   # nothing new since the last run
+            return
+        previous_df = spark().read.parquet(path)
+        if partition_by:
+            # only the partitions with new rows are read + rewritten
+            touched = dataframe.select(partition_by).distinct().collect()
+            previous_df = previous_df.filter(reduce(lambda a, b: a | b,
+                                                    [reduce(lambda a, b: a & b, [col(column) == row[column] for column in partition_by])
+                                                     for row in touched]))
+        # previous rows, minus the ones replaced by a new version + the new rows
+        dataframe = previous_df.join(dataframe.select(keys), keys, 'left_anti').unionByName(dataframe)
+
+    dataframe.write.mode('overwrite').partitionBy(*partition_by).parquet(staged_path)
+    publish(name, staged_path, replace_all)
+
+# swap the newly written table (or only its partitions) in, then update the manifest
+def publish(name, staged_path, replace_all):
+    path = os.path.join(PARQUET_DIR, name)
+    partition_by = LAYOUT[name]['partition_by']
+    if replace_all:
+        swap_folder(staged_path, path)
+    else:
+        for folder in glob(os.path.join(staged_path, *['*=*'] * len(partition_by))):
+            swap_folder(folder, os.path.join(path, os.path.relpath(folder, staged_path)))
+        shutil.rmtree(staged_path)
+    update_manifest(name)
+
+# replace a folder with a newly written one (the old files stay readable until the last moment)
+def swap_folder(new_folder, folder):
+    old_folder = f'{folder}.old'
+    shutil.rmtree(old_folder, ignore_errors=True)
+    os.makedirs(os.path.dirname(folder), exist_ok=True)
+    if os.path.exists(folder):
+        os.rename(folder, old_folder)
+    os.rename(new_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+#----------------------------------------------------------------------------------------------------------
+# manifest - table -> partition columns, total rows, every file + its row count
+def read_manifest():
+    if not os.path.exists(MANIFEST):
+        return {}
+    with open(MANIFEST) as f:
+        return json.load(f)
+
+def update_manifest(name):
+    path = os.path.join(PARQUET_DIR, name)
+    # row counts come from the parquet footers - no column is read (and no Spark job is needed)
+    files = sorted((os.path.relpath(file, path), pq.ParquetFile(file).metadata.num_rows)
+                   for file in glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+
+    with _manifest_lock:
+        manifest = read_manifest()
+        manifest[name] = {'path': name,
+                          'partition_by': LAYOUT[name]['partition_by'],
+                          'rows': sum(rows for _, rows in files),
+                          'files': [{'file': file, 'rows': rows} for file, rows in files],
+                          'updated': datetime.now().isoformat(timespec='seconds')}
+        with open(f'{MANIFEST}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(f'{MANIFEST}.tmp', MANIFEST)                 # readers never see a half-written manifest
+#----------------------------------------------------------------------------------------------------------
+# read a staged table - only the columns selected + the partitions matching `where` are read
+# e.g. read_parquet('credit', ['TIMEID', 'TRANSACTION_VALUE'], 'YEAR = 2018 AND MONTH = 5')
+def read_parquet(name, columns=None, where=None):
+    dataframe = spark().read.parquet(os.path.join(PARQUET_DIR, name))
+    if where is not None:
+        dataframe = dataframe.filter(where)
+    if columns is not None:
+        dataframe = dataframe.select(columns)
+    return dataframe
@@ -0,0 +1,133 @@
+import os
+
+from etl.config import USER, PASSWORD, DATABASE, CDW_FILES, LOAN_URL
+from etl.extract import extract_db, extract_download, valid_records
+from etl.download import download, mark_loaded
+from etl import pandas_engine
+from etl.engine import choose_engine, engine_of
+from etl.transform import transform_monthly_statement, touched_months
+from etl.load import create_statement_table, get_watermark, new_records, upsert_to_db
+from etl.schemas import SCHEMAS
+from etl.spark_engine import to_spark
+from etl.metrics import stage
+#----------------------------------------------------------------------------------------------------------
+# ETL pipelines - same steps as the notebook cells, one function per pipeline.
+# Every pipeline is an upsert by primary key, so a failed pipeline can simply be run again (see runner.py).
+# Each pipeline gets the results of the stages it depends on (name -> result) and returns its own result.
+# The customer, branch + credit pipelines run on pandas or Spark depending on the size of their file (etl/engine.py),
+# the monthly statement refresh on the engine of the credit pipeline.
+#----------------------------------------------------------------------------------------------------------
+# Customer ETL Pipeline (incremental - only customers updated since the last run)
+def customer_pipeline(inputs, incremental=True):
+    with stage('Customer ETL Job') as job_metrics:
+        file = os.path.join(CDW_FILES, 'cdw_sapp_custmer.json')
+        engine = choose_engine(file)
+        job_metrics['engine'] = engine.NAME
+        #-----------------------------------------------------------
+        with stage('Customer Extraction'):
+            customer_watermark = get_watermark(DATABASE, 'CDW_SAPP_CUSTOMER', 'LAST_UPDATED', USER, PASSWORD) if incremental else None
+            customer_df = engine.extract_json(file, SCHEMAS['customer'])
+            customer_df = engine.new_records(customer_df, customer_df['LAST_UPDATED'], customer_watermark)
+        #-----------------------------------------------------------
+        with stage('Customer Transformation'):
+            transformed_customer_df = engine.transform_customer(customer_df)
+        #-----------------------------------------------------------
+        with stage('Customer Staging'):
+            engine.stage_to_parquet(transformed_customer_df, 'customer', incremental)
+        #-----------------------------------------------------------
+        with stage('Customer Loading'):
+            engine.upsert_to_db(transformed_customer_df, DATABASE, 'CDW_SAPP_CUSTOMER', ['SSN'], USER, PASSWORD, watermark='LAST_UPDATED')
+    return transformed_customer_df
+
+# Branch ETL Pipeline (incremental - only branches updated since the last run)
+def branch_pipeline(inputs, incremental=True):
+    with stage('Branch ETL Job') as job_metrics:
+        file = os.path.join(CDW_FILES, 'cdw_sapp_branch.json')
+        engine = choose_engine(file)
+        job_metrics['engine'] = engine.NAME
+        #-----------------------------------------------------------
+        with stage('Branch Extraction'):
+            branch_watermark = get_watermark(DATABASE, 'CDW_SAPP_BRANCH', 'LAST_UPDATED', USER, PASSWORD) if incremental else None
+            branch_df = engine.extract_json(file, SCHEMAS['branch'])
+            branch_df = engine.new_records(branch_df, branch_df['LAST_UPDATED'], branch_watermark)
+        #-----------------------------------------------------------
+        with stage('Branch Transformation'):
+            transformed_branch_df = engine.transform_branch(branch_df)
+        #-----------------------------------------------------------
+        with stage('Branch Staging'):
+            engine.stage_to_parquet(transformed_branch_df, 'branch', incremental)
+        #-----------------------------------------------------------
+        with stage('Branch Loading'):
+            engine.upsert_to_db(transformed_branch_df, DATABASE, 'CDW_SAPP_BRANCH', ['BRANCH_CODE'], USER, PASSWORD, watermark='LAST_UPDATED')
+    return transformed_branch_df
+
+# Credit ETL Pipeline (incremental - only new transactions since the last run)
+def credit_pipeline(inputs, incremental=True):
+    with stage('Credit ETL Job') as job_metrics:
+        file = os.path.join(CDW_FILES, 'cdw_sapp_credit.json')
+        engine = choose_engine(file)
+        job_metrics['engine'] = engine.NAME
+        #-----------------------------------------------------------
+        with stage('Credit Extraction'):
+            credit_watermark = get_watermark(DATABASE, 'CDW_SAPP_CREDIT_CARD', 'TRANSACTION_ID', USER, PASSWORD) if incremental else None
+            credit_df = engine.extract_json(file, SCHEMAS['credit'])
+            credit_df = engine.new_records(credit_df, credit_df['TRANSACTION_ID'], credit_watermark)
+        #-----------------------------------------------------------
+        with stage('Credit Transformation'):
+            transformed_credit_df = engine.transform_credit(credit_df)
+        #-----------------------------------------------------------
+        with stage('Credit Staging'):
+            engine.stage_to_parquet(transformed_credit_df, 'credit', incremental)
+        #-----------------------------------------------------------
+        with stage('Credit Loading'):
+            engine.upsert_to_db(transformed_credit_df, DATABASE, 'CDW_SAPP_CREDIT_CARD', ['TRANSACTION_ID'], USER, PASSWORD, watermark='TRANSACTION_ID')
+    return transformed_credit_df
+
+# Monthly Statement - denormalized fact table (card + month, with customer + branch details)
+# built after the customer, branch and credit loads, for the card + month of every new transaction
+# (on the engine of the credit stage - pandas reads the staged Parquet files, so a small reload never starts Spark)
+def statement_pipeline(inputs, incremental=True):
+    with stage('Monthly Statement Refresh') as metrics:
+        new_credit_df = inputs['credit']
+        engine = engine_of(new_credit_df)
+        metrics['engine'] = engine.NAME
+        if not engine.is_empty(new_credit_df):
+            if engine is pandas_engine:
+                statement_df = pandas_engine.transform_monthly_statement(pandas_engine.touched_months(new_credit_df),
+                                                                         pandas_engine.read_staged('customer'),
+                                                                         pandas_engine.read_staged('branch'))
+            else:
+                statement_df = transform_monthly_statement(touched_months(extract_db(DATABASE, 'CDW_SAPP_CREDIT_CARD', USER, PASSWORD),
+                                                                          to_spark(new_credit_df)),
+                                                           extract_db(DATABASE, 'CDW_SAPP_CUSTOMER', USER, PASSWORD),
+                                                           extract_db(DATABASE, 'CDW_SAPP_BRANCH', USER, PASSWORD))
+            create_statement_table(DATABASE, USER, PASSWORD)
+            engine.upsert_to_db(statement_df, DATABASE, 'CDW_SAPP_MONTHLY_STATEMENT', ['CREDIT_CARD_NO', 'YEAR', 'MONTH'], USER, PASSWORD)
+
+# Loan ELT Pipeline (incremental - only new loan applications since the last run)
+# the api is only downloaded again if it changed (ETag / Last-Modified) - nothing to do if its content was loaded already
+def loan_pipeline(inputs, incremental=True):
+    with stage('Loan ELT Job') as job_metrics:
+        #-----------------------------------------------------------
+        with stage('Loan Extraction') as metrics:
+            loan_download = download(LOAN_URL)
+            metrics.update(sha256=loan_download['sha256'], not_modified=loan_download['not_modified'])
+            if incremental and loan_download['loaded']:
+                job_metrics['skipped'] = 'source unchanged'
+                return
+            loan_watermark = get_watermark(DATABASE, 'CDW_SAPP_LOAN_APPLICATION', 'Application_ID', USER, PASSWORD) if incremental else None
+            loan_df = valid_records(extract_download(loan_download, SCHEMAS['loan']))
+            loan_df = new_records(loan_df, loan_df['Application_ID'], loan_watermark)
+        #-----------------------------------------------------------
+        with stage('Loan Loading'):
+            upsert_to_db(loan_df, DATABASE, 'CDW_SAPP_LOAN_APPLICATION', ['Application_ID'], USER, PASSWORD, watermark='Application_ID')
+            mark_loaded(LOAN_URL, loan_download['sha256'])
+#----------------------------------------------------------------------------------------------------------
+# stage name -> (pipeline, stages that must finish first)
+STAGES = {
+    'customer': (customer_pipeline, []),
+    'branch': (branch_pipeline, []),
+    'credit': (credit_pipeline, []),
+    'loan': (loan_pipeline, []),
+    'monthly_statement': (statement_pipeline, ['customer', 'branch', 'credit'])
+}
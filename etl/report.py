@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from etl.config import CC_LOGFILE, LOAN_LOGFILE, METRICS_FILE
+#----------------------------------------------------------------------------------------------------------
+# Latency report - per stage, across runs:
+#   python -m etl.report                                    etl_metrics.jsonl + cc_logfile.txt + loan_logfile.txt
+#   python -m etl.report --stage 'Credit Loading'           every run of one stage
+#   python -m etl.report old_logfile.txt metrics.jsonl      other files (format detected per line)
+# 1. JSON lines (etl/metrics.py) - millisecond wall time, rows + bytes.
+# 2. Old log files ('2023-Feb-17-20:25:46,Credit Loading Started') - "Started/Ended" pairs, second resolution.
+#    A run starts again when a stage of the current run starts a second time.
+#----------------------------------------------------------------------------------------------------------
+LOG_TIMESTAMP_FORMAT = '%Y-%b-%d-%H:%M:%S'         # log() format: Year-Month_name-Day-Hour-Minute-Second
+
+# one record per stage + run: {'run_id', 'stage', 'start', 'duration_ms', ...}
+def read_records(files):
+    records = []
+    for file in files:
+        if not os.path.exists(file):
+            continue
+        with open(file) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        records += [json.loads(line) for line in lines if line.startswith('{')]
+        records += parse_log_lines([line for line in lines if not line.startswith('{')], os.path.basename(file))
+    return records
+
+def parse_log_lines(lines, source):
+    records = []
+    started = {}                                    # stage -> start time (current run)
+    seen = set()                                    # stages of the current run
+    run_id = None
+    for line in lines:
+        timestamp, _, message = line.partition(',')
+        stage, _, event = message.rpartition(' ')
+        try:
+            time = datetime.strptime(timestamp, LOG_TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+        if event == 'Started':
+            if run_id is None or stage in seen:
+                run_id = f'{source}:{time:%Y%m%d-%H%M%S}'
+                seen = set()
+            seen.add(stage)
+            started[stage] = time
+        elif event == 'Ended' and stage in started:
+            start = started.pop(stage)
+            records.append({'run_id': run_id,
+                            'stage': stage,
+                            'start': start.isoformat(),
+                            'duration_ms': (time - start).total_seconds() * 1000,
+                            'status': 'ok'})
+    return records
+#----------------------------------------------------------------------------------------------------------
+# stage -> runs (oldest first)
+def by_stage(records):
+    stages = defaultdict(list)
+    for record in sorted(records, key=lambda record: record['start']):
+        if record.get('status', 'ok') == 'ok':
+            stages[record['stage']].append(record)
+    return stages
+
+def print_summary(stages):
+    print(f'{"stage":<32}{"runs":>6}{"min ms":>12}{"median ms":>12}{"max ms":>12}{"last ms":>12}{"last/median":>13}')
+    for stage, runs in stages.items():
+        durations = [run['duration_ms'] for run in runs]
+        median = statistics.median(durations)
+        trend = f'{durations[-1] / median:.2f}x' if median else '-'
+        print(f'{stage:<32}{len(runs):>6}{min(durations):>12.0f}{median:>12.0f}{max(durations):>12.0f}{durations[-1]:>12.0f}{trend:>13}')
+
+def print_runs(stage, runs):
+    print(f'{stage}')
+    print(f'{"run":<40}{"start":<25}{"ms":>12}{"rows in":>12}{"rows out":>12}{"bytes read":>14}{"bytes written":>15}')
+    for run in runs:
+        values = [run.get(key) for key in ('rows_in', 'rows_out', 'bytes_read', 'bytes_written')]
+        values = ['' if value is None else value for value in values]
+        print(f'{run["run_id"]:<40}{run["start"]:<25}{run["duration_ms"]:>12.0f}'
+              f'{values[0]:>12}{values[1]:>12}{values[2]:>14}{values[3]:>15}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m etl.report', description='Latency of every ETL stage across runs.')
+    parser.add_argument('files', nargs='*', default=[METRICS_FILE, CC_LOGFILE, LOAN_LOGFILE],
+                        help='metrics (JSON lines) and/or old log files (default: etl_metrics.jsonl, cc_logfile.txt, loan_logfile.txt)')
+    parser.add_argument('--stage', help='show every run of one stage')
+    args = parser.parse_args(argv)
+
+    stages = by_stage(read_records(args.files))
+    if args.stage:
+        if args.stage not in stages:
+            print(f'no runs of {args.stage!r}')
+            return 1
+        print_runs(args.stage, stages[args.stage])
+    else:
+        print_summary(stages)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from etl.session import use_pool
+#----------------------------------------------------------------------------------------------------------
+# DAG runner - runs every stage as soon as the stages it depends on have finished.
+# 1. Independent stages run at the same time (one thread each) on the shared SparkSession,
+#    each in its own FAIR scheduler pool - total time is close to the slowest pipeline, not the sum.
+# 2. A failed stage is retried (pipelines are upserts, so running one again is safe).
+# 3. Stages that depend on a failed stage are skipped - the rest of the DAG still runs.
+#----------------------------------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+
+# stage names + every stage they depend on (in the order they were listed)
+def with_dependencies(stages, names):
+    selected = []
+    def add(name):
+        if name in selected:
+            return
+        for dependency in stages[name][1]:
+            add(dependency)
+        selected.append(name)
+    for name in names:
+        add(name)
+    return selected
+
+# run one stage in its own scheduler pool, retrying up to `retries` times
+def run_stage(name, pipeline, inputs, incremental, retries, retry_delay):
+    use_pool(name)                                                          # per thread
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            result = pipeline(inputs, incremental=incremental)
+            logger.info('%s finished in %.1f s', name, time.perf_counter() - start)
+            return result
+        except Exception:
+            if attempt == retries:
+                raise
+            logger.exception('%s failed (attempt %d of %d) - retrying in %d s', name, attempt + 1, retries + 1, retry_delay)
+            time.sleep(retry_delay * (attempt + 1))
+
+# run the stages (+ their dependencies) - returns stage name -> 'done' / 'failed' / 'skipped'
+def run(stages, names=None, incremental=True, retries=2, retry_delay=30, max_workers=None):
+    names = with_dependencies(stages, names or list(stages))
+    status = {}
+    results = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(names)) as executor:
+        while len(status) < len(names):
+            for name in names:
+                if name in status or name in running:
+                    continue
+                dependencies = stages[name][1]
+                if any(status.get(dependency) in ('failed', 'skipped') for dependency in dependencies):
+                    status[name] = 'skipped'
+                    logger.error('%s skipped - a stage it depends on did not finish', name)
+                elif all(status.get(dependency) == 'done' for dependency in dependencies):
+                    inputs = {dependency: results[dependency] for dependency in dependencies}
+                    running[name] = executor.submit(run_stage, name, stages[name][0], inputs,
+                                                    incremental, retries, retry_delay)
+
+            if not running:
+                continue
+            finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name, future in list(running.items()):
+                if future in finished:
+                    del running[name]
+                    try:
+                        results[name] = future.result()
+                        status[name] = 'done'
+                    except Exception:
+                        logger.exception('%s failed', name)
+                        status[name] = 'failed'
+
+    return status
@@ -0,0 +1,66 @@
+from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, TimestampType
+#----------------------------------------------------------------------------------------------------------
+# Schema registry - the fields of every source, with the types the tables need.
+# 1. Spark reads the files with these schemas instead of scanning them first to guess the types.
+# 2. Numbers + timestamps are parsed while reading - the transformations no longer cast them.
+#    (CUST_ZIP stays text - it is quoted in the source, e.g. "06109", so it is still cast after reading)
+# 3. Records that do not match are kept aside in _corrupt_record (PERMISSIVE mode) - see extract.py.
+#----------------------------------------------------------------------------------------------------------
+CORRUPT_RECORD = '_corrupt_record'
+
+CUSTOMER_SCHEMA = StructType([StructField('FIRST_NAME', StringType()),
+                              StructField('MIDDLE_NAME', StringType()),
+                              StructField('LAST_NAME', StringType()),
+                              StructField('SSN', IntegerType()),
+                              StructField('CREDIT_CARD_NO', StringType()),
+                              StructField('APT_NO', StringType()),
+                              StructField('STREET_NAME', StringType()),
+                              StructField('CUST_CITY', StringType()),
+                              StructField('CUST_STATE', StringType()),
+                              StructField('CUST_COUNTRY', StringType()),
+                              StructField('CUST_ZIP', StringType()),
+                              StructField('CUST_PHONE', StringType()),
+                              StructField('CUST_EMAIL', StringType()),
+                              StructField('LAST_UPDATED', TimestampType())])
+
+BRANCH_SCHEMA = StructType([StructField('BRANCH_CODE', IntegerType()),
+                            StructField('BRANCH_NAME', StringType()),
+                            StructField('BRANCH_STREET', StringType()),
+                            StructField('BRANCH_CITY', StringType()),
+                            StructField('BRANCH_STATE', StringType()),
+                            StructField('BRANCH_ZIP', IntegerType()),
+                            StructField('BRANCH_PHONE', StringType()),
+                            StructField('LAST_UPDATED', TimestampType())])
+
+CREDIT_SCHEMA = StructType([StructField('CREDIT_CARD_NO', StringType()),
+                            StructField('DAY', IntegerType()),
+                            StructField('MONTH', IntegerType()),
+                            StructField('YEAR', IntegerType()),
+                            StructField('CUST_SSN', IntegerType()),
+                            StructField('BRANCH_CODE', IntegerType()),
+                            StructField('TRANSACTION_TYPE', StringType()),
+                            StructField('TRANSACTION_VALUE', DoubleType()),
+                            StructField('TRANSACTION_ID', IntegerType())])
+
+# same (alphabetical) column order as the loan table created from the inferred schema
+LOAN_SCHEMA = StructType([StructField('Application_ID', StringType()),
+                          StructField('Application_Status', StringType()),
+                          StructField('Credit_History', IntegerType()),
+                          StructField('Dependents', StringType()),
+                          StructField('Education', StringType()),
+                          StructField('Gender', StringType()),
+                          StructField('Income', StringType()),
+                          StructField('Married', StringType()),
+                          StructField('Property_Area', StringType()),
+                          StructField('Self_Employed', StringType())])
+
+SCHEMAS = {
+    'customer': CUSTOMER_SCHEMA,
+    'branch': BRANCH_SCHEMA,
+    'credit': CREDIT_SCHEMA,
+    'loan': LOAN_SCHEMA
+}
+
+# schema + a column holding the raw text of every record that could not be parsed
+def with_corrupt_record(schema):
+    return StructType(schema.fields + [StructField(CORRUPT_RECORD, StringType())])
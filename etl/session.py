@@ -0,0 +1,35 @@
+import threading
+
+from pyspark import SparkContext
+from pyspark.sql import SparkSession
+#----------------------------------------------------------------------------------------------------------
+# One SparkSession per process, shared by every pipeline - started the first time a Spark step needs it
+# (pipelines on the pandas engine never start it).
+# FAIR scheduling - pipelines running at the same time each get their own scheduler pool (see runner.py),
+# so a big job (credit) does not hold up the small ones (customer, branch).
+#----------------------------------------------------------------------------------------------------------
+_local = threading.local()                          # scheduler pool of the current thread
+
+def create_spark(app_name='Credit Card App'):
+    return SparkSession.builder.appName(app_name) \
+                               .config('spark.scheduler.mode', 'FAIR') \
+                               .getOrCreate()
+
+# the active session (the notebook's session, or one created on first use) - in the pool of the current thread
+def spark():
+    if SparkContext._active_spark_context is None:
+        session = create_spark()
+    else:
+        session = SparkSession.builder.getOrCreate()
+    pool = getattr(_local, 'pool', None)
+    if pool:
+        session.sparkContext.setLocalProperty('spark.scheduler.pool', pool)
+    return session
+
+# scheduler pool for the Spark jobs of the current thread (set when Spark is used, not started for it)
+def use_pool(name):
+    _local.pool = name
+
+def stop_spark():
+    if SparkContext._active_spark_context is not None:
+        SparkSession.builder.getOrCreate().stop()
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from etl.extract import extract_json as read_json, valid_records
+from etl.load import new_records, upsert_to_db                          # noqa: F401 - the engine's functions (engine.new_records(...))
+from etl.parquet import stage_to_parquet                                # noqa: F401
+from etl.session import spark
+from etl.transform import transform_customer, transform_branch, transform_credit       # noqa: F401
+#----------------------------------------------------------------------------------------------------------
+# Spark engine - the extract/transform/load functions of etl/, behind the same names as pandas_engine.py.
+# Used for big inputs (see engine.py) - the Spark session is only started when this engine runs.
+#----------------------------------------------------------------------------------------------------------
+NAME = 'spark'
+
+# pandas dtype -> Spark type
+SPARK_TYPES = {
+    'object': 'string',
+    'Int32': 'int',
+    'float64': 'double',
+    'datetime64[ns]': 'timestamp'
+}
+
+# records matching the schema
+def extract_json(file, schema):
+    return valid_records(read_json(file, schema))
+
+def is_empty(dataframe):
+    return not dataframe.head(1)
+
+# pandas output of the other engine -> Spark (e.g. the new transactions the monthly statements are refreshed for)
+def to_spark(dataframe):
+    if not isinstance(dataframe, pd.DataFrame):
+        return dataframe
+    schema = ', '.join(f'{column} {SPARK_TYPES[str(dtype)]}' for column, dtype in dataframe.dtypes.items())
+    return spark().createDataFrame(dataframe.astype(object).where(dataframe.notna(), None), schema=schema)
@@ -0,0 +1,175 @@
+from pyspark.sql.functions import *
+from pyspark.sql.window import Window
+#----------------------------------------------------------------------------------------------------------
+# Transformation functions - customer, branch, credit + monthly statement (built from the loaded tables)
+# The sources are read with the schemas in etl/schemas.py, so the columns already have their final types.
+#----------------------------------------------------------------------------------------------------------
+# transform customer data
+def transform_customer(dataframe):
+    # name transformation
+    dataframe = dataframe.withColumn('FIRST_NAME', initcap(dataframe['FIRST_NAME']))                         # convert to title case
+    dataframe = dataframe.withColumn('MIDDLE_NAME', lower(dataframe['MIDDLE_NAME']))                         # convert to lower case
+    dataframe = dataframe.withColumn('LAST_NAME', initcap(dataframe['LAST_NAME']))                           # convert to title case
+
+    # address transformation
+    dataframe = dataframe.withColumn('FULL_STREET_ADDRESS', 
+                                     concat_ws(', ', dataframe['STREET_NAME'], dataframe['APT_NO']))         # concat street name + apt no
+    dataframe = dataframe.drop('APT_NO', 'STREET_NAME')                                                      # drop columns
+
+    # phone number transformation
+    dataframe = dataframe.withColumn('CUST_PHONE', concat(lit('(781)'),                                      # change format of phone number
+                                                          substring(dataframe['CUST_PHONE'], 1, 3), 
+                                                          lit('-'), 
+                                                          substring(dataframe['CUST_PHONE'], 3, 4)))
+    
+    # convert data types (SSN + LAST_UPDATED are parsed while reading - CUSTOMER_SCHEMA)
+    dataframe = dataframe.withColumn('CUST_ZIP', dataframe['CUST_ZIP'].cast('int'))
+
+    # rearrange columns
+    rearranged_customer_df = dataframe.select('SSN', 
+                                              'FIRST_NAME', 
+                                              'MIDDLE_NAME', 
+                                              'LAST_NAME',
+                                              'CREDIT_CARD_NO',
+                                              'FULL_STREET_ADDRESS',
+                                              'CUST_CITY',
+                                              'CUST_STATE',
+                                              'CUST_COUNTRY',
+                                              'CUST_ZIP',
+                                              'CUST_PHONE',
+                                              'CUST_EMAIL',
+                                              'LAST_UPDATED')
+    return rearranged_customer_df
+
+# transform branch data 
+def transform_branch(dataframe):
+    # zip code transformation
+    dataframe = dataframe.fillna(999999, subset=['BRANCH_ZIP'])                                              # replace null values
+
+    # phone number transformation
+    dataframe = dataframe.withColumn('BRANCH_PHONE', concat(lit('(781)'),                                    # change format of phone number
+                                                            substring(dataframe['BRANCH_PHONE'], 1, 3), 
+                                                            lit('-'), 
+                                                            substring(dataframe['BRANCH_PHONE'], 3, 4)))
+    
+    # convert data type (BRANCH_CODE, BRANCH_ZIP + LAST_UPDATED are parsed while reading - BRANCH_SCHEMA)
+
+    # rearrange columns
+    rearranged_branch_df = dataframe.select('BRANCH_CODE',
+                                            'BRANCH_NAME',
+                                            'BRANCH_STREET',
+                                            'BRANCH_CITY',
+                                            'BRANCH_STATE',
+                                            'BRANCH_ZIP',
+                                            'BRANCH_PHONE',
+                                            'LAST_UPDATED')
+    
+    return rearranged_branch_df
+
+# transform credit data 
+def transform_credit(dataframe):
+    # date transformation
+    dataframe = dataframe.withColumn('TIMEID',                                                               # change format of date
+                                     concat_ws('-', dataframe['YEAR'], dataframe['MONTH'], dataframe['DAY']).cast('date'))
+    
+    # remove all hypens
+    dataframe = dataframe.withColumn('TIMEID', regexp_replace(dataframe['TIMEID'], '-', ''))
+    dataframe = dataframe.drop('YEAR', 'MONTH', 'DAY')
+
+    # convert data type (BRANCH_CODE, CUST_SSN + TRANSACTION_ID are parsed while reading - CREDIT_SCHEMA)
+
+    # rename column
+    dataframe = dataframe.withColumnRenamed('CREDIT_CARD_NO', 'CUST_CC_NO')
+    
+    # rearrange columns
+    rearranged_credit_df = dataframe.select('CUST_CC_NO',
+                                            'TIMEID',
+                                            'CUST_SSN',
+                                            'BRANCH_CODE',
+                                            'TRANSACTION_TYPE',
+                                            'TRANSACTION_VALUE',
+                                            'TRANSACTION_ID')
+    
+    return rearranged_credit_df
+
+# transform monthly statement data - one row per credit card, year and month (the values shown on the monthly bill)
+def transform_monthly_statement(credit_df, customer_df, branch_df):
+    # year + month of each transaction (TIMEID = YYYYMMDD)
+    credit_df = credit_df.withColumn('YEAR', substring(credit_df['TIMEID'], 1, 4).cast('int'))
+    credit_df = credit_df.withColumn('MONTH', substring(credit_df['TIMEID'], 5, 2).cast('int'))
+
+    # totals per credit card, year and month
+    statement_df = credit_df.groupBy('CUST_CC_NO', 'YEAR', 'MONTH') \
+                            .agg(count('TRANSACTION_ID').alias('TRANSACTION_COUNT'), 
+                                 round(sum('TRANSACTION_VALUE'), 2).alias('NEW_BALANCE'))
+
+    # customer + branch of the latest transaction in the month (printed on the bill)
+    latest = Window.partitionBy('CUST_CC_NO', 'YEAR', 'MONTH').orderBy(desc('TIMEID'), desc('TRANSACTION_ID'))
+    latest_df = credit_df.withColumn('ROW_NUMBER', row_number().over(latest)) \
+                         .filter(col('ROW_NUMBER') == 1) \
+                         .select('CUST_CC_NO', 'YEAR', 'MONTH', 'CUST_SSN', 'BRANCH_CODE')
+    statement_df = statement_df.join(latest_df, ['CUST_CC_NO', 'YEAR', 'MONTH'])
+
+    # customer address + branch address
+    customer_df = customer_df.select(col('SSN').alias('CUST_SSN'), 
+                                     'FIRST_NAME', 
+                                     'LAST_NAME', 
+                                     'FULL_STREET_ADDRESS', 
+                                     'CUST_CITY', 
+                                     'CUST_STATE', 
+                                     'CUST_ZIP')
+    branch_df = branch_df.select('BRANCH_CODE', 
+                                 'BRANCH_NAME', 
+                                 'BRANCH_STREET', 
+                                 'BRANCH_CITY', 
+                                 'BRANCH_STATE', 
+                                 'BRANCH_ZIP')
+    statement_df = statement_df.join(customer_df, 'CUST_SSN')
+    statement_df = statement_df.join(branch_df, 'BRANCH_CODE', 'left')
+
+    # bill values - rewards at 2%, credit limit of $10,000, payment due on the 1st of the next month
+    statement_df = statement_df.withColumn('REWARDS', round(statement_df['NEW_BALANCE'] * 0.02, 2))
+    statement_df = statement_df.withColumn('CREDIT_LIMIT', lit(10000))
+    statement_df = statement_df.withColumn('AVAILABLE_CREDIT', round(lit(10000) - statement_df['NEW_BALANCE'], 2))
+    statement_df = statement_df.withColumn('STATEMENT_DATE', 
+                                           concat_ws('-', statement_df['YEAR'], statement_df['MONTH'], lit(1)).cast('date'))
+    statement_df = statement_df.withColumn('DUE_DATE', add_months(statement_df['STATEMENT_DATE'], 1))
+
+    # rename column
+    statement_df = statement_df.withColumnRenamed('CUST_CC_NO', 'CREDIT_CARD_NO')
+
+    # rearrange columns
+    rearranged_statement_df = statement_df.select('CREDIT_CARD_NO',
+                                                  'YEAR',
+                                                  'MONTH',
+                                                  'CUST_SSN',
+                                                  'FIRST_NAME',
+                                                  'LAST_NAME',
+                                                  'FULL_STREET_ADDRESS',
+                                                  'CUST_CITY',
+                                                  'CUST_STATE',
+                                                  'CUST_ZIP',
+                                                  'BRANCH_CODE',
+                                                  'BRANCH_NAME',
+                                                  'BRANCH_STREET',
+                                                  'BRANCH_CITY',
+                                                  'BRANCH_STATE',
+                                                  'BRANCH_ZIP',
+                                                  'TRANSACTION_COUNT',
+                                                  'NEW_BALANCE',
+                                                  'REWARDS',
+                                                  'CREDIT_LIMIT',
+                                                  'AVAILABLE_CREDIT',
+                                                  'STATEMENT_DATE',
+                                                  'DUE_DATE')
+    
+    return rearranged_statement_df
+
+# credit card transactions in the same card + month as the new transactions (the statements that need a refresh)
+def touched_months(credit_df, new_credit_df):
+    months_df = new_credit_df.select('CUST_CC_NO', substring('TIMEID', 1, 6).alias('YEAR_MONTH')).distinct()
+    first_month = months_df.agg(min('YEAR_MONTH')).first()[0]
+
+    credit_df = credit_df.filter(credit_df['TIMEID'] >= first_month)                                         # pushed down to MariaDB
+    credit_df = credit_df.withColumn('YEAR_MONTH', substring(credit_df['TIMEID'], 1, 6))
+    return credit_df.join(months_df, ['CUST_CC_NO', 'YEAR_MONTH'], 'left_semi').drop('YEAR_MONTH')
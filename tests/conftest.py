@@ -0,0 +1,98 @@
+import os
+import random
+import sys
+
+import pandas as pd
+import pytest
+#----------------------------------------------------------------------------------------------------------
+# Fixtures for the dashboard tests - a small synthetic warehouse in the benchmarks' SQLite stand-in
+# (benchmarks/standin.py), loaded into the snapshot through database.fetch like MariaDB would be.
+# The snapshot, its on-disk cache + the memoized results are reset for every test.
+#----------------------------------------------------------------------------------------------------------
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD = os.path.join(ROOT, 'dashboard')
+
+# read by the dashboard modules at import - MariaDB source (the stand-in), snapshot mode, one process
+os.environ['Dashboard_Source'] = ''
+os.environ['Dashboard_Live_Query'] = ''
+os.environ['Dashboard_Shared_Dir'] = ''
+sys.path[:0] = [ROOT, DASHBOARD]
+
+import database
+import indexes                              # noqa: F401 - registers the derived indexes (@derived) with the snapshot
+import live
+import memo
+import snapshot
+from benchmarks.standin import sqlite_database, attach
+
+FIRST_NAMES = ['Alec', 'Etta', 'Wilber', 'Eugenio', 'Wendy', 'Janette']
+LAST_NAMES = ['Hooper', 'Holman', 'Dunham', 'Trinidad', 'Ayers', 'Terrell']
+CITIES = {'GA': 'Conyers', 'KY': 'Independence', 'WI': 'Oconomowoc', 'NY': 'Brooklyn'}
+ZIPCODES = {'GA': 30012, 'KY': 41051, 'WI': 53066, 'NY': 11201}
+TRANSACTION_TYPES = ['Bills', 'Education', 'Entertainment', 'Gas', 'Grocery', 'Healthcare', 'Test']
+
+CUSTOMERS = 40
+BRANCHES = 6
+
+def customer_rows(count=CUSTOMERS):
+    rows = []
+    for number in range(count):
+        state = random.choice(list(CITIES))
+        rows.append([123450000 + number,
+                     random.choice(FIRST_NAMES),
+                     random.choice('abcdefgh'),
+                     random.choice(LAST_NAMES),
+                     f'42106533{number:08d}',
+                     f'Main Street, {number}',
+                     CITIES[state],
+                     state,
+                     'United States',
+                     ZIPCODES[state],
+                     '(781)123-4567',
+                     f'customer{number}@example.com',
+                     pd.Timestamp('2018-04-21 12:49:02')])
+    return pd.DataFrame(rows, columns=database.CUSTOMER_COLUMNS)
+
+def branch_rows(count=BRANCHES):
+    rows = [[code, 'Example Bank', f'Branch Street {code}', 'Lakeville', 'MN', 55044, '(781)234-5678',
+             pd.Timestamp('2018-04-18 16:51:47')] for code in range(1, count + 1)]
+    return pd.DataFrame(rows, columns=database.BRANCH_COLUMNS)
+
+# transactions of random customers - ids from `first_id`, days in the given months of 2018
+def credit_rows(count, first_id=1, months=range(1, 7)):
+    rows = []
+    for transaction_id in range(first_id, first_id + count):
+        number = random.randrange(CUSTOMERS)
+        rows.append([f'42106533{number:08d}',
+                     f'2018{random.choice(months):02d}{random.randint(1, 28):02d}',
+                     123450000 + number,
+                     random.randint(1, BRANCHES),
+                     random.choice(TRANSACTION_TYPES),
+                     round(random.uniform(1, 100), 2),
+                     transaction_id])
+    return pd.DataFrame(rows, columns=database.CREDIT_COLUMNS)
+
+# the stand-in database, attached to database.fetch + live.fetch, with an empty snapshot (nothing loaded yet)
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    random.seed(2018)
+    tables = {'customer': customer_rows(), 'branch': branch_rows(), 'credit': credit_rows(600)}
+    con = sqlite_database(tables, database.STATEMENT_COLUMNS)
+
+    monkeypatch.setattr(database, 'fetch', database.fetch)              # restored after the test
+    monkeypatch.setattr(live, 'fetch', live.fetch)
+    attach(con, database, live)
+    monkeypatch.setattr(snapshot, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(snapshot, 'CACHE_INDEX', str(tmp_path / 'snapshot.json'))
+    monkeypatch.setattr(snapshot, '_snapshot', {})
+    monkeypatch.setattr(snapshot, '_markers', {})
+    memo.clear()
+    yield con
+    con.close()
+
+# every table + derived frame/index of the current version (loaded/built now if not yet)
+@pytest.fixture
+def loaded(warehouse):
+    for name in list(snapshot.LOADERS) + list(snapshot.BUILDERS):
+        snapshot.get(name)
+    return warehouse
@@ -0,0 +1,76 @@
+import pytest
+
+import mysql.connector as mariadb
+
+import app                                                              # noqa: F401 - registers the pages (dash.register_page)
+import database
+import snapshot
+from pages import customers_monthly_bill
+
+NO_STATEMENT = ['', '$0.00', '', '', '', '', '', '', '', '', '', '', '', '', None]
+
+# card + year + month of a transaction in the snapshot, and the sidebar cells selecting that month
+@pytest.fixture
+def card(loaded):
+    transaction = snapshot.get('transactions').iloc[0]
+    year, month = transaction['TIMEID'].year, transaction['TIMEID'].month
+    cells = ({'row': customers_monthly_bill.filter_values('months').index(month)},
+             {'row': customers_monthly_bill.filter_values('years').index(year)})
+    return transaction['CREDIT_CARD_NO'], year, month, cells
+
+def bill(cc, cells):
+    return customers_monthly_bill.update_bill.__wrapped__(cc, *cells)
+
+# a row of the statement table, with the customer + branch it names
+def add_statement(con, cc, year, month, ssn, branch_code):
+    values = dict.fromkeys(database.STATEMENT_COLUMNS, '')
+    values.update(CREDIT_CARD_NO=cc, YEAR=int(year), MONTH=int(month), CUST_SSN=int(ssn), BRANCH_CODE=int(branch_code),
+                  NEW_BALANCE=12.5, REWARDS=0.25, CREDIT_LIMIT=10000, AVAILABLE_CREDIT=9987.5,
+                  STATEMENT_DATE='2018-01-01', DUE_DATE='2018-02-01')
+    con.execute(f'INSERT INTO cdw_sapp_monthly_statement VALUES ({", ".join("?" * len(values))})', list(values.values()))
+    con.commit()
+#----------------------------------------------------------------------------------------------------------
+# bill of a card + month - the current name + address of the customer
+
+def test_bill_from_the_snapshot(card):
+    cc, year, month, cells = card
+    output = bill(cc, cells)
+    customer = snapshot.get('customer').set_index('CREDIT_CARD_NO').loc[cc]
+    assert output[0] == ''
+    assert output[8] == f'{customer["FIRST_NAME"]} {customer["LAST_NAME"]}'
+    assert len(output[-1]) == len(snapshot.get('transactions').query('CREDIT_CARD_NO == @cc and TIMEID.dt.year == @year '
+                                                                    'and TIMEID.dt.month == @month'))
+
+def test_bill_from_the_statement_table(loaded, card):
+    cc, year, month, cells = card
+    ssn = snapshot.get('customer').set_index('CREDIT_CARD_NO').loc[cc, 'SSN']
+    add_statement(loaded, cc, year, month, ssn, 2)
+    assert bill(cc, cells)[1] == '$12.50'
+
+# a statement naming a customer or a branch the snapshot does not have - the no statement bill, not a failed callback
+@pytest.mark.parametrize('ssn, branch_code', [(999999999, 2), (None, 99)])
+def test_statement_with_unknown_customer_or_branch(loaded, card, ssn, branch_code):
+    cc, year, month, cells = card
+    ssn = ssn or snapshot.get('customer').set_index('CREDIT_CARD_NO').loc[cc, 'SSN']
+    add_statement(loaded, cc, year, month, ssn, branch_code)
+    assert bill(cc, cells) == NO_STATEMENT
+
+# a failed statement lookup falls back to the snapshot - and is looked up again by the next request
+def test_failed_statement_lookup_is_not_memoized(loaded, card, monkeypatch):
+    cc, year, month, cells = card
+    fetch = database.fetch
+    calls = []
+    def fetch_or_fail(name, params=(), sql=None):
+        if name == 'monthly_statement':
+            calls.append(params)
+            if len(calls) == 1:
+                raise mariadb.errors.OperationalError(msg='Lost connection to MySQL server during query', errno=2013)
+        return fetch(name, params, sql)
+    monkeypatch.setattr(database, 'fetch', fetch_or_fail)
+
+    assert customers_monthly_bill.monthly_statement(cc, year, month) is None
+    ssn = snapshot.get('customer').set_index('CREDIT_CARD_NO').loc[cc, 'SSN']
+    add_statement(loaded, cc, year, month, ssn, 2)
+    assert customers_monthly_bill.monthly_statement(cc, year, month)['NEW_BALANCE'] == 12.5
+    assert customers_monthly_bill.monthly_statement(cc, year, month)['NEW_BALANCE'] == 12.5
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+import database
+
+# stand-in for a pooled connection - hands out cursors that remember whether they were closed
+class Cursor:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class Connection:
+    def cursor(self, prepared=False):
+        assert prepared
+        return Cursor()
+
+def new_slot():
+    return {'con': Connection(), 'cursors': OrderedDict()}
+#----------------------------------------------------------------------------------------------------------
+# prepared cursors - re-used per SQL text, at most PREPARED_CURSORS per connection
+
+def test_same_sql_reuses_its_cursor():
+    slot = new_slot()
+    cur = database._prepared_cursor(slot, database.QUERIES['customer'])
+    assert database._prepared_cursor(slot, database.QUERIES['customer']) is cur
+    assert not cur.closed
+
+def test_least_recently_used_cursor_is_closed(monkeypatch):
+    monkeypatch.setattr(database, 'PREPARED_CURSORS', 3)
+    slot = new_slot()
+    named = database._prepared_cursor(slot, database.QUERIES['customer'])
+    live_sql = [f'SELECT * FROM cdw_sapp_credit_card WHERE TRANSACTION_ID = {number}' for number in range(10)]
+
+    cursors = []
+    for sql in live_sql:
+        cursors.append(database._prepared_cursor(slot, sql))
+        database._prepared_cursor(slot, database.QUERIES['customer'])       # used again - stays prepared
+
+    assert len(slot['cursors']) == 3
+    assert not named.closed
+    assert [cur.closed for cur in cursors] == [True] * 8 + [False] * 2
+    assert list(slot['cursors']) == live_sql[-2:] + [database.QUERIES['customer']]
+#----------------------------------------------------------------------------------------------------------
+# table markers - row count + latest marker value, None (not 'None') for an empty table
+
+def test_table_marker(warehouse):
+    count, latest = database.get_table_marker('credit')
+    assert count == 600 and latest == '600'
+
+    warehouse.execute('DELETE FROM cdw_sapp_branch')
+    assert database.get_table_marker('branch') == [0, None]
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from etl import download
+
+BODY = b'[{"Application_ID": "LP001002", "Income": "medium"}]'
+ETAG = '"loan-1"'
+
+# local api - answers from `responses` (one per request, the last one is repeated), records the request headers
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        responses = self.server.responses
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        response(self)
+
+    def log_message(self, format, *args):
+        pass
+
+def ok(handler):
+    if handler.headers.get('If-None-Match') == ETAG:
+        return not_modified(handler)
+    handler.send_response(200)
+    handler.send_header('ETag', ETAG)
+    handler.send_header('Content-Length', str(len(BODY)))
+    handler.end_headers()
+    handler.wfile.write(BODY)
+
+def not_modified(handler):
+    handler.send_response(304)
+    handler.end_headers()
+
+def unavailable(handler):
+    handler.send_response(503)
+    handler.send_header('Content-Length', '0')
+    handler.end_headers()
+
+# the connection drops halfway through the body
+def truncated(handler):
+    handler.send_response(200)
+    handler.send_header('Content-Length', str(len(BODY)))
+    handler.end_headers()
+    handler.wfile.write(BODY[:10])
+    handler.close_connection = True
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    server.responses = [ok]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_port}/loan_data.json'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get(api, tmp_path):
+    return download.download(api.url, cache_dir=str(tmp_path), backoff=0, timeout=5)
+#----------------------------------------------------------------------------------------------------------
+# conditional downloads - ETag sent back, 304 re-uses the cached copy
+
+def test_download_then_not_modified(api, tmp_path):
+    first = get(api, tmp_path)
+    assert first['changed'] and not first['not_modified'] and not first['loaded']
+    assert first['sha256'] == hashlib.sha256(BODY).hexdigest()
+    with open(first['path'], 'rb') as f:
+        assert f.read() == BODY
+
+    download.mark_loaded(api.url, first['sha256'], cache_dir=str(tmp_path))
+    second = get(api, tmp_path)
+    assert api.requests[1]['If-None-Match'] == ETAG
+    assert second['not_modified'] and not second['changed'] and second['loaded']
+    assert second['path'] == first['path']
+
+def test_not_modified_without_a_cached_copy_downloads_again(api, tmp_path):
+    api.responses = [not_modified, ok]                                  # e.g. a proxy answering for the origin
+    result = get(api, tmp_path)
+    assert result['changed'] and not result['not_modified']
+    assert api.requests[1]['Cache-Control'] == 'no-cache'
+
+def test_not_modified_twice_without_a_cached_copy_fails(api, tmp_path):
+    api.responses = [not_modified]
+    with pytest.raises(requests.HTTPError):
+        get(api, tmp_path)
+    assert len(api.requests) == 2
+#----------------------------------------------------------------------------------------------------------
+# retries - 5xx responses + bodies cut off mid-stream
+
+def test_unavailable_then_ok(api, tmp_path):
+    api.responses = [unavailable, unavailable, ok]
+    assert get(api, tmp_path)['sha256'] == hashlib.sha256(BODY).hexdigest()
+    assert len(api.requests) == 3
+
+def test_truncated_body_is_retried(api, tmp_path):
+    api.responses = [truncated, ok]
+    result = get(api, tmp_path)
+    assert result['sha256'] == hashlib.sha256(BODY).hexdigest()
+    assert len(api.requests) == 2
+    assert not list(tmp_path.glob('*.part'))                            # the cut-off body was removed
+
+def test_truncated_body_every_time_fails(api, tmp_path):
+    api.responses = [truncated]
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        get(api, tmp_path)
+    assert len(api.requests) == 4
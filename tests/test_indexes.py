@@ -0,0 +1,26 @@
+import math
+
+import indexes
+import snapshot
+#----------------------------------------------------------------------------------------------------------
+# card ledger - the rows, count + total of a card's month, as a filter of the transactions frame finds them
+
+def test_card_month_totals(loaded):
+    transactions_df = snapshot.get('transactions')
+    months = transactions_df.groupby([transactions_df['CREDIT_CARD_NO'].astype(str),
+                                      transactions_df['TIMEID'].dt.year, transactions_df['TIMEID'].dt.month])
+    assert len(snapshot.get('card_months')) == len(months)
+
+    for (cc, year, month), month_df in months:
+        card_month = indexes.card_month(cc, year, month)
+        assert sorted(card_month['rows']) == sorted(month_df.index)
+        assert card_month['count'] == len(month_df)
+        assert math.isclose(card_month['total'], math.fsum(month_df['TRANSACTION_VALUE']), rel_tol=1e-9)
+
+def test_card_without_transactions(loaded):
+    cc = snapshot.get('transactions')['CREDIT_CARD_NO'].iloc[0]
+    assert indexes.card_exists(cc)
+    assert indexes.card_month(cc, 2017, 12) is None
+    assert indexes.card_month(cc, 2018, 13) is None
+    assert not indexes.card_exists('4210653399999999')
+    assert indexes.card_month('4210653399999999', 2018, 1) is None
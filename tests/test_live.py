@@ -0,0 +1,55 @@
+import live
+import snapshot
+from conftest import credit_rows
+
+# live query mode against the stand-in - (page rows, total) of the transactions data table
+def page(filters=(), zipcode=None, month=None, year=None, sort_by=None, page_size=1000):
+    return live.transactions_page(zipcode, month, year, list(filters), sort_by, 0, page_size)
+
+def add_transaction_type(con, transaction_type, first_id):
+    new_df = credit_rows(1, first_id=first_id)
+    new_df['TRANSACTION_TYPE'] = transaction_type
+    new_df.to_sql('cdw_sapp_credit_card', con, if_exists='append', index=False)
+#----------------------------------------------------------------------------------------------------------
+# WHERE clause of the sidebar filters + the data table filter query
+
+def test_where_is_parameterized():
+    where, params = live.transactions_where(41051, 3, 2018, [('TRANSACTION_VALUE', 'ge', 50.0),
+                                                              ('TRANSACTION_TYPE', 'contains', "'; DROP TABLE x; --"),
+                                                              ('UNKNOWN', 'eq', 1)])
+    assert where == ("WHERE c.CUST_ZIP = %s AND cc.TIMEID LIKE %s AND cc.TRANSACTION_VALUE >= %s "
+                     "AND cc.TRANSACTION_TYPE LIKE %s ESCAPE '!'")
+    assert params == [41051, '201803%', 50.0, "%'; DROP TABLE x; --%"]
+
+def test_like_wildcards_typed_by_the_user_are_text():
+    where, params = live.transactions_where(filters=[('TRANSACTION_TYPE', 'contains', '50%_!')])
+    assert params == ['%50!%!_!!%']
+
+def test_page_matches_the_snapshot(warehouse):
+    transactions_df = snapshot.get('transactions')
+    expected = transactions_df.loc[(transactions_df['CUST_ZIP'] == 53066) & (transactions_df['TRANSACTION_VALUE'] >= 50)]
+
+    page_df, total = page([('TRANSACTION_VALUE', 'ge', 50.0)], zipcode=53066)
+    assert total == len(expected) == len(page_df)
+    assert sorted(page_df['TRANSACTION_ID']) == sorted(expected['TRANSACTION_ID'])
+
+def test_contains_percent_and_underscore(warehouse):
+    add_transaction_type(warehouse, 'Bills 50%_off', first_id=601)
+    add_transaction_type(warehouse, 'Bills 500 off', first_id=602)
+
+    page_df, total = page([('TRANSACTION_TYPE', 'contains', '50%_')])
+    assert total == 1 and list(page_df['TRANSACTION_ID']) == [601]
+    assert page([('CUST_CC_NO', 'contains', '_')])[1] == 0
+
+# a TIMEID filter that is not a date matches no row - not a failed callback
+def test_timeid_filter_that_is_not_a_date(warehouse):
+    page_df, total = page([('TIMEID', 'eq', 'abc')])
+    assert total == 0 and page_df.empty
+
+    assert live.to_timeid('2018-03-05') == '20180305'
+    assert page([('TIMEID', 'ge', '2018-06-01')])[1] == page([('TIMEID', 'datestartswith', '2018-06')])[1] > 0
+
+def test_suggest_names(warehouse):
+    names = live.suggest_names('LAST_NAME', '', '', 'H')
+    assert names and all(name.startswith('H') for name in names)
+    assert live.suggest_names('LAST_NAME', '', '', '_') == []
@@ -0,0 +1,118 @@
+import pytest
+
+import mysql.connector as mariadb
+
+from etl import load
+
+# stand-in for a MariaDB connection - records the SQL, answers the information_schema + MAX() queries
+class Connection:
+    def __init__(self, indexes=(), types=(), watermark=None, error=None):
+        self.indexes = list(indexes)                # (INDEX_NAME, NON_UNIQUE, columns) of the target table
+        self.types = list(types)                    # (COLUMN_NAME, DATA_TYPE) of the target table
+        self.watermark = watermark
+        self.error = error
+        self.statements = []
+        self.committed = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class Cursor:
+    def __init__(self, con):
+        self.con = con
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        self.con.statements.append(sql)
+        if 'information_schema.STATISTICS' in sql:
+            self.rows = self.con.indexes
+        elif 'information_schema.COLUMNS' in sql:
+            self.rows = self.con.types
+        elif sql.startswith('SELECT MAX'):
+            if self.con.error:
+                raise self.con.error
+            self.rows = [(self.con.watermark,)]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+@pytest.fixture
+def connect(monkeypatch):
+    def use(con):
+        monkeypatch.setattr(load.mariadb, 'connect', lambda **kwargs: con)
+        return con
+    return use
+
+CUSTOMER_TYPES = [('SSN', 'int'), ('FIRST_NAME', 'text'), ('LAST_UPDATED', 'timestamp')]
+
+def merge(con, table_name, columns, key_columns, watermark=None):
+    load.merge_staging('db', table_name, f'{table_name}_STAGING', columns, key_columns, 'user', 'password', watermark)
+    return [sql for sql in con.statements if not sql.startswith('SELECT')]
+#----------------------------------------------------------------------------------------------------------
+# merge_staging - primary key + watermark index, then an upsert through the key
+
+def test_first_merge_adds_the_key_and_the_watermark_index(connect):
+    con = connect(Connection(types=CUSTOMER_TYPES))                 # created LIKE the JDBC staging table - no index
+
+    statements = merge(con, 'CDW_SAPP_CUSTOMER', ['SSN', 'FIRST_NAME', 'LAST_UPDATED'], ['SSN'], 'LAST_UPDATED')
+    assert statements == [
+        'CREATE TABLE IF NOT EXISTS CDW_SAPP_CUSTOMER LIKE CDW_SAPP_CUSTOMER_STAGING',
+        'ALTER IGNORE TABLE CDW_SAPP_CUSTOMER ADD PRIMARY KEY (SSN), ADD INDEX watermark (LAST_UPDATED)',
+        'INSERT INTO CDW_SAPP_CUSTOMER (SSN, FIRST_NAME, LAST_UPDATED) SELECT SSN, FIRST_NAME, LAST_UPDATED '
+        'FROM CDW_SAPP_CUSTOMER_STAGING ON DUPLICATE KEY UPDATE FIRST_NAME = VALUES(FIRST_NAME), LAST_UPDATED = VALUES(LAST_UPDATED)']
+    assert con.committed
+
+def test_text_key_becomes_varchar(connect):
+    con = connect(Connection(types=[('Application_ID', 'text'), ('Income', 'text')]))
+
+    statements = merge(con, 'CDW_SAPP_LOAN_APPLICATION', ['Application_ID', 'Income'], ['Application_ID'], 'Application_ID')
+    assert statements[1] == 'ALTER IGNORE TABLE CDW_SAPP_LOAN_APPLICATION MODIFY Application_ID VARCHAR(255), ADD PRIMARY KEY (Application_ID)'
+
+def test_merge_into_keyed_table_only_upserts(connect):
+    con = connect(Connection(indexes=[('PRIMARY', 0, 'SSN'), ('watermark', 1, 'LAST_UPDATED')], types=CUSTOMER_TYPES))
+
+    statements = merge(con, 'CDW_SAPP_CUSTOMER', ['SSN', 'FIRST_NAME', 'LAST_UPDATED'], ['SSN'], 'LAST_UPDATED')
+    assert [sql.split(' (')[0] for sql in statements] == ['CREATE TABLE IF NOT EXISTS CDW_SAPP_CUSTOMER LIKE CDW_SAPP_CUSTOMER_STAGING',
+                                                          'INSERT INTO CDW_SAPP_CUSTOMER']
+
+def test_statement_table_keeps_its_primary_key(connect):
+    con = connect(Connection(indexes=[('PRIMARY', 0, 'CREDIT_CARD_NO,YEAR,MONTH')]))
+
+    statements = merge(con, 'CDW_SAPP_MONTHLY_STATEMENT', ['CREDIT_CARD_NO', 'YEAR', 'MONTH', 'NEW_BALANCE'],
+                       ['CREDIT_CARD_NO', 'YEAR', 'MONTH'])
+    assert not any(sql.startswith('ALTER') for sql in statements)
+    assert statements[-1].endswith('ON DUPLICATE KEY UPDATE NEW_BALANCE = VALUES(NEW_BALANCE)')
+
+def test_other_primary_key_gets_a_unique_index(connect):
+    con = connect(Connection(indexes=[('PRIMARY', 0, 'ROW_ID')]))
+
+    statements = merge(con, 'CDW_SAPP_BRANCH', ['BRANCH_CODE', 'BRANCH_NAME'], ['BRANCH_CODE'])
+    assert statements[1] == 'ALTER IGNORE TABLE CDW_SAPP_BRANCH ADD UNIQUE INDEX merge_key (BRANCH_CODE)'
+#----------------------------------------------------------------------------------------------------------
+# get_watermark - only a missing table is a first run
+
+def test_watermark_of_loaded_table(connect):
+    connect(Connection(watermark=1045))
+    assert load.get_watermark('db', 'CDW_SAPP_CREDIT_CARD', 'TRANSACTION_ID', 'user', 'password') == 1045
+
+def test_watermark_of_missing_table_is_none(connect):
+    connect(Connection(error=mariadb.errors.ProgrammingError(msg="Table 'db.CDW_SAPP_CREDIT_CARD' doesn't exist", errno=1146)))
+    assert load.get_watermark('db', 'CDW_SAPP_CREDIT_CARD', 'TRANSACTION_ID', 'user', 'password') is None
+
+def test_watermark_error_is_not_a_first_run(connect):
+    connect(Connection(error=mariadb.errors.OperationalError(msg='Lost connection to MySQL server during query', errno=2013)))
+    with pytest.raises(mariadb.Error):
+        load.get_watermark('db', 'CDW_SAPP_CREDIT_CARD', 'TRANSACTION_ID', 'user', 'password')
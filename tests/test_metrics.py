@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from etl import pandas_engine, parquet
+from etl.config import CDW_FILES
+from etl.metrics import stage
+from etl.schemas import SCHEMAS
+
+BRANCH_FILE = os.path.join(CDW_FILES, 'cdw_sapp_branch.json')
+
+# stand-in for a MariaDB connection - the batched INSERTs into the staging table go nowhere
+class Connection:
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        pass
+
+    def executemany(self, sql, rows):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+# staging layer + metrics file in tmp_path, no database
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    parquet_dir = str(tmp_path / 'parquet')
+    os.makedirs(parquet_dir)
+    monkeypatch.setattr(pandas_engine, 'PARQUET_DIR', parquet_dir)
+    monkeypatch.setattr(parquet, 'PARQUET_DIR', parquet_dir)
+    monkeypatch.setattr(parquet, 'MANIFEST', os.path.join(parquet_dir, 'manifest.json'))
+    monkeypatch.setattr(pandas_engine.mariadb, 'connect', lambda **kwargs: Connection())
+    monkeypatch.setattr(pandas_engine, 'merge_staging', lambda *args, **kwargs: None)
+    return str(tmp_path / 'etl_metrics.jsonl')
+
+def read_metrics(metrics_file):
+    with open(metrics_file) as f:
+        return {record['stage']: record for record in map(json.loads, f)}
+
+# the branch pipeline's stages on the pandas engine
+def branch_job(metrics_file, incremental=False):
+    with stage('Branch ETL Job', metrics_file):
+        with stage('Branch Extraction', metrics_file):
+            branch_df = pandas_engine.extract_json(BRANCH_FILE, SCHEMAS['branch'])
+        with stage('Branch Transformation', metrics_file):
+            branch_df = pandas_engine.transform_branch(branch_df)
+        with stage('Branch Staging', metrics_file):
+            pandas_engine.stage_to_parquet(branch_df, 'branch', incremental)
+        with stage('Branch Loading', metrics_file):
+            pandas_engine.upsert_to_db(branch_df, 'db', 'CDW_SAPP_BRANCH', ['BRANCH_CODE'], 'user', 'password')
+    return len(branch_df)
+#----------------------------------------------------------------------------------------------------------
+# rows read + written by the pandas engine - every stage has them, like the Spark stages
+
+def test_pandas_stages_record_rows(metrics_file):
+    branches = branch_job(metrics_file)
+    metrics = read_metrics(metrics_file)
+
+    rows = {name: (record['rows_in'], record['rows_out']) for name, record in metrics.items()}
+    assert rows == {'Branch Extraction': (branches, 0),
+                    'Branch Transformation': (0, 0),
+                    'Branch Staging': (0, branches),
+                    'Branch Loading': (0, branches),
+                    'Branch ETL Job': (branches, 2 * branches)}
+
+def test_incremental_staging_reads_the_staged_rows(metrics_file):
+    branches = branch_job(metrics_file)
+    os.remove(metrics_file)
+    branch_job(metrics_file, incremental=True)
+    assert read_metrics(metrics_file)['Branch Staging']['rows_in'] == branches
+    assert pandas_engine.read_staged('branch').shape[0] == branches
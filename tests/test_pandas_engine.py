@@ -0,0 +1,76 @@
+import os
+import shutil
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl import pandas_engine
+
+# Spark runs on a JVM - the comparison with the Spark transform is skipped without one
+needs_java = pytest.mark.skipif(not os.environ.get('JAVA_HOME') and shutil.which('java') is None,
+                                reason='Spark needs Java')
+
+def credit(rows):
+    return pd.DataFrame(rows, columns=['CUST_CC_NO', 'TIMEID', 'CUST_SSN', 'BRANCH_CODE', 'TRANSACTION_TYPE',
+                                       'TRANSACTION_VALUE', 'TRANSACTION_ID']) \
+             .astype({'CUST_SSN': 'Int32', 'BRANCH_CODE': 'Int32', 'TRANSACTION_VALUE': 'float64', 'TRANSACTION_ID': 'Int32'})
+
+CREDIT = credit([['4210653310061055', '20180214', 123456100, 114, 'Education', 78.9, 1],
+                 ['4210653310061055', '20180228', 123456100, 35, 'Gas', 1.005, 2],
+                 ['4210653310061055', '20180228', 123456100, 160, 'Bills', 1.0, 3],       # same day - highest id is the latest
+                 ['4210653310061055', '20181207', 123456100, 999, 'Grocery', 2.675, 4],   # branch not in the branch table
+                 ['4210653310102868', '20180214', 123453023, 114, 'Test', 0.125, 5],
+                 ['4210653399999999', '20180301', 999999999, 114, 'Test', 10.0, 6]])      # customer not in the customer table
+
+CUSTOMER = pd.DataFrame([[123456100, 'Alec', 'Hooper', 'Main Street, 656', 'Natchez', 'MS', 39120],
+                         [123453023, 'Etta', 'Holman', 'Redwood Drive, 829', 'Wethersfield', 'CT', 6109]],
+                        columns=['SSN', 'FIRST_NAME', 'LAST_NAME', 'FULL_STREET_ADDRESS', 'CUST_CITY', 'CUST_STATE', 'CUST_ZIP']) \
+             .astype({'SSN': 'Int32', 'CUST_ZIP': 'Int32'})
+
+BRANCH = pd.DataFrame([[114, 'Example Bank', 'Maple Street', 'Natchez', 'MS', 39120],
+                       [35, 'Example Bank', 'Bridle Court', 'Lakeville', 'MN', 55044],
+                       [160, 'Example Bank', 'Church Street', 'Huntley', 'IL', 60142]],
+                      columns=['BRANCH_CODE', 'BRANCH_NAME', 'BRANCH_STREET', 'BRANCH_CITY', 'BRANCH_STATE', 'BRANCH_ZIP']) \
+           .astype({'BRANCH_CODE': 'Int32', 'BRANCH_ZIP': 'Int32'})
+
+# statement rows as plain python values (dates as dates, nulls as None) - ordered by card, year + month
+def rows(statement_df):
+    statement_df = statement_df.copy()
+    for column in ('STATEMENT_DATE', 'DUE_DATE'):
+        statement_df[column] = pd.to_datetime(statement_df[column]).dt.date
+    values = statement_df.astype(object).where(statement_df.notna(), None).values.tolist()
+    return sorted(([value.item() if isinstance(value, np.generic) else value for value in row] for row in values),
+                  key=lambda row: row[:3])
+#----------------------------------------------------------------------------------------------------------
+# monthly statements - hand-computed, then the same rows as the Spark transform (etl/transform.py)
+
+def test_round_half_up_like_spark():
+    values = pd.Series([2.675, 1.005, 0.125, -0.125, 79.905, np.nan])
+    assert pandas_engine.round_half_up(values, 2).tolist()[:5] == [2.68, 1.01, 0.13, -0.13, 79.91]
+    assert np.isnan(pandas_engine.round_half_up(values, 2).iloc[5])
+
+def test_monthly_statement():
+    statement_df = pandas_engine.transform_monthly_statement(CREDIT, CUSTOMER, BRANCH)
+    february, december, other_card = rows(statement_df)
+
+    assert february == ['4210653310061055', 2018, 2, 123456100, 'Alec', 'Hooper', 'Main Street, 656', 'Natchez', 'MS', 39120,
+                        160, 'Example Bank', 'Church Street', 'Huntley', 'IL', 60142,
+                        3, 80.91, 1.62, 10000, 9919.09, date(2018, 2, 1), date(2018, 3, 1)]
+    assert december[10:17] == [999, None, None, None, None, None, 1]                      # left join - branch columns null
+    assert december[17:] == [2.68, 0.05, 10000, 9997.32, date(2018, 12, 1), date(2019, 1, 1)]
+    assert other_card[:4] == ['4210653310102868', 2018, 2, 123453023]
+    assert other_card[17:19] == [0.13, 0.0]
+
+def test_monthly_statement_without_transactions():
+    statement_df = pandas_engine.transform_monthly_statement(CREDIT.iloc[:0], CUSTOMER, BRANCH)
+    assert statement_df.empty and len(statement_df.columns) == 23
+
+@needs_java
+def test_monthly_statement_matches_spark():
+    from etl.spark_engine import to_spark
+    from etl.transform import transform_monthly_statement
+
+    spark_df = transform_monthly_statement(to_spark(CREDIT), to_spark(CUSTOMER), to_spark(BRANCH)).toPandas()
+    assert rows(pandas_engine.transform_monthly_statement(CREDIT, CUSTOMER, BRANCH)) == rows(spark_df)
@@ -0,0 +1,168 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+import indexes
+import memo
+import snapshot
+from conftest import credit_rows
+
+# every derived frame/index of a version, built again from its tables alone (what a restart would build)
+def rebuild(version):
+    fresh = {name: version[name] for name in snapshot.LOADERS}
+    with snapshot.pinned(fresh):
+        for name in snapshot.BUILDERS:
+            snapshot.get(name)
+    return fresh
+
+# same frames/indexes - sums added batch by batch only have to be close
+def assert_same(built, rebuilt, path):
+    if isinstance(built, pd.DataFrame):
+        pd.testing.assert_frame_equal(built, rebuilt, obj=path)
+    elif isinstance(built, pd.Series):
+        pd.testing.assert_series_equal(built, rebuilt, obj=path)
+    elif isinstance(built, np.ndarray):
+        np.testing.assert_array_equal(built, rebuilt, err_msg=path)
+    elif isinstance(built, dict):
+        assert built.keys() == rebuilt.keys(), path
+        for key in built:
+            assert_same(built[key], rebuilt[key], f'{path}[{key!r}]')
+    elif isinstance(built, (list, tuple)):
+        assert len(built) == len(rebuilt), path
+        for position, (item, expected) in enumerate(zip(built, rebuilt)):
+            assert_same(item, expected, f'{path}[{position}]')
+    elif isinstance(built, float):
+        assert math.isclose(built, rebuilt, rel_tol=1e-9), path
+    else:
+        assert built == rebuilt, path
+
+# the derived frames of the current version match a full rebuild - `kept`: every one was carried over (none left to rebuild)
+def assert_matches_rebuild(kept=False):
+    current = snapshot._snapshot
+    if kept:
+        assert set(snapshot.BUILDERS) <= set(current)
+    with snapshot.pinned(current):
+        built = {name: snapshot.get(name) for name in snapshot.BUILDERS}
+    rebuilt = rebuild(current)
+    for name in snapshot.BUILDERS:
+        assert_same(built[name], rebuilt[name], name)
+
+def add_transactions(con, new_df):
+    new_df.to_sql('cdw_sapp_credit_card', con, if_exists='append', index=False)
+
+def edit_values(ssn, **values):
+    customer = snapshot.get('customer').iloc[indexes.customer_row(ssn)]
+    current = {column: customer[column] for column in database.EDITABLE_COLUMNS}
+    return {column: str(value) if column == 'CUST_ZIP' else value for column, value in {**current, **values}.items()}
+#----------------------------------------------------------------------------------------------------------
+# refresh - new rows are added to the derived frames (UPDATERS) or they are rebuilt, same result either way
+
+def test_refresh_with_new_transactions_matches_rebuild(loaded):
+    version = snapshot.version()
+    add_transactions(loaded, credit_rows(80, first_id=601, months=range(5, 9)))     # existing + new months
+
+    assert snapshot.refresh()
+    assert snapshot.version() == version + 1
+    assert len(snapshot.get('credit')) == 680
+    assert_matches_rebuild(kept=True)
+
+def test_refresh_without_changes_keeps_the_version(loaded):
+    version = snapshot.version()
+    assert not snapshot.refresh()
+    assert snapshot.version() == version
+
+def test_refresh_with_updated_customer_matches_rebuild(loaded):
+    loaded.execute("UPDATE cdw_sapp_customer SET CUST_STATE = 'NY', CUST_ZIP = 11201, LAST_UPDATED = '2018-05-01 09:00:00' "
+                   "WHERE SSN = 123450003")
+    loaded.commit()
+
+    assert snapshot.refresh()
+    customer = snapshot.get('customer').iloc[indexes.customer_row(123450003)]
+    assert (customer['CUST_STATE'], customer['CUST_ZIP']) == ('NY', 11201)
+    assert_matches_rebuild(kept=True)
+
+def test_requests_pinned_before_a_refresh_read_their_version(loaded):
+    snapshot.pin()
+    try:
+        add_transactions(loaded, credit_rows(10, first_id=601))
+        assert snapshot.refresh()
+        assert len(snapshot.get('credit')) == 600
+    finally:
+        snapshot.unpin()
+    assert len(snapshot.get('credit')) == 610
+#----------------------------------------------------------------------------------------------------------
+# customer edits - patched indexes (PATCHERS) + dropped ones, same result as a rebuild
+
+def test_edit_matches_rebuild(loaded):
+    ssn = 123450007
+    values = edit_values(ssn, FIRST_NAME='Zelda', LAST_NAME='Quint', CREDIT_CARD_NO='4210653399999999',
+                         CUST_STATE='KY', CUST_ZIP='41051')
+
+    assert snapshot.update_customer(ssn, values) == {'FIRST_NAME', 'LAST_NAME', 'CREDIT_CARD_NO', 'CUST_STATE', 'CUST_ZIP'}
+    assert indexes.find_customers('zelda', values['MIDDLE_NAME'], 'QUINT') == [ssn]
+    assert '4210653399999999' in set(snapshot.get('transactions')['CREDIT_CARD_NO'])
+    assert_matches_rebuild()
+
+def test_edit_leaves_the_pinned_version_unchanged(loaded):
+    ssn = 123450007
+    first_name = snapshot.get('customer').iloc[indexes.customer_row(ssn)]['FIRST_NAME']
+    snapshot.pin()
+    try:
+        snapshot.update_customer(ssn, edit_values(ssn, FIRST_NAME='Zelda'))
+        assert snapshot.get('customer').iloc[indexes.customer_row(ssn)]['FIRST_NAME'] == first_name
+    finally:
+        snapshot.unpin()
+    assert snapshot.get('customer').iloc[indexes.customer_row(ssn)]['FIRST_NAME'] == 'Zelda'
+
+def test_edit_with_invalid_value_changes_nothing(loaded):
+    ssn = 123450007
+    version = snapshot.version()
+    with pytest.raises(ValueError):
+        snapshot.update_customer(ssn, edit_values(ssn, FIRST_NAME='Zelda', CUST_ZIP='ABCDE'))
+    assert snapshot.version() == version
+    assert snapshot.get('customer').iloc[indexes.customer_row(ssn)]['FIRST_NAME'] != 'Zelda'
+
+# an edit made while a refresh builds the new version is replayed on it - not lost when the new version is swapped in
+def test_edit_during_refresh_is_replayed(loaded, monkeypatch):
+    ssn = 123450011
+    values = edit_values(ssn, LAST_NAME='Quint', CUST_ZIP='53066', CUST_STATE='WI')
+    fetch_changes = snapshot.fetch_changes
+    def fetch_changes_and_edit(name, table, marker):
+        snapshot.update_customer(ssn, values)                           # made by a request meanwhile
+        return fetch_changes(name, table, marker)
+    monkeypatch.setattr(snapshot, 'fetch_changes', fetch_changes_and_edit)
+    add_transactions(loaded, credit_rows(40, first_id=601, months=range(5, 9)))
+
+    assert snapshot.refresh()
+    customer = snapshot.get('customer').iloc[indexes.customer_row(ssn)]
+    assert (customer['LAST_NAME'], customer['CUST_ZIP'], customer['CUST_STATE']) == ('Quint', 53066, 'WI')
+    assert (snapshot.get('transactions').loc[snapshot.get('transactions')['SSN'] == ssn, 'CUST_ZIP'] == 53066).all()
+    assert_matches_rebuild()
+#----------------------------------------------------------------------------------------------------------
+# memoized results - never served for another snapshot version
+
+def test_memoized_results_follow_the_version(loaded):
+    calls = []
+    @memo.memoize
+    def zipcode_count(zipcode):
+        calls.append(zipcode)
+        rows = indexes.partition_rows(zipcode=zipcode)
+        return len(rows)
+
+    first = zipcode_count(41051)
+    assert zipcode_count(41051) == first
+    assert len(calls) == 1
+
+    ssn = snapshot.get('customer').loc[snapshot.get('customer')['CUST_ZIP'] != 41051, 'SSN'].iloc[0]
+    snapshot.update_customer(ssn, edit_values(ssn, CUST_STATE='KY', CUST_ZIP='41051'))      # new version
+    moved = int((snapshot.get('transactions')['SSN'] == ssn).sum())
+    assert zipcode_count(41051) == first + moved
+    assert len(calls) == 2
+
+    add_transactions(loaded, credit_rows(20, first_id=601))
+    assert snapshot.refresh()
+    zipcode_count(41051)
+    assert len(calls) == 3
@@ -0,0 +1,66 @@
+import math
+
+import app                                                              # noqa: F401 - registers the pages (dash.register_page)
+import snapshot
+from pages import customers_transactions
+
+# the transactions data table callback, unmemoized - (rows of the page, page count)
+def data_table(page_current=0, page_size=10, zipcode_row=None, sort_by=None, filter_query=''):
+    zipcode_list = {'row': zipcode_row} if zipcode_row is not None else None
+    return customers_transactions.update_data_table.__wrapped__(zipcode_list, None, None, page_current, page_size,
+                                                                sort_by, filter_query)
+
+def transaction_ids(data):
+    return [row['TRANSACTION_ID'] for row in data]
+#----------------------------------------------------------------------------------------------------------
+# paging - only the requested page is returned, ordered by day in descending order
+
+def test_pages_cover_every_transaction_once(loaded):
+    transactions_df = snapshot.get('transactions')
+    first, page_count = data_table()
+    assert page_count == math.ceil(len(transactions_df) / 10)
+
+    ids = []
+    for page in range(page_count):
+        data, _ = data_table(page)
+        ids += transaction_ids(data)
+    assert sorted(ids) == sorted(transactions_df['TRANSACTION_ID'])
+    assert ids[:10] == transaction_ids(first)
+
+    days = [row['TIMEID'] for row in first]
+    assert days == sorted(days, reverse=True)
+
+def test_zipcode_page(loaded):
+    zipcode = customers_transactions.filter_values('zipcodes')[2]
+    transactions_df = snapshot.get('transactions')
+    zipcode_ids = set(transactions_df.loc[transactions_df['CUST_ZIP'] == zipcode, 'TRANSACTION_ID'])
+
+    data, page_count = data_table(page_size=5, zipcode_row=2)
+    assert page_count == math.ceil(len(zipcode_ids) / 5)
+    assert len(data) == 5 and set(transaction_ids(data)) <= zipcode_ids
+#----------------------------------------------------------------------------------------------------------
+# filter query + sort of the data table
+
+def test_filter_and_sort(loaded):
+    transactions_df = snapshot.get('transactions')
+    expected = transactions_df.loc[transactions_df['TRANSACTION_VALUE'] >= 50, 'TRANSACTION_VALUE']
+
+    data, page_count = data_table(page_size=1000, filter_query='{TRANSACTION_VALUE} ge 50',
+                                  sort_by=[{'column_id': 'TRANSACTION_VALUE', 'direction': 'desc'}])
+    assert page_count == 1
+    assert [row['TRANSACTION_VALUE'] for row in data] == sorted(expected, reverse=True)
+
+def test_text_and_date_filters(loaded):
+    data, _ = data_table(page_size=1000, filter_query='{TRANSACTION_TYPE} contains Gro && {TIMEID} datestartswith 2018-03')
+    assert data
+    assert all(row['TRANSACTION_TYPE'] == 'Grocery' and row['TIMEID'].startswith('2018-03') for row in data)
+
+    data, _ = data_table(page_size=1000, filter_query='{TIMEID} ge 2018-06-01')
+    assert data and all(row['TIMEID'] >= '2018-06-01' for row in data)
+
+# filters no row can match - an empty table, not a failed callback
+def test_timeid_filter_that_is_not_a_date(loaded):
+    assert data_table(filter_query='{TIMEID} eq abc') == [[], 1]
+
+def test_text_compared_with_a_number_column(loaded):
+    assert data_table(filter_query='{TRANSACTION_VALUE} ge abc') == [[], 1]